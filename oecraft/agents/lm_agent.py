@@ -12,8 +12,13 @@ from google.genai import types
 from pydantic import BaseModel, Field
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from oecraft.cassette import Cassette
 from oecraft.environment import SYSTEM_PROMPT as GAME_SYSTEM_PROMPT
 from oecraft.environment import LMCraftingGame
+from oecraft.utils import IdentityCache
+
+# how many sent messages' cassette records an agent keeps
+MAX_CACHED_RECORDS = 10_000
 
 MESSAGE_PROMPT = """You have finished playing the crafting game. Now, please write a message to help a future player play the same game. The message can contain anything you want and should help the next player succeed.
 Please respond in JSON and follow this format:
@@ -73,16 +78,33 @@ class CraftingAgent:
         model: str,
         generate_kwargs: dict,
         verbose: bool = False,
+        client: genai.Client | None = None,
+        cassette: Cassette | None = None,
     ):
         self.env = env
         self.model = model
         self.generate_kwargs = generate_kwargs or {}
-        api_key = os.environ.get("COCOLAB_GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("COCOLAB_GEMINI_API_KEY must be set.")
-        self.client = genai.Client(api_key=api_key)
+        self.cassette = cassette
+        # replaying a cassette never touches the network, so it doesn't need a key
+        replaying = cassette is not None and cassette.mode == "replay"
+        if client is None and not replaying:
+            api_key = os.environ.get("COCOLAB_GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("COCOLAB_GEMINI_API_KEY must be set.")
+            client = genai.Client(api_key=api_key)
+        self.client = client
         self.log = []
         self.verbose = verbose
+        # cassette records of the messages sent: the history sends the same
+        # Content objects every turn
+        self._records = IdentityCache(MAX_CACHED_RECORDS)
+
+    def _record(self, message: types.Content) -> dict:
+        record = self._records.get(message)
+        if record is None:
+            record = message.model_dump(mode="json", exclude_none=True)
+            self._records.put(message, record)
+        return record
 
     async def _generate_text(
         self,
@@ -90,15 +112,30 @@ class CraftingAgent:
         response_schema: Optional[BaseModel] = None,
         max_tokens: int = 2048,
     ) -> str:
-        response = await get_completion(
-            self.client,
-            self.model,
-            messages,
-            self.generate_kwargs,
-            response_schema,
-            max_tokens=max_tokens,
-        )
-        content = response.text
+        async def fetch():
+            response = await get_completion(
+                self.client,
+                self.model,
+                messages,
+                self.generate_kwargs,
+                response_schema,
+                max_tokens=max_tokens,
+            )
+            return response.text
+
+        if self.cassette is None:
+            content = await fetch()
+        else:
+            request = {
+                "model": self.model,
+                "contents": [self._record(m) for m in messages],
+                "response_schema": response_schema.__name__
+                if response_schema
+                else None,
+                "generate_kwargs": self.generate_kwargs,
+                "max_tokens": max_tokens,
+            }
+            content = await self.cassette.acall(request, fetch)
         if "</think>" in content:  # remove think content
             content = content.split("</think>")[1].strip()
         return content
@@ -127,7 +164,7 @@ class CraftingAgent:
                     "score": self.env.get_reward(),
                 }
             )
-            obs, reward, terminated, info = self.env.step(action)
+            obs, reward, terminated, info = await self.env.astep(action)
             i += 1
 
     async def play_games(
@@ -137,6 +174,7 @@ class CraftingAgent:
         verbose: bool = False,
     ):
         self.env.clear_history()
+        self._records.clear()
         self.round_num = 0
         self.log = []
         for round_num in range(num_rounds):
@@ -9,17 +9,20 @@ actions. It mirrors the public interface of the MCTS agent.
 from __future__ import annotations
 
 from collections import deque
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from tqdm import tqdm
 
-from oecraft.constants import Item, Tool
 from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.inventory import Inventory
+from oecraft.transition_cache import TransitionCache
+from oecraft.transition_table import TransitionTable
+from oecraft.types import Item, Tool
 
-Inventory = Tuple[Item, ...]
 
-
-def compute_reward_from_inventory(inventory: Inventory) -> int:
+def compute_reward_from_inventory(inventory: Sequence[Item]) -> int:
     """
     Mirror CraftingGame.get_reward but for an arbitrary inventory snapshot.
     Reward is the max value among non-tools, floored at 0.
@@ -32,7 +35,7 @@ def compute_reward_from_inventory(inventory: Inventory) -> int:
 
 
 def legal_actions_from_inventory(
-    inventory: Inventory,
+    inventory: Sequence[Item],
 ) -> List[Optional[Tuple[int, int]]]:
     """
     Return indices (i, j) of legal actions from the given inventory.
@@ -50,41 +53,6 @@ def legal_actions_from_inventory(
     return actions
 
 
-def apply_action_to_inventory(
-    inventory: Inventory,
-    action: Optional[tuple[int, int]],
-    combine_fn: Callable[[Item, Item], Item],
-) -> Inventory:
-    """
-    Apply the environment's combination dynamics to a copy of the inventory.
-    Replicates CraftingGame.step consumption rules:
-    - If both are tools: no-op (but we never call this because we filter those actions)
-    - Non-tools are consumed; tools remain
-    - The resulting new item is appended
-    """
-    next_inventory: List[Item] = list(inventory)
-
-    if action is None:
-        return tuple(next_inventory)
-
-    i, j = action
-    if i > j:
-        i, j = j, i
-
-    item1 = next_inventory[i]
-    item2 = next_inventory[j]
-
-    if not isinstance(item2, Tool):
-        del next_inventory[j]
-    if not isinstance(item1, Tool):
-        del next_inventory[i]
-
-    new_item = combine_fn(item1, item2)
-    next_inventory.append(new_item)
-
-    return tuple(next_inventory)
-
-
 def item_feature_signature(item: Item):
     """
     Hashable, canonical representation of an item that ignores name/emoji/value
@@ -131,7 +99,7 @@ def item_feature_signature(item: Item):
     return ("N", features)
 
 
-def inventory_signature(inventory: Inventory):
+def inventory_signature(inventory: Sequence[Item]):
     return tuple(sorted(item_feature_signature(x) for x in inventory))
 
 
@@ -140,18 +108,34 @@ class OracleBFSAgent:
         self,
         env: CraftingGame,
         max_depth: int = 8,
+        transition_table: Optional[TransitionTable] = None,
     ) -> None:
         self.env = env
         self.max_depth = max_depth
-        self._combine_fn = self.env.world_model.combine
+        # search only needs the dynamics, so it never waits on naming
+        combine_fn = self.env.world_model.transition
+        if transition_table is not None:
+            # look up what the table covers and fall back to the dynamics beyond it
+            combine_fn = partial(
+                transition_table.combine, fallback=self.env.world_model.transition
+            )
+        # search steps a fork of the game, so it follows the game's own rules
+        self._game = self.env.fork(combine_fn=combine_fn)
 
-    def plan_action(self, inventory: Inventory) -> Optional[Tuple[int, int]]:
+    def _next_inventory(
+        self, inventory: Inventory, action: Tuple[int, int]
+    ) -> Inventory:
+        self._game.restore(inventory)
+        self._game.step(action)
+        return self._game.snapshot()
+
+    def plan_action(self, inventory: Sequence[Item]) -> Optional[Tuple[int, int]]:
         """
         Run BFS from the given inventory and return the action (index pair) from
         the root that leads to the best terminal reward within max_depth.
         Returns None if the best choice is to stop immediately or no actions.
         """
-        root_inventory = tuple(inventory)
+        root_inventory = Inventory(inventory)
         legal = legal_actions_from_inventory(root_inventory)
         if not legal:
             return None
@@ -176,9 +160,7 @@ class OracleBFSAgent:
                 )
                 continue
 
-            next_inv = apply_action_to_inventory(
-                root_inventory, action, self._combine_fn
-            )
+            next_inv = self._next_inventory(root_inventory, action)
             sig = inventory_signature(next_inv)
             if sig in seen_root_next:
                 continue
@@ -210,9 +192,7 @@ class OracleBFSAgent:
                     )
                     continue
 
-                next_inv = apply_action_to_inventory(
-                    current_inventory, action, self._combine_fn
-                )
+                next_inv = self._next_inventory(current_inventory, action)
                 visited = visited_by_first.setdefault(first_action, set())
                 sig = inventory_signature(next_inv)
                 if sig in visited or sig in seen_child_next:
@@ -234,16 +214,25 @@ def run_oracle_bfs_agent(
     domain: str,
     n_runs: int = 10,
     n_steps: int = 10,
+    transition_cache: Optional[TransitionCache] = None,
+    transition_table: Optional[TransitionTable] = None,
 ) -> Any:
     """
     Run the Oracle BFS agent for multiple episodes and return results.
     Matches the logging format used by the random and MCTS agents for analysis.
+    Pass a transition_cache to reuse dynamics explored by other runs of the domain,
+    and a transition_table to look up precomputed ones.
     """
     import pandas as pd  # Local import to avoid hard dependency at module import
 
     logs = []
-    env = CraftingGame("none", domain=domain, assign_names=False)
-    agent = OracleBFSAgent(env, max_depth=n_steps)
+    env = CraftingGame(
+        descriptor=GAME_DESCRIPTORS[domain],
+        model="none",
+        assign_names=False,
+        transition_cache=transition_cache,
+    )
+    agent = OracleBFSAgent(env, max_depth=n_steps, transition_table=transition_table)
 
     for run_idx in tqdm(range(n_runs)):
         env.reset()
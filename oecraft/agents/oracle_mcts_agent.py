@@ -10,18 +10,22 @@ from __future__ import annotations
 
 import math
 import random
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from tqdm import tqdm
 
-from oecraft.constants import Item, Tool
 from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.inventory import Inventory
+from oecraft.transition_cache import TransitionCache
+from oecraft.transition_table import TransitionTable
+from oecraft.types import Item, Tool
 
-Inventory = Tuple[Item, ...]
 Action = Tuple[str, str]
 
 
-def compute_reward_from_inventory(inventory: Inventory) -> int:
+def compute_reward_from_inventory(inventory: Sequence[Item]) -> int:
     """
     Mirror CraftingGame.get_reward but for an arbitrary inventory snapshot.
     Reward is the max value among non-tools, floored at 0.
@@ -34,7 +38,7 @@ def compute_reward_from_inventory(inventory: Inventory) -> int:
 
 
 def legal_actions_from_inventory(
-    inventory: Inventory,
+    inventory: Sequence[Item],
 ) -> List[Optional[Tuple[int, int]]]:
     """
     Return indices (i, j) of legal actions from the given inventory.
@@ -51,46 +55,6 @@ def legal_actions_from_inventory(
     return actions
 
 
-def apply_action_to_inventory(
-    inventory: Inventory,
-    action: Optional[tuple[int, int]],
-    combine_fn: Callable[[Item, Item], Item],
-) -> Inventory:
-    """
-    Apply the environment's combination dynamics to a copy of the inventory.
-    Replicates CraftingGame.step consumption rules:
-    - If both are tools: no-op (but we never call this because we filter those actions)
-    - Non-tools are consumed; tools remain
-    - The resulting new item is appended
-    """
-    # Copy first to avoid mutating caller's state
-    next_inventory: List[Item] = list(inventory)
-
-    if action is None:
-        return tuple(next_inventory)
-
-    i, j = action
-
-    # Ensure i < j for stable indexing removal
-    if i > j:
-        i, j = j, i
-
-    item1 = next_inventory[i]
-    item2 = next_inventory[j]
-
-    # Remove non-tools (higher index first to preserve indices)
-    if not isinstance(item2, Tool):
-        del next_inventory[j]
-    if not isinstance(item1, Tool):
-        del next_inventory[i]
-
-    # Combine
-    new_item = combine_fn(item1, item2)
-    next_inventory.append(new_item)
-
-    return tuple(next_inventory)
-
-
 class MCTSNode:
     __slots__ = (
         "inventory",
@@ -154,6 +118,7 @@ class OracleMCTSAgent:
         exploration_c: float = 1.25,
         discount_factor: float = 0.98,
         rng: Optional[random.Random] = None,
+        transition_table: Optional[TransitionTable] = None,
     ) -> None:
         self.env = env
         self.simulations_per_move = simulations_per_move
@@ -163,18 +128,27 @@ class OracleMCTSAgent:
         self.rng = rng or random.Random()
 
         # Use the environment's world model for perfect knowledge
-        self._combine_fn = self.env.world_model.combine
+        # search only needs the dynamics, so it never waits on naming
+        combine_fn = self.env.world_model.transition
+        if transition_table is not None:
+            # look up what the table covers and fall back to the dynamics beyond it
+            combine_fn = partial(
+                transition_table.combine, fallback=self.env.world_model.transition
+            )
+        # search steps a fork of the game, so it follows the game's own rules
+        self._game = self.env.fork(combine_fn=combine_fn)
 
-    def plan_action(self, inventory: Inventory) -> Optional[Tuple[int, int]]:
+    def plan_action(self, inventory: Sequence[Item]) -> Optional[Tuple[int, int]]:
         """
         Run MCTS from the given inventory and return the best action as index pair.
         Returns None if no legal actions are available (i.e., only tool-tool pairs).
         """
-        legal = legal_actions_from_inventory(tuple(inventory))
+        root_inventory = Inventory(inventory)
+        legal = legal_actions_from_inventory(root_inventory)
         if not legal:
             return None
 
-        root = MCTSNode(inventory=tuple(inventory))
+        root = MCTSNode(inventory=root_inventory)
 
         for _ in range(self.simulations_per_move):
             node = root
@@ -190,9 +164,11 @@ class OracleMCTSAgent:
                     untried = [a for a in legal_here if a not in node.children]
                 if untried:
                     action = self.rng.choice(untried)
-                    next_inv = apply_action_to_inventory(
-                        node.inventory, action, self._combine_fn
-                    )
+                    next_inv = node.inventory
+                    if action is not None:
+                        self._game.restore(node.inventory)
+                        self._game.step(action)
+                        next_inv = self._game.snapshot()
                     child = MCTSNode(
                         next_inv,
                         parent=node,
@@ -235,7 +211,9 @@ class OracleMCTSAgent:
         if remaining_depth <= 0:
             return float(compute_reward_from_inventory(inventory))
 
-        current_inventory: Inventory = inventory
+        # the rollout steps the fork without keeping the inventories it passes
+        self._game.restore(inventory)
+        current_inventory = self._game.inventory
         depth = 0
         best_value = float(compute_reward_from_inventory(current_inventory))
         while depth < remaining_depth:
@@ -252,9 +230,8 @@ class OracleMCTSAgent:
                     best_value = discounted
                 break
 
-            current_inventory = apply_action_to_inventory(
-                current_inventory, action, self._combine_fn
-            )
+            self._game.step(action)
+            current_inventory = self._game.inventory
             discounted = float(compute_reward_from_inventory(current_inventory)) * (
                 self.discount_factor ** (depth + 1)
             )
@@ -282,21 +259,31 @@ def run_oracle_mcts_agent(
     max_depth: int = 8,
     exploration_c: float = 1.25,
     discount_factor: float = 0.98,
+    transition_cache: Optional[TransitionCache] = None,
+    transition_table: Optional[TransitionTable] = None,
 ) -> Any:
     """
     Run the Oracle MCTS agent for multiple episodes and return results.
     Matches the logging format used by the random agent for downstream analysis.
+    Pass a transition_cache to reuse dynamics explored by other runs of the domain,
+    and a transition_table to look up precomputed ones.
     """
     import pandas as pd  # Local import to avoid hard dependency at module import
 
     logs = []
-    env = CraftingGame("none", domain=domain, assign_names=False)
+    env = CraftingGame(
+        descriptor=GAME_DESCRIPTORS[domain],
+        model="none",
+        assign_names=False,
+        transition_cache=transition_cache,
+    )
     agent = OracleMCTSAgent(
         env,
         simulations_per_move=simulations_per_move,
         max_depth=max_depth,
         exploration_c=exploration_c,
         discount_factor=discount_factor,
+        transition_table=transition_table,
     )
 
     for run_idx in tqdm(range(n_runs)):
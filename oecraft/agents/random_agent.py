@@ -3,12 +3,17 @@ import random
 import pandas as pd
 from tqdm import tqdm
 
-from oecraft.environment import CraftingGame
+from oecraft.transition_cache import TransitionCache
 from oecraft.types import GameDescriptor, Tool
+from oecraft.vector_environment import VectorCraftingGame
 
 
 def run_random_agent(
-    game_descriptor: GameDescriptor, n_runs: int = 10, n_steps: int = 10
+    game_descriptor: GameDescriptor,
+    n_runs: int = 10,
+    n_steps: int = 10,
+    transition_cache: TransitionCache | None = None,
+    num_envs: int = 64,
 ) -> pd.DataFrame:
     """
     Run the random agent for multiple episodes and return results.
@@ -17,50 +22,64 @@ def run_random_agent(
         domain: Crafting domain ('cooking', 'decorations', 'animals', 'potions')
         n_runs: Number of episodes to run
         n_steps: Maximum steps per episode
+        transition_cache: Combination results to share with other agents of the domain
+        num_envs: Number of episodes to play at once
 
     Returns:
         DataFrame with step-by-step episode results with harmonized format
     """
     log = []
-    env = CraftingGame(descriptor=game_descriptor, model="none", assign_names=False)
+    envs = VectorCraftingGame(
+        game_descriptor,
+        num_envs=max(min(num_envs, n_runs), 1),
+        model="none",
+        max_steps=n_steps,
+        assign_names=False,
+        transition_cache=transition_cache,
+    )
 
-    for run_idx in tqdm(range(n_runs)):
-        env.reset()
-        inventory = env.inventory
-        run_log = []  # Store logs for this run to add final_reward later
+    for first_run in tqdm(range(0, n_runs, envs.num_envs)):
+        observations, _ = envs.reset()
+        # the last batch may not need every environment
+        run_idxs = range(first_run, min(first_run + envs.num_envs, n_runs))
+        run_logs = [[] for _ in run_idxs]  # add final_reward to these later
 
         for step in range(n_steps):
-            # choose two items. They can't both be tools
-            item1, item2 = random.sample(inventory, 2)
-            while isinstance(item1, Tool) and isinstance(item2, Tool):
+            actions = []
+            for obs in observations:
+                # choose two items. They can't both be tools
+                inventory = obs["inventory"]
                 item1, item2 = random.sample(inventory, 2)
+                while isinstance(item1, Tool) and isinstance(item2, Tool):
+                    item1, item2 = random.sample(inventory, 2)
+                actions.append((item1.name, item2.name))
 
-            obs, score, done, info = env.step((item1.name, item2.name))
-            new_item = obs["new_item"]
-            inventory = obs["inventory"]
-            ingredients = [item for item in inventory if not isinstance(item, Tool)]
-            score = sum([item.value for item in ingredients]) / len(ingredients)
+            observations, *_ = envs.step(actions)
+            for run_idx, run_log, action, obs in zip(
+                run_idxs, run_logs, actions, observations
+            ):
+                inventory = obs["inventory"]
+                ingredients = [item for item in inventory if not isinstance(item, Tool)]
+                score = sum([item.value for item in ingredients]) / len(ingredients)
+                run_log.append(
+                    {
+                        "run_idx": run_idx,
+                        "step": step,
+                        "action": action,
+                        "new_item": obs["new_item"],
+                        "score": score,
+                        "inventory_size": len(inventory),
+                        "inventory": inventory,
+                    }
+                )
 
-            step_log = {
-                "run_idx": run_idx,
-                "step": step,
-                "action": (item1.name, item2.name),
-                "new_item": new_item,
-                "score": score,
-                "inventory_size": len(inventory),
-                "inventory": inventory,
-            }
-            run_log.append(step_log)
+        for run_log, env in zip(run_logs, envs.envs):
+            # Get final reward for this run
+            final_reward = env.get_reward()
 
-            if done:
-                break
-
-        # Get final reward for this run
-        final_reward = env.get_reward()
-
-        # Add final_reward to all steps in this run
-        for step_log in run_log:
-            step_log["final_reward"] = final_reward
-            log.append(step_log)
+            # Add final_reward to all steps in this run
+            for step_log in run_log:
+                step_log["final_reward"] = final_reward
+                log.append(step_log)
 
     return pd.DataFrame(log)
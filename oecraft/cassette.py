@@ -0,0 +1,97 @@
+"""
+Record and replay language model calls, so that simulations can be rerun
+deterministically and without network access.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Awaitable, Callable
+
+MODES = ("record", "replay", "auto")
+
+
+class CassetteMiss(KeyError):
+    """
+    Raised in replay mode when a request was never recorded.
+    """
+
+
+class RecordedResponse:
+    """
+    Stands in for a genai response when its text comes from a cassette.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class Cassette:
+    """
+    An append-only JSONL file of responses keyed by a hash of the request.
+
+    Modes:
+    - record: always call the model and append the response
+    - replay: only serve recorded responses, raising CassetteMiss otherwise
+    - auto: serve recorded responses and record the ones that are missing
+    """
+
+    def __init__(self, path: str, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {MODES}, got {mode}")
+        self.path = path
+        self.mode = mode
+        self.responses = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry["key"]] = entry["response"]
+
+    @staticmethod
+    def key(request: Any) -> str:
+        payload = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str):
+        if self.mode != "record" and key in self.responses:
+            return True, self.responses[key]
+        if self.mode == "replay":
+            raise CassetteMiss(f"No recorded response for request {key}")
+        return False, None
+
+    def _record(self, key: str, response: Any):
+        with self._lock:
+            self.responses[key] = response
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "response": response}) + "\n")
+
+    def call(self, request: Any, fetch: Callable[[], Any]) -> Any:
+        """
+        Return the response to request, calling fetch only if it has to.
+        """
+        key = self.key(request)
+        found, response = self._lookup(key)
+        if found:
+            return response
+        response = fetch()
+        self._record(key, response)
+        return response
+
+    async def acall(self, request: Any, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of call.
+        """
+        key = self.key(request)
+        found, response = self._lookup(key)
+        if found:
+            return response
+        response = await fetch()
+        self._record(key, response)
+        return response
+
+    def __len__(self) -> int:
+        return len(self.responses)
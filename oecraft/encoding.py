@@ -0,0 +1,239 @@
+"""
+Fixed-size numeric encodings of a game's inventories and actions, for RL and
+other batched agents that can't work with lists of items.
+"""
+
+from typing import TYPE_CHECKING, Callable, Iterable
+
+import numpy as np
+from gymnasium import spaces
+
+from oecraft.types import CombinedItem, Item, NonTool, Tool
+from oecraft.utils import IdentityCache
+
+if TYPE_CHECKING:
+    from oecraft.environment import CraftingGame
+
+# encodings kept per item before the cache is cleared
+MAX_CACHED_ITEMS = 100_000
+
+
+def _feature_key(item: NonTool) -> str:
+    return repr(sorted(item.features.items(), key=lambda x: x[0]))
+
+
+def _code_key(value):
+    # 1 == True and 0 == False, but a feature could use both kinds of values
+    return (type(value).__name__, value)
+
+
+def feature_vocabularies(
+    ingredients: Iterable[NonTool],
+    tools: Iterable[Tool],
+    feature_names: dict | None,
+    transition: Callable[[Item, Item], Item | None],
+    max_depth: int = 4,
+) -> dict[str, list]:
+    """
+    The values each feature can take, in a fixed order. Features with names
+    (see feature_names) take their levels. The values of other features are
+    found by applying tools to the ingredients, and to what they make, until
+    nothing new turns up or max_depth tools have been applied.
+    """
+    feature_names = feature_names or {}
+    tools = list(tools)
+    vocabularies = {}
+
+    def add(item: NonTool):
+        for feature, value in item.features.items():
+            values = vocabularies.setdefault(feature, [])
+            if feature not in feature_names and value not in values:
+                values.append(value)
+
+    frontier = list(ingredients)
+    seen = {_feature_key(item) for item in frontier}
+    for item in frontier:
+        add(item)
+    for _ in range(max_depth):
+        new_items = []
+        for tool in tools:
+            for item in frontier:
+                new_item = transition(tool, item)
+                if new_item is None or _feature_key(new_item) in seen:
+                    continue
+                seen.add(_feature_key(new_item))
+                add(new_item)
+                new_items.append(new_item)
+        if not new_items:
+            break
+        frontier = new_items
+
+    for feature, levels in feature_names.items():
+        if feature in vocabularies:
+            vocabularies[feature] = list(range(len(levels)))
+    return vocabularies
+
+
+class GameEncoder:
+    """
+    Encodes inventories of up to max_items items as padded arrays. Each slot
+    holds an item's feature codes, the codes of (up to max_ingredients of)
+    its ingredients in sorted order if it is a combined item, its value, and
+    which tool it is.
+    A code is 1 + the value's index in the feature's vocabulary, and 0 means
+    an empty slot or a missing feature.
+
+    An action is the index of a pair of slots (i, j) with i < j, or
+    n_actions - 1 to submit. The observation's action_mask marks the pairs
+    that hold two items that aren't both tools.
+    """
+
+    def __init__(
+        self,
+        tools: list[Tool],
+        vocabularies: dict[str, list],
+        max_items: int,
+        max_ingredients: int = 8,
+    ):
+        self.tools = {tool.name: i + 1 for i, tool in enumerate(tools)}
+        self.features = list(vocabularies)
+        self.codes = [
+            {_code_key(value): code + 1 for code, value in enumerate(values)}
+            for values in vocabularies.values()
+        ]
+        self.max_items = max_items
+        self.max_ingredients = max_ingredients
+        self.pair_slots = np.triu_indices(max_items, k=1)
+        self.n_actions = len(self.pair_slots[0]) + 1
+        self._cache = IdentityCache(MAX_CACHED_ITEMS)
+
+        n_features = len(self.features)
+        max_code = max((len(values) for values in vocabularies.values()), default=0)
+        int32 = np.iinfo(np.int32)
+        self.observation_space = spaces.Dict(
+            {
+                "present": spaces.MultiBinary(max_items),
+                "tool": spaces.Box(0, len(tools), (max_items,), np.int8),
+                "value": spaces.Box(int32.min, int32.max, (max_items,), np.int32),
+                "features": spaces.Box(0, max_code, (max_items, n_features), np.int16),
+                "n_ingredients": spaces.Box(
+                    0, np.iinfo(np.int16).max, (max_items,), np.int16
+                ),
+                "ingredients": spaces.Box(
+                    0, max_code, (max_items, max_ingredients, n_features), np.int16
+                ),
+                "action_mask": spaces.MultiBinary(self.n_actions),
+            }
+        )
+        self.action_space = spaces.Discrete(self.n_actions)
+
+    @classmethod
+    def for_game(cls, game: "CraftingGame", max_ingredients: int = 8) -> "GameEncoder":
+        """
+        An encoder for a game's inventories, which never hold more than its
+        tools and starting ingredients.
+        """
+        vocabularies = feature_vocabularies(
+            game.ingredients,
+            game.tools,
+            game.world_model.feature_names,
+            game.world_model.transition,
+        )
+        return cls(
+            game.tools,
+            vocabularies,
+            max_items=len(game.tools) + game.n_starting_ingredients,
+            max_ingredients=max_ingredients,
+        )
+
+    def _feature_codes(self, item: NonTool, out: np.ndarray):
+        for i, (feature, codes) in enumerate(zip(self.features, self.codes)):
+            if feature in item.features:
+                # a value the vocabulary hasn't seen is left as missing
+                out[i] = codes.get(_code_key(item.features[feature]), 0)
+
+    def _encode_item(self, item: Item) -> tuple:
+        cached = self._cache.get(item)
+        if cached is not None:
+            return cached
+
+        n_features = len(self.features)
+        features = np.zeros(n_features, dtype=np.int16)
+        ingredients = np.zeros((self.max_ingredients, n_features), dtype=np.int16)
+        n_ingredients = 0
+        tool = self.tools.get(item.name, 0) if isinstance(item, Tool) else 0
+        if isinstance(item, NonTool):
+            self._feature_codes(item, features)
+        if isinstance(item, CombinedItem):
+            n_ingredients = len(item.ingredients)
+            rows = np.zeros((n_ingredients, n_features), dtype=np.int16)
+            for ingredient, row in zip(item.ingredients, rows):
+                self._feature_codes(ingredient, row)
+            # the order of ingredients doesn't matter, so sort them into one
+            rows = rows[np.lexsort(rows.T[::-1])] if n_ingredients else rows
+            ingredients[: min(n_ingredients, self.max_ingredients)] = rows[
+                : self.max_ingredients
+            ]
+
+        encoded = (tool, features, n_ingredients, ingredients)
+        self._cache.put(item, encoded)
+        return encoded
+
+    def empty(self) -> dict[str, np.ndarray]:
+        return {
+            key: np.zeros(space.shape, dtype=space.dtype)
+            for key, space in self.observation_space.spaces.items()
+        }
+
+    def encode(
+        self, inventory: list[Item], out: dict[str, np.ndarray] | None = None
+    ) -> dict[str, np.ndarray]:
+        """
+        Encode an inventory, writing into out (e.g. one episode's row of a
+        batch) if given.
+        """
+        if len(inventory) > self.max_items:
+            raise ValueError(
+                f"Inventory has {len(inventory)} items, more than the {self.max_items} that fit"
+            )
+        if out is None:
+            out = self.empty()
+        else:
+            for array in out.values():
+                array.fill(0)
+
+        for slot, item in enumerate(inventory):
+            tool, features, n_ingredients, ingredients = self._encode_item(item)
+            out["present"][slot] = 1
+            out["tool"][slot] = tool
+            out["value"][slot] = getattr(item, "value", 0)
+            out["features"][slot] = features
+            out["n_ingredients"][slot] = n_ingredients
+            out["ingredients"][slot] = ingredients
+
+        present = out["present"].astype(bool)
+        is_tool = out["tool"] > 0
+        first, second = self.pair_slots
+        out["action_mask"][:-1] = (
+            present[first] & present[second] & ~(is_tool[first] & is_tool[second])
+        )
+        out["action_mask"][-1] = 1
+        return out
+
+    def decode_action(
+        self, action: int, inventory: list[Item]
+    ) -> tuple[str, str] | None:
+        """
+        The names of the items an action combines, or None to submit.
+        """
+        action = int(action)
+        if not 0 <= action < self.n_actions:
+            raise ValueError(
+                f"Action {action} is not between 0 and {self.n_actions - 1}"
+            )
+        if action == self.n_actions - 1:
+            return None
+        i, j = self.pair_slots[0][action], self.pair_slots[1][action]
+        if j >= len(inventory):
+            raise ValueError(f"Action {action} uses an empty inventory slot")
+        return inventory[i].name, inventory[j].name
@@ -1,12 +1,30 @@
+import asyncio
+import copy
 import json
+import random
 from dataclasses import replace
+from typing import Callable
 
 import gymnasium as gym
-from google.genai import types
-
-from oecraft.types import CombinedItem, GameDescriptor, Ingredient, Tool
-from oecraft.utils import load_function_from_string
-from oecraft.world_model import MemoizedWorldModel
+import numpy as np
+
+from oecraft.cassette import Cassette
+from oecraft.encoding import GameEncoder
+from oecraft.inventory import Inventory
+from oecraft.journal import WorldModelJournal
+from oecraft.lm_client import GroqClient
+from oecraft.naming_cache import NamingCache, NamingPack
+from oecraft.naming_coordinator import NamingCoordinator
+from oecraft.prefetch import NamingPrefetcher
+from oecraft.prompt_history import HistoryCompaction, PromptHistory
+from oecraft.template_namer import TemplateNamer
+from oecraft.transition_cache import TransitionCache
+from oecraft.types import CombinedItem, GameDescriptor, Ingredient, Item, Tool
+from oecraft.utils import IdentityCache, load_function_from_string
+from oecraft.world_model import MAX_COMBINATIONS, MemoizedWorldModel
+
+# items kept in each of a game's caches before it is cleared
+MAX_CACHED_ITEMS = 100_000
 
 
 class CraftingGame(gym.Env):
@@ -16,6 +34,24 @@ class CraftingGame(gym.Env):
         model: str,
         n_starting_ingredients: int = 4,
         assign_names: bool = False,
+        naming_cache: NamingCache | None = None,
+        naming_coordinator: NamingCoordinator | None = None,
+        lm_client: GroqClient | None = None,
+        cassette: Cassette | None = None,
+        seed: int | None = None,
+        transition_cache: TransitionCache | None = None,
+        journal: WorldModelJournal | None = None,
+        max_combinations: int | None = MAX_COMBINATIONS,
+        max_ic_examples: int | None = None,
+        prefetch_workers: int = 0,
+        naming_pack: NamingPack | None = None,
+        ic_retrieval_k: int | None = None,
+        template_names: bool = False,
+        max_lm_requests: int | None = None,
+        naming_timeout: float | None = None,
+        world_model: MemoizedWorldModel | None = None,
+        encode: bool = False,
+        max_ingredients: int = 8,
     ):
         self.value_fn = load_function_from_string(descriptor.value_fn, "value_fn")
         self.get_inventory_fn = load_function_from_string(
@@ -34,21 +70,78 @@ class CraftingGame(gym.Env):
         self.model = model
         self.n_starting_ingredients = n_starting_ingredients
 
-        self.world_model = MemoizedWorldModel(
+        # episodes of a vectorized game share one world model, which its creator closes
+        self._owns_world_model = world_model is None
+        self.world_model = world_model or MemoizedWorldModel(
             lm=self.model,
             combo_function_str=descriptor.combination_fn,
             assign_names=assign_names,
             naming_system_prompt=descriptor.naming_system_prompt,
             naming_ic_examples=descriptor.naming_ic_examples,
             feature_names=descriptor.feature_names,
+            naming_cache=naming_cache,
+            naming_coordinator=naming_coordinator,
+            lm_client=lm_client,
+            cassette=cassette,
+            transition_cache=transition_cache,
+            journal=journal,
+            max_combinations=max_combinations,
+            max_ic_examples=max_ic_examples,
+            naming_pack=naming_pack,
+            ic_retrieval_k=ic_retrieval_k,
+            # names items instead of the LM without assign_names, and when the LM can't with it
+            template_namer=(
+                TemplateNamer(
+                    descriptor.feature_names, descriptor.naming_ic_examples, self.tools
+                )
+                if template_names
+                else None
+            ),
+            max_lm_requests=max_lm_requests,
+            naming_timeout=naming_timeout,
+        )
+        # name likely next combinations in the background while the player decides
+        self.prefetcher = (
+            NamingPrefetcher(self.world_model, max_workers=prefetch_workers)
+            if prefetch_workers > 0
+            else None
         )
 
-        self.inventory = []
+        self.inventory = Inventory()
+        self.rng = random.Random(seed) if seed is not None else None
+        # combines items instead of the world model when set, see fork
+        self.combine_fn = None
+        # the valued copy of each item the world model made
+        self._valued = IdentityCache(MAX_CACHED_ITEMS)
+        # items' descriptions and lines of render
+        self._descriptions = IdentityCache(MAX_CACHED_ITEMS)
+        self._lines = IdentityCache(MAX_CACHED_ITEMS)
+
+        # observations as fixed-size arrays and actions as indices, see oecraft.encoding
+        self.encoder = None
+        if encode:
+            self.encoder = GameEncoder.for_game(self, max_ingredients)
+            self.observation_space = self.encoder.observation_space
+            self.action_space = self.encoder.action_space
+
+    def _sample_inventory(self) -> list:
+        if self.rng is None:
+            return self.get_inventory_fn(self.n_starting_ingredients, self.ingredients)
+
+        # get_inventory_fn draws from the global random module, so lend it our
+        # own state for the duration of the call
+        outer_state = random.getstate()
+        random.setstate(self.rng.getstate())
+        try:
+            return self.get_inventory_fn(self.n_starting_ingredients, self.ingredients)
+        finally:
+            self.rng.setstate(random.getstate())
+            random.setstate(outer_state)
 
     def reset(self, seed: int | None = None, options: dict | None = None):
-        ingredients = self.get_inventory_fn(
-            self.n_starting_ingredients, self.ingredients
-        )
+        if seed is not None:
+            self.rng = random.Random(seed)
+        ingredients = self._sample_inventory()
 
         # assign values to the ingredients
         for ingredient in ingredients:
@@ -56,43 +149,78 @@ class CraftingGame(gym.Env):
 
         # get features for the ingredients
         ingredients = [
-            replace(
-                ingredient,
-                description=self.descriptor_fn(
-                    ingredient, self.world_model.feature_names
-                ),
-            )
+            replace(ingredient, description=self.describe(ingredient))
             for ingredient in ingredients
         ]
+        # the copies have the same features, so the same description
+        for ingredient in ingredients:
+            self._cached(self._descriptions, ingredient, lambda item: item.description)
+
+        self.inventory = Inventory(self.tools + ingredients)
+        if self.prefetcher is not None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.prefetcher.prefetch(self.inventory)
+            else:
+                # an async game names on its event loop, like astep does
+                self.prefetcher.aprefetch(self.inventory)
+
+        if self.encoder is not None:
+            return self.encoder.encode(self.inventory)
+        return self.inventory
 
-        self.inventory = self.tools + ingredients
+    def _cached(
+        self, cache: IdentityCache, item: Item, make: Callable[[Item], str]
+    ) -> str:
+        # items are immutable, so what's worked out for one holds until the
+        # feature names change, e.g. with a new world model
+        feature_names = self.world_model.feature_names
+        cached = cache.get(item)
+        if cached is not None and cached[0] is feature_names:
+            return cached[1]
+        result = make(item)
+        cache.put(item, (feature_names, result))
+        return result
+
+    def describe(self, item: Item) -> str:
+        """
+        The description of an item's features, which is worked out once per item.
+        """
+        return self._cached(
+            self._descriptions,
+            item,
+            lambda item: self.descriptor_fn(
+                item, feature_names=self.world_model.feature_names
+            ),
+        )
 
-        return self.inventory
+    def _render_line(self, item: Item) -> str:
+        if isinstance(item, Tool):
+            return f"Tool: {item.emoji} {item.name}\n"
+        elif isinstance(item, Ingredient):
+            features = self.describe(item)
+            return f"Ingredient: {item.emoji} {item.name}, value: {item.value}, features: {features}\n"
+        elif isinstance(item, CombinedItem):
+            features = self.describe(item)
+            component_features = "; ".join(
+                [
+                    f"{ing.emoji} {ing.name}: {self.describe(ing)}"
+                    for ing in item.ingredients
+                ]
+            )
+            return f"Combined item: {item.emoji} {item.name}, value: {item.value}, features: {features}, components: {component_features}\n"
+        return ""
 
     def render(self):
         """
-        Render the environment.
+        Render the environment. Each item's line is only formatted the first
+        time it is rendered.
         """
-        ret = ""
-        for item in self.inventory:
-            if isinstance(item, Tool):
-                ret += f"Tool: {item.emoji} {item.name}\n"
-            elif isinstance(item, Ingredient):
-                features = self.descriptor_fn(item, self.world_model.feature_names)
-                ret += f"Ingredient: {item.emoji} {item.name}, value: {item.value}, features: {features}\n"
-            elif isinstance(item, CombinedItem):
-                features = self.descriptor_fn(
-                    item, feature_names=self.world_model.feature_names
-                )
-                component_features = "; ".join(
-                    [
-                        f"{ing.emoji} {ing.name}: {self.descriptor_fn(ing, feature_names=self.world_model.feature_names)}"
-                        for ing in item.ingredients
-                    ]
-                )
-                ret += f"Combined item: {item.emoji} {item.name}, value: {item.value}, features: {features}, components: {component_features}\n"
-
-        return ret
+        return "".join(
+            self._cached(self._lines, item, self._render_line)
+            for item in self.inventory
+        )
 
     def reset_world_model(self):
         """
@@ -104,7 +232,6 @@ class CraftingGame(gym.Env):
         """
         Load the world model from a file.
         """
-        self.world_model = MemoizedWorldModel(lm=self.model, domain=self.domain)
         self.world_model.load(filepath)
 
     def save_world_model(self, filepath: str):
@@ -113,35 +240,63 @@ class CraftingGame(gym.Env):
         """
         self.world_model.save(filepath)
 
-    def step(self, action: tuple[str, str] | None):
+    def _encoded(self, result: tuple) -> tuple:
+        if self.encoder is None:
+            return result
+        return (self.encoder.encode(self.inventory), *result[1:])
+
+    def _action_handles(self, first: str | int, second: str | int) -> tuple[int, int]:
         """
-        Take an action in the environment.
+        The handles of the items an action names, or of the items at the
+        inventory positions it gives.
         """
+        if isinstance(first, (int, np.integer)) and isinstance(
+            second, (int, np.integer)
+        ):
+            handles = self.inventory.handles()
+            if first == second or not (
+                0 <= first < len(handles) and 0 <= second < len(handles)
+            ):
+                raise ValueError(
+                    f"Positions {first} and {second} are not two items of an inventory of {len(handles)}"
+                )
+            return handles[first], handles[second]
+
+        handle1 = self.inventory.find(first)
+        if handle1 is None:
+            raise ValueError(
+                f"Item {first} not in inventory. Inventory contains the following items: {', '.join(self.inventory.names())}"
+            )
+        # an ingredient combined with one of the same name needs a second one
+        handle2 = self.inventory.find(
+            second,
+            exclude=None if isinstance(self.inventory.get(handle1), Tool) else handle1,
+        )
+        if handle2 is None:
+            raise ValueError(
+                f"Item {second} not in inventory. Inventory contains the following items: {', '.join(self.inventory.names())}"
+            )
+        return handle1, handle2
+
+    def _start_step(self, action: tuple[str, str] | tuple[int, int] | int | None):
+        """
+        Validate an action and consume its items.
+
+        Returns either a finished step result or the pair of items to combine.
+        """
+        if self.encoder is not None and isinstance(action, (int, np.integer)):
+            action = self.encoder.decode_action(action, self.inventory)
         if action is None:
             reward = self.get_reward()
             obs = {
                 "inventory": self.inventory,
                 "new_item": None,
             }
-            return obs, reward, True, {}
-        else:
-            name1, name2 = action
-
-        inv_names = [item.name for item in self.inventory]
-
-        # check if the items are in the inventory
-        if name1 not in inv_names:
-            raise ValueError(
-                f"Item {name1} not in inventory. Inventory contains the following items: {', '.join(inv_names)}"
-            )
-        if name2 not in inv_names:
-            raise ValueError(
-                f"Item {name2} not in inventory. Inventory contains the following items: {', '.join(inv_names)}"
-            )
+            return (obs, reward, True, {}), None
 
-        # get the items
-        item1 = next(item for item in self.inventory if item.name == name1)
-        item2 = next(item for item in self.inventory if item.name == name2)
+        handle1, handle2 = self._action_handles(*action)
+        item1 = self.inventory.get(handle1)
+        item2 = self.inventory.get(handle2)
 
         # if the user tries to combine two tools, do nothing
         if isinstance(item1, Tool) and isinstance(item2, Tool):
@@ -149,23 +304,32 @@ class CraftingGame(gym.Env):
                 "inventory": self.inventory,
                 "new_item": None,
             }
-            return obs, 0, False, {}
+            return (obs, 0, False, {}), None
 
         # remove non-tool items (ingredients get consumed)
         # Tools are durable and stay in inventory, ingredients are consumed
         if not isinstance(item1, Tool):
-            self.inventory.remove(item1)
+            self.inventory.remove_handle(handle1)
         if not isinstance(item2, Tool):
-            self.inventory.remove(item2)
+            self.inventory.remove_handle(handle2)
 
-        # combine the items
-        new_item = self.world_model.combine(item1, item2)
+        return None, (item1, item2)
+
+    def _value(self, new_item: Item) -> Item:
+        # the world model returns the same item for the same combination, so
+        # it's only valued once
+        valued = self._valued.get(new_item)
+        if valued is None:
+            valued = replace(new_item, value=self.value_fn(new_item))
+            self._valued.put(new_item, valued)
+        return valued
 
+    def _finish_step(self, new_item):
         # compute the value of the new item
-        new_item = replace(new_item, value=self.value_fn(new_item))
+        new_item = self._value(new_item)
 
         # update the inventory
-        self.inventory.append(new_item)
+        self.inventory.add(new_item)
 
         obs = {
             "inventory": self.inventory,
@@ -174,6 +338,78 @@ class CraftingGame(gym.Env):
 
         return obs, 0, False, {}
 
+    def step(self, action: tuple[str, str] | tuple[int, int] | int | None):
+        """
+        Take an action in the environment: a pair of item names or of inventory
+        positions, or None to submit.
+        """
+        result, items = self._start_step(action)
+        if result is not None:
+            return self._encoded(result)
+
+        # combine the items
+        new_item = (self.combine_fn or self.world_model.combine)(*items)
+
+        result = self._finish_step(new_item)
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(self.inventory, [result[0]["new_item"]])
+        return self._encoded(result)
+
+    async def astep(self, action: tuple[str, str] | tuple[int, int] | int | None):
+        """
+        Take an action in the environment without blocking the event loop while naming.
+        """
+        result, items = self._start_step(action)
+        if result is not None:
+            return self._encoded(result)
+
+        if self.combine_fn is not None:
+            new_item = self.combine_fn(*items)
+        else:
+            new_item = await self.world_model.acombine(*items)
+
+        result = self._finish_step(new_item)
+        if self.prefetcher is not None:
+            self.prefetcher.aprefetch(self.inventory, [result[0]["new_item"]])
+        return self._encoded(result)
+
+    def snapshot(self) -> Inventory:
+        """
+        The state of the episode, to restore later. Taking it is constant
+        time: the snapshot shares the inventory until either changes.
+        """
+        return self.inventory.copy()
+
+    def restore(self, snapshot: Inventory):
+        """
+        Return the episode to a snapshot, which can be restored again.
+        """
+        self.inventory = snapshot.copy()
+
+    def fork(self, combine_fn: Callable[[Item, Item], Item] | None = None):
+        """
+        A copy of the game in its current state that shares the world model,
+        e.g. for a planner to step through possible episodes. combine_fn, such
+        as the world model's transition, combines the fork's items instead of
+        the world model, so that its steps never wait on naming.
+        """
+        fork = copy.copy(self)
+        fork.inventory = self.inventory.copy()
+        fork.rng = copy.copy(self.rng)
+        fork.prefetcher = None
+        fork._owns_world_model = False
+        fork.combine_fn = combine_fn
+        return fork
+
+    def close(self):
+        """
+        Stop background naming, and the world model's if the game made it.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        if self._owns_world_model:
+            self.world_model.close()
+
     def get_reward(self):
         """
         Get the reward at the end of an epoch.
@@ -200,34 +436,24 @@ The action should include only the item names, not the emoji.
 class LMCraftingGame(gym.Env):
     """
     A wrapper around the oecraft crafting game that allows for language model interaction.
+
+    With compaction, the prompt history only sends the last few turns of
+    earlier rounds and a summary of the rest, see HistoryCompaction.
     """
 
-    def __init__(self, env: CraftingGame):
+    def __init__(self, env: CraftingGame, compaction: HistoryCompaction | None = None):
         self.env = env
-        self.prompt_history = []
+        self.compaction = compaction
+        self.prompt_history = PromptHistory()
+        # the combinations made this round, for its summary
+        self._made = []
 
     def clear_history(self):
-        self.prompt_history = []
-
-    def _append_user_message(self, content: str):
-        if self.prompt_history and self.prompt_history[-1].role == "user":
-            # add the new content to the last message
-            self.prompt_history = self.prompt_history[:-1] + [
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_text(
-                            text=self.prompt_history[-1].parts[0].text
-                            + "\n\n"
-                            + content
-                        )
-                    ],
-                )
-            ]
-        else:
-            self.prompt_history.append(
-                types.Content(role="user", parts=[types.Part.from_text(text=content)])
-            )
+        self.prompt_history.clear()
+
+    def _append_user_message(self, content: str, keep: bool = False):
+        # add the new content to the last message if it's the user's
+        self.prompt_history.add_user_text(content, keep=keep)
 
     def reset(
         self,
@@ -235,8 +461,9 @@ class LMCraftingGame(gym.Env):
         options: dict | None = None,
     ):
         self.env.reset(seed=seed, options=options)
+        self.prompt_history.start_round()
+        self._made = []
         if len(self.prompt_history) == 0:
-            self.prompt_history = []
             self._append_user_message("Starting inventory:\n" + self.env.render())
         else:
             self._append_user_message(
@@ -266,9 +493,7 @@ class LMCraftingGame(gym.Env):
     def format_obs(self, obs: dict):
         new_item = obs["new_item"]
         if new_item is not None:
-            new_item_features = self.env.descriptor_fn(
-                new_item, self.env.world_model.feature_names
-            )
+            new_item_features = self.env.describe(new_item)
             inventory_formatted = f"""New item: {new_item.emoji} {new_item.name}, value: {new_item.value}, features: {new_item_features}
 Current inventory:\n""" + self.env.render()
         else:
@@ -278,48 +503,92 @@ Current inventory:\n""" + self.env.render()
 
         return inventory_formatted
 
-    def inner_step(self, action: str):
+    def _parse_env_action(self, action: str):
         # parse the action
         action_json = self.parse_action(action)
 
         # format the action to be passed to the environment
         if action_json["action"] == "submit":
-            env_action = None
-        else:
-            env_action = action_json["action"]
+            return None
+        return action_json["action"]
+
+    def inner_step(self, action: str):
+        env_action = self._parse_env_action(action)
 
         # execute the action
         obs, reward, terminated, info = self.env.step(env_action)
 
         self._append_user_message(self.format_obs(obs))
+        self._track_round(env_action, obs, terminated)
 
         return obs, reward, terminated, info
 
-    def step(self, action: str):
-        self.prompt_history.append(
-            types.Content(role="model", parts=[types.Part.from_text(text=action)])
+    async def ainner_step(self, action: str):
+        env_action = self._parse_env_action(action)
+        obs, reward, terminated, info = await self.env.astep(env_action)
+        self._append_user_message(self.format_obs(obs))
+        self._track_round(env_action, obs, terminated)
+        return obs, reward, terminated, info
+
+    def _track_round(self, env_action, obs: dict, terminated: bool):
+        new_item = obs["new_item"]
+        if new_item is not None:
+            self._made.append(
+                f"{env_action[0]} + {env_action[1]} = {new_item.emoji} {new_item.name} ({new_item.value})"
+            )
+        if terminated:
+            self.prompt_history.end_round(self._round_summary())
+
+    def _round_summary(self) -> str:
+        final_items = ", ".join(
+            f"{item.emoji} {item.name} ({item.value})"
+            for item in self.env.inventory
+            if not isinstance(item, Tool)
+        )
+        made = "; ".join(self._made) or "nothing"
+        return (
+            f"Round {self.prompt_history.rounds}: scored {self.env.get_reward()}. "
+            f"Final inventory: {final_items}. Made: {made}."
         )
 
+    def _append_model_message(self, action: str):
+        self.prompt_history.add("model", action)
+
+    def _handle_step_error(self, e: ValueError):
+        self._append_user_message(f"Error: {e}\nPlease try again.")
+        obs = {
+            "inventory": self.env.inventory,
+            "new_item": None,
+        }
+        return obs, 0, False, {}
+
+    def step(self, action: str):
+        self._append_model_message(action)
+
         try:
-            obs, reward, terminated, info = self.inner_step(action)
+            return self.inner_step(action)
         except ValueError as e:
-            self._append_user_message(f"Error: {e}\nPlease try again.")
-            obs = {
-                "inventory": self.env.inventory,
-                "new_item": None,
-            }
-            reward = 0
-            terminated = False
-            info = {}
+            return self._handle_step_error(e)
 
-        return obs, reward, terminated, info
+    async def astep(self, action: str):
+        """
+        Async version of step, for agents that play many games concurrently.
+        """
+        self._append_model_message(action)
+
+        try:
+            return await self.ainner_step(action)
+        except ValueError as e:
+            return self._handle_step_error(e)
 
     def get_prompt_history(self):
-        return self.prompt_history[:]
+        return self.prompt_history.compacted(self.compaction)
 
     def add_message_to_history(self, message: str):
+        # the message outlasts compaction of the round it came with
         self._append_user_message(
-            f"You received the following message from a previous player trying to help you:\n{message}"
+            f"You received the following message from a previous player trying to help you:\n{message}",
+            keep=True,
         )
 
     def get_reward(self):
@@ -0,0 +1,324 @@
+"""
+Stand-ins for the naming model (Groq's OpenAI-style endpoint) and the agent
+model (the google-genai client), for load testing and debugging offline.
+
+FakeGroqServer is a real HTTP server, so the whole naming stack, including
+GroqClient's pooling, rate limiting and retries, gets exercised.
+FakeGenaiClient can be passed anywhere a genai.Client is expected.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from google.genai import errors
+
+FAKE_EMOJI = ["🧪", "🍲", "✨", "🌀", "🔮", "🎁"]
+
+INVENTORY_LINE = re.compile(
+    r"^(?:Tool|Ingredient|Combined item): (\S+) (.+?)(?:, value: .*)?$"
+)
+ITEM_NAME = re.compile(r"'name': '([^']*)'")
+COMPONENT_HEADER = re.compile(r"^Component \d+:$", re.MULTILINE)
+
+
+@dataclass
+class FakeLMConfig:
+    """
+    How a fake model behaves. Latencies are drawn from a log-normal
+    distribution unless latency_fn is given.
+    """
+
+    latency_median: float = 0.2
+    latency_sigma: float = 0.5
+    latency_fn: Callable[[], float] | None = None
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    submit_probability: float = 0.1
+    seed: int | None = None
+    rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+
+    def sample_latency(self) -> float:
+        if self.latency_fn is not None:
+            return self.latency_fn()
+        if self.latency_median <= 0:
+            return 0.0
+        return self.latency_median * self.rng.lognormvariate(0, self.latency_sigma)
+
+    def sample_failure(self) -> int | None:
+        """
+        Return the status code of a simulated failure, or None for success.
+        """
+        draw = self.rng.random()
+        if draw < self.rate_limit_rate:
+            return 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+def fake_item_semantics(prompt: str, rng: random.Random) -> dict:
+    """
+    Name a combination after the names of its inputs.
+    """
+    # the last user message has one line each for Item 1, Item 2 and the outcome
+    names = []
+    for line in prompt.splitlines():
+        match = ITEM_NAME.search(line)
+        if line.startswith(("Item 1:", "Item 2:")) and match:
+            # keep names short when fake names get fed back in as inputs
+            names.append(match.group(1).split(" ")[-1])
+    name = " ".join(names) if names else "mystery item"
+    return {"emoji": rng.choice(FAKE_EMOJI), "name": f"fake {name}"}
+
+
+def fake_batch_item_semantics(prompt: str, rng: random.Random) -> dict:
+    """
+    Name a combination and each of the components listed after it.
+    """
+    sections = COMPONENT_HEADER.split(prompt)
+    semantics = fake_item_semantics(sections[0], rng)
+    semantics["ingredients"] = [
+        fake_item_semantics(section, rng) for section in sections[1:]
+    ]
+    return semantics
+
+
+def inventory_names(prompt: str) -> list[tuple[str, bool]]:
+    """
+    Parse (name, is_tool) pairs from the most recent inventory in a game transcript.
+    """
+    inventory_text = prompt.rsplit("inventory:\n", 1)[-1]
+    items = []
+    for line in inventory_text.splitlines():
+        match = INVENTORY_LINE.match(line)
+        if match:
+            items.append((match.group(2), line.startswith("Tool:")))
+    return items
+
+
+def fake_action_response(prompt: str, config: FakeLMConfig) -> dict:
+    """
+    Pick two items from the current inventory (not both tools), or submit.
+    """
+    items = inventory_names(prompt)
+    non_tools = [name for name, is_tool in items if not is_tool]
+    if config.rng.random() < config.submit_probability or not non_tools:
+        return {"reasoning": "I am happy with my items.", "action": "submit"}
+
+    first = config.rng.choice(non_tools)
+    others = [name for name, _ in items if name != first]
+    if not others:
+        return {"reasoning": "There is nothing left to combine.", "action": "submit"}
+    second = config.rng.choice(others)
+    return {
+        "reasoning": f"Let's see what {first} and {second} make.",
+        "action": [first, second],
+    }
+
+
+def fake_message_response(prompt: str, config: FakeLMConfig) -> dict:
+    return {"message": "Try applying each tool once before combining items."}
+
+
+def fake_game_descriptor(prompt: str, config: FakeLMConfig) -> dict:
+    # imported here because the descriptors module builds whole games at import time
+    from oecraft.game_descriptors import GAME_DESCRIPTORS
+
+    return json.loads(GAME_DESCRIPTORS["potions"].model_dump_json())
+
+
+DEFAULT_RESPONDERS = {
+    "ActionResponse": fake_action_response,
+    "MessageResponse": fake_message_response,
+    "GameDescriptor": fake_game_descriptor,
+}
+
+
+class FakeGroqServer:
+    """
+    A local server that answers OpenAI-style chat completion requests with
+    schema-valid ItemSemantics or BatchItemSemantics payloads.
+    """
+
+    def __init__(
+        self,
+        config: FakeLMConfig | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.config = config or FakeLMConfig()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def respond(self, payload: dict) -> tuple[int, dict, dict]:
+        """
+        Return (status, headers, body) for a request payload.
+        """
+        self._count("requests")
+        time.sleep(self.config.sample_latency())
+
+        failure = self.config.sample_failure()
+        if failure == 429:
+            self._count("rate_limited")
+            return (
+                429,
+                {"Retry-After": str(self.config.retry_after)},
+                {"error": {"message": "Rate limit reached", "type": "tokens"}},
+            )
+        if failure is not None:
+            self._count("errors")
+            return failure, {}, {"error": {"message": "Internal server error"}}
+
+        prompt = payload["messages"][-1]["content"]
+        schema_name = payload["response_format"]["json_schema"]["name"]
+        if schema_name == "BatchItemSemantics":
+            content = fake_batch_item_semantics(prompt, self.config.rng)
+        else:
+            content = fake_item_semantics(prompt, self.config.rng)
+        body = {
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps(content)},
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+        return 200, {}, body
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so clients can keep connections alive
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                status, headers, body = server.respond(payload)
+                encoded = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return Handler
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self) -> "FakeGroqServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeGenaiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.client = client
+
+    def generate_content(self, model: str, contents: list, config=None):
+        time.sleep(self.client.config.sample_latency())
+        return self.client.respond(contents, config)
+
+
+class _FakeAsyncModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.client = client
+
+    async def generate_content(self, model: str, contents: list, config=None):
+        await asyncio.sleep(self.client.config.sample_latency())
+        return self.client.respond(contents, config)
+
+
+class _FakeAio:
+    def __init__(self, client: "FakeGenaiClient"):
+        self.models = _FakeAsyncModels(client)
+
+
+class FakeGenaiClient:
+    """
+    A drop-in replacement for genai.Client that answers generate_content
+    calls with payloads matching the requested response schema.
+    """
+
+    def __init__(
+        self,
+        config: FakeLMConfig | None = None,
+        responders: dict[str, Callable[[str, FakeLMConfig], dict]] | None = None,
+    ):
+        self.config = config or FakeLMConfig()
+        self.responders = {**DEFAULT_RESPONDERS, **(responders or {})}
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+
+    def respond(self, contents: list, config=None) -> FakeGenaiResponse:
+        self.stats["requests"] += 1
+        failure = self.config.sample_failure()
+        if failure == 429:
+            self.stats["rate_limited"] += 1
+            raise errors.ClientError(
+                429, {"error": {"code": 429, "message": "Resource exhausted"}}
+            )
+        if failure is not None:
+            self.stats["errors"] += 1
+            raise errors.ServerError(
+                500, {"error": {"code": 500, "message": "Internal error"}}
+            )
+
+        prompt = "\n\n".join(
+            part.text for content in contents for part in content.parts if part.text
+        )
+        schema = getattr(config, "response_schema", None)
+        if schema is None:
+            return FakeGenaiResponse("This is a placeholder response.")
+        payload = self.responders[schema.__name__](prompt, self.config)
+        return FakeGenaiResponse(json.dumps(payload))
@@ -0,0 +1,161 @@
+"""
+Retrieval of the in-context naming examples most similar to a combination,
+so naming prompts show a few relevant examples instead of a fixed few.
+"""
+
+import threading
+import zlib
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from oecraft.prompts import ic_example_messages
+from oecraft.types import CombinedItem, ICExample, Item, Tool
+
+
+def _feature_tokens(item: Item, role: str) -> Iterator[str]:
+    if isinstance(item, Tool):
+        yield f"{role}|tool|{item.name}"
+        return
+    for feature, value in item.features.items():
+        yield f"{role}|{feature}|{value}"
+    if isinstance(item, CombinedItem):
+        for ingredient in item.ingredients:
+            for feature, value in ingredient.features.items():
+                yield f"{role}|ingredient {feature}|{value}"
+
+
+def combination_vector(item1: Item, item2: Item, outcome: Item, dim: int) -> np.ndarray:
+    """
+    A unit vector of hashed one-hot features of a combination. Both inputs
+    share a role, so the vector doesn't depend on their order.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    tokens = [
+        *_feature_tokens(item1, "input"),
+        *_feature_tokens(item2, "input"),
+        *_feature_tokens(outcome, "outcome"),
+    ]
+    for token in tokens:
+        # crc32 rather than hash, which changes between processes
+        vector[zlib.crc32(token.encode("utf-8")) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class ICExampleIndex:
+    """
+    The learned in-context examples of a world model, kept with a feature
+    vector each, so that the k examples (including the descriptor's base
+    examples) most similar to a combination can be found with one matrix
+    product. Each example's prompt messages are rendered once and reused.
+
+    Behaves like the deque it replaces: with maxlen set, appending to a full
+    index drops the oldest learned example.
+    """
+
+    def __init__(
+        self,
+        feature_names: dict | None,
+        base_examples: Iterable[ICExample] = (),
+        k: int = 4,
+        maxlen: int | None = None,
+        examples: Iterable[ICExample] = (),
+        dim: int = 512,
+    ):
+        self.feature_names = feature_names or {}
+        self.k = k
+        self.maxlen = maxlen
+        self.dim = dim
+        self.base_examples = list(base_examples)
+        self._base_vectors = np.array(
+            [self._vector(x) for x in self.base_examples], dtype=np.float32
+        ).reshape(len(self.base_examples), dim)
+        self._base_messages = [None] * len(self.base_examples)
+
+        # learned examples live in a ring buffer, with the oldest at _start
+        self._examples = []
+        self._messages = []
+        self._vectors = np.zeros((maxlen or 64, dim), dtype=np.float32)
+        self._start = 0
+        self._lock = threading.Lock()
+        for example in examples:
+            self.append(example)
+
+    def _vector(self, example: ICExample) -> np.ndarray:
+        return combination_vector(*example.inputs, example.outcome, self.dim)
+
+    def append(self, example: ICExample):
+        vector = self._vector(example)
+        with self._lock:
+            if self.maxlen is not None and len(self._examples) == self.maxlen:
+                if self.maxlen == 0:
+                    return
+                slot = self._start
+                self._start = (self._start + 1) % self.maxlen
+                self._examples[slot] = example
+                self._messages[slot] = None
+            else:
+                slot = len(self._examples)
+                if slot == len(self._vectors):
+                    self._vectors = np.concatenate(
+                        [self._vectors, np.zeros_like(self._vectors)]
+                    )
+                self._examples.append(example)
+                self._messages.append(None)
+            self._vectors[slot] = vector
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    def __iter__(self) -> Iterator[ICExample]:
+        with self._lock:
+            examples = self._examples[self._start :] + self._examples[: self._start]
+        return iter(examples)
+
+    def _nearest(self, query: np.ndarray) -> list[int]:
+        # slots of base examples come before those of learned ones
+        scores = np.concatenate(
+            [self._base_vectors @ query, self._vectors[: len(self._examples)] @ query]
+        )
+        k = min(self.k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        # most similar last, right before the combination being named
+        return sorted(top.tolist(), key=lambda i: (scores[i], i))
+
+    def _example_at(self, slot: int) -> ICExample:
+        if slot < len(self.base_examples):
+            return self.base_examples[slot]
+        return self._examples[slot - len(self.base_examples)]
+
+    def _example_messages_at(self, slot: int) -> list[dict]:
+        n_base = len(self.base_examples)
+        if slot < n_base:
+            cache, examples, i = self._base_messages, self.base_examples, slot
+        else:
+            cache, examples, i = self._messages, self._examples, slot - n_base
+        if cache[i] is None:
+            cache[i] = ic_example_messages(examples[i], self.feature_names)
+        return cache[i]
+
+    def nearest(self, item1: Item, item2: Item, outcome: Item) -> list[ICExample]:
+        """
+        The k examples most similar to a combination, least similar first.
+        """
+        query = combination_vector(item1, item2, outcome, self.dim)
+        with self._lock:
+            return [self._example_at(slot) for slot in self._nearest(query)]
+
+    def example_messages(self, item1: Item, item2: Item, outcome: Item) -> list[dict]:
+        """
+        The prompt messages for the examples most similar to a combination.
+        """
+        query = combination_vector(item1, item2, outcome, self.dim)
+        with self._lock:
+            return [
+                message
+                for slot in self._nearest(query)
+                for message in self._example_messages_at(slot)
+            ]
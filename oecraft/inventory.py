@@ -0,0 +1,149 @@
+"""
+A game's inventory, indexed by item name so that a step can find, check and
+consume its items in constant time however large the inventory grows.
+"""
+
+from collections.abc import Sequence
+from typing import Iterable, Iterator
+
+from oecraft.types import Item
+
+
+class Inventory(Sequence):
+    """
+    A multiset of items in the order they were added. Adding an item gives it
+    a handle, which refers to it until it is removed: positions shift as items
+    are removed, but handles don't. Items are found by name and removed by
+    handle, without comparing them to other items.
+
+    Copies share their state until one of them changes, so copying is
+    constant time and a copy that is only read costs nothing more.
+
+    It reads like the list of items it replaces: it can be indexed, iterated
+    and compared to lists, and prints like one.
+    """
+
+    def __init__(self, items: Iterable[Item] = ()):
+        # handle -> item, in the order the items were added
+        self._items = {}
+        # name -> the handles of the items with that name, as an ordered set
+        self._by_name = {}
+        self._next_handle = 0
+        # the handles and items as lists, rebuilt on first use after a change
+        self._handles = None
+        self._list = None
+        # whether _items and _by_name are shared with a copy
+        self._shared = False
+        for item in items:
+            self.add(item)
+
+    def add(self, item: Item) -> int:
+        """
+        Add an item and return its handle.
+        """
+        self._own()
+        handle = self._next_handle
+        self._next_handle += 1
+        self._items[handle] = item
+        self._by_name.setdefault(item.name, {})[handle] = None
+        self._handles = self._list = None
+        return handle
+
+    append = add
+
+    def find(self, name: str, exclude: int | None = None) -> int | None:
+        """
+        The handle of the first item with a name, other than exclude, or None
+        if there is no such item.
+        """
+        for handle in self._by_name.get(name, ()):
+            if handle != exclude:
+                return handle
+        return None
+
+    def get(self, handle: int) -> Item:
+        return self._items[handle]
+
+    def remove_handle(self, handle: int) -> Item:
+        """
+        Remove the item with a handle and return it.
+        """
+        self._own()
+        item = self._items.pop(handle)
+        handles = self._by_name[item.name]
+        del handles[handle]
+        if not handles:
+            del self._by_name[item.name]
+        self._handles = self._list = None
+        return item
+
+    def remove(self, item: Item):
+        """
+        Remove the first item equal to item, like list.remove.
+        """
+        for handle in self._by_name.get(item.name, ()):
+            if self._items[handle] is item or self._items[handle] == item:
+                self.remove_handle(handle)
+                return
+        raise ValueError(f"{item!r} is not in the inventory")
+
+    def handles(self) -> list[int]:
+        """
+        The items' handles, in the order of the items.
+        """
+        if self._handles is None:
+            self._handles = list(self._items)
+        return self._handles
+
+    def names(self) -> list[str]:
+        return [item.name for item in self._items.values()]
+
+    def copy(self) -> "Inventory":
+        """
+        A copy with the same items and handles.
+        """
+        copy = Inventory.__new__(Inventory)
+        copy._items = self._items
+        copy._by_name = self._by_name
+        copy._next_handle = self._next_handle
+        copy._handles = self._handles
+        copy._list = self._list
+        copy._shared = self._shared = True
+        return copy
+
+    def _own(self):
+        # copy the shared state before the first change
+        if self._shared:
+            self._items = self._items.copy()
+            self._by_name = {name: h.copy() for name, h in self._by_name.items()}
+            self._shared = False
+
+    def _as_list(self) -> list[Item]:
+        if self._list is None:
+            self._list = list(self._items.values())
+        return self._list
+
+    def __getitem__(self, index):
+        return self._as_list()[index]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Item]:
+        return iter(self._as_list())
+
+    def __contains__(self, item) -> bool:
+        return any(
+            self._items[handle] is item or self._items[handle] == item
+            for handle in self._by_name.get(getattr(item, "name", None), ())
+        )
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Inventory, list, tuple)):
+            return self._as_list() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self._as_list())
@@ -0,0 +1,203 @@
+"""
+An append-only journal for persisting world models as they grow.
+
+A journal is a JSONL file whose first line is a header and whose other lines
+each record one combination or one in-context example, so checkpointing a
+world model only ever writes what is new.
+"""
+
+import json
+import os
+import threading
+from itertools import chain
+from typing import Iterable, Iterator
+
+from oecraft.utils import item_from_legacy_dict, item_to_record
+
+JOURNAL_FORMAT = "oecraft-world-model"
+JOURNAL_VERSION = 1
+
+
+def journal_header(**fields) -> dict:
+    return {
+        "type": "header",
+        "format": JOURNAL_FORMAT,
+        "version": JOURNAL_VERSION,
+        **fields,
+    }
+
+
+def parse_journal_lines(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse journal lines one at a time, checking the header first.
+
+    A final line that was only partly written (e.g. because the process was
+    killed mid-append) is skipped.
+    """
+    header = None
+    pending = None
+    for line in lines:
+        if pending is not None:
+            raise ValueError(f"Corrupt journal record: {pending[:100]}")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            pending = line
+            continue
+
+        if header is None:
+            if record.get("format") != JOURNAL_FORMAT:
+                raise ValueError("Not a world model journal")
+            if record.get("version") != JOURNAL_VERSION:
+                raise ValueError(
+                    f"Unsupported journal version {record.get('version')}, expected {JOURNAL_VERSION}"
+                )
+            header = record
+        yield record
+
+
+def legacy_world_model_records(data: dict) -> Iterator[dict]:
+    """
+    Journal records for a world model saved as one JSON object by older
+    versions, with combinations as lists of their two inputs and outcome.
+    """
+    yield journal_header(lm=data["lm"], assign_names=data.get("assign_names", False))
+    for inputs_and_outcome in data.get("combinations", {}).values():
+        e1, e2, outcome = (item_from_legacy_dict(x) for x in inputs_and_outcome)
+        yield {
+            "type": "combination",
+            "inputs": [item_to_record(e1), item_to_record(e2)],
+            "outcome": item_to_record(outcome),
+        }
+    for example in data.get("ic_examples", []):
+        yield {
+            "type": "ic_example",
+            "inputs": [
+                item_to_record(item_from_legacy_dict(x)) for x in example["input"]
+            ],
+            "outcome": item_to_record(item_from_legacy_dict(example["outcome"])),
+            "semantics": example["semantics"],
+        }
+
+
+def read_world_model_lines(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse a saved world model into journal records, whether it is a journal
+    or a single JSON object written by older versions.
+    """
+    lines = iter(lines)
+    first = next((line for line in lines if line.strip()), None)
+    if first is None:
+        return
+    try:
+        header = json.loads(first)
+    except json.JSONDecodeError:
+        # an indented legacy file only parses as a whole
+        header = None
+    if isinstance(header, dict) and "format" in header:
+        yield from parse_journal_lines(chain([first], lines))
+        return
+    data = header if header is not None else json.loads(first + "".join(lines))
+    if not isinstance(data, dict) or "combinations" not in data:
+        raise ValueError("Not a world model journal")
+    yield from legacy_world_model_records(data)
+
+
+def write_journal(filepath: str, records: Iterable[dict]):
+    """
+    Atomically replace filepath with a journal containing records.
+    """
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+class WorldModelJournal:
+    """
+    A journal file that a world model appends to as it learns combinations.
+
+    Appended records are written out, flushed and fsync'd every sync_every
+    appends, so at most that many records can be lost if the machine goes
+    down. The file is only open while records are being written.
+    """
+
+    def __init__(self, path: str, sync_every: int = 1):
+        self.path = path
+        self.sync_every = sync_every
+        # lines appended since the last sync
+        self._unsynced = []
+        # world models can be appended to from several threads at once
+        self._lock = threading.Lock()
+
+    def records(self) -> Iterator[dict]:
+        """
+        Stream the records already in the journal, if there is one.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            yield from parse_journal_lines(f)
+
+    def _drop_partial_line(self):
+        # appending after a partly written line would glue two records together
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            content = f.read()
+            f.truncate(content.rfind(b"\n") + 1)
+
+    def open(self, header: dict):
+        """
+        Start appending, writing header first if the journal is new.
+        """
+        with self._lock:
+            if os.path.exists(self.path):
+                self._drop_partial_line()
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                self._unsynced.append(json.dumps(header) + "\n")
+                self._write_unsynced()
+
+    def append(self, record: dict):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._unsynced.append(line)
+            if len(self._unsynced) >= self.sync_every:
+                self._write_unsynced()
+
+    def sync(self):
+        with self._lock:
+            self._write_unsynced()
+
+    def _write_unsynced(self):
+        # callers hold the lock
+        if not self._unsynced:
+            return
+        with open(self.path, "a") as f:
+            f.writelines(self._unsynced)
+            f.flush()
+            os.fsync(f.fileno())
+        self._unsynced = []
+
+    def compact(self, records: Iterable[dict]):
+        """
+        Replace the journal's contents with records, e.g. a deduplicated snapshot.
+        Appends wait until the snapshot is written, and then go after it.
+        """
+        with self._lock:
+            # the snapshot supersedes what hasn't been written yet
+            self._unsynced = []
+            write_journal(self.path, records)
+
+    def close(self):
+        self.sync()
@@ -0,0 +1,283 @@
+"""
+A shared HTTP client for the naming model, with connection pooling, per-model
+rate limits, and a single bounded retry budget.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# statuses that won't go away if we ask again
+FATAL_STATUS_CODES = {401, 403, 404}
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        Take a token and return how long the caller has to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CompletionError(RuntimeError):
+    """
+    A failed completion attempt, with how long to wait before the next one.
+    Also raised once every attempt has failed.
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(headers) -> float | None:
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _check_response(status_code: int, headers, body: str) -> dict:
+    if status_code in FATAL_STATUS_CODES:
+        raise RuntimeError(
+            f"Completion request failed with status {status_code}: {body}"
+        )
+    if status_code == 429 or status_code >= 500:
+        raise CompletionError(
+            f"Status {status_code}: {body}", retry_after=_retry_after(headers)
+        )
+    if status_code >= 400:
+        # e.g. Groq rejecting a generation that didn't match the schema
+        raise CompletionError(f"Status {status_code}: {body}")
+
+    try:
+        result = json.loads(body)
+        if "error" in result:
+            raise CompletionError(str(result["error"]))
+        return json.loads(result["choices"][0]["message"]["content"])
+    except (ValueError, KeyError, IndexError) as e:
+        raise CompletionError(f"Invalid completion: {e}")
+
+
+class GroqClient:
+    """
+    A client for Groq's OpenAI-style chat completions endpoint.
+
+    One client is meant to be shared by every world model that talks to the
+    same API key, so that they share connections, rate limits and a
+    concurrency cap.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        url: str | None = None,
+        requests_per_minute: dict[str, float] | None = None,
+        default_requests_per_minute: float | None = None,
+        max_concurrency: int = 16,
+        max_attempts: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        timeout: float = 60.0,
+    ):
+        self.api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY")
+        # GROQ_CHAT_URL lets us point every client at a local fake server
+        self.url = url or os.getenv("GROQ_CHAT_URL", GROQ_CHAT_URL)
+        self.requests_per_minute = requests_per_minute or {}
+        self.default_requests_per_minute = default_requests_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        # httpx clients and asyncio semaphores are tied to the loop that made them
+        self._loop_state = weakref.WeakKeyDictionary()
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _bucket(self, model: str) -> TokenBucket | None:
+        rpm = self.requests_per_minute.get(model, self.default_requests_per_minute)
+        if rpm is None:
+            return None
+        with self._buckets_lock:
+            if model not in self._buckets:
+                self._buckets[model] = TokenBucket(rpm / 60.0)
+            return self._buckets[model]
+
+    def _backoff(self, attempt: int, error: CompletionError) -> float:
+        if error.retry_after is not None:
+            return min(error.retry_after, self.max_delay)
+        # full jitter keeps many clients that failed together from retrying together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _exhausted(self, last_error) -> CompletionError:
+        return CompletionError(
+            f"Failed to get valid completion after {self.max_attempts} attempts. Last error: {last_error}"
+        )
+
+    def complete(self, payload: dict) -> dict:
+        """
+        Send a chat completion request and return the parsed JSON content.
+        """
+        bucket = self._bucket(payload["model"])
+        # serialize once rather than on every attempt
+        body = json.dumps(payload)
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                with self._semaphore:
+                    response = self.session.post(
+                        self.url,
+                        headers=self.headers,
+                        data=body,
+                        timeout=self.timeout,
+                    )
+                return _check_response(
+                    response.status_code, response.headers, response.text
+                )
+            except requests.RequestException as e:
+                last_error = CompletionError(str(e))
+            except CompletionError as e:
+                last_error = e
+            if attempt < self.max_attempts - 1:
+                time.sleep(self._backoff(attempt, last_error))
+        raise self._exhausted(last_error)
+
+    def _async_state(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._loop_state:
+            self._loop_state[loop] = (
+                httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.max_concurrency),
+                ),
+                asyncio.Semaphore(self.max_concurrency),
+            )
+        return self._loop_state[loop]
+
+    async def acomplete(self, payload: dict) -> dict:
+        """
+        Async version of complete.
+        """
+        client, semaphore = self._async_state()
+        bucket = self._bucket(payload["model"])
+        body = json.dumps(payload)
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if bucket is not None:
+                await bucket.aacquire()
+            try:
+                async with semaphore:
+                    response = await client.post(
+                        self.url, headers=self.headers, content=body
+                    )
+                return _check_response(
+                    response.status_code, response.headers, response.text
+                )
+            except httpx.HTTPError as e:
+                last_error = CompletionError(str(e))
+            except CompletionError as e:
+                last_error = e
+            if attempt < self.max_attempts - 1:
+                await asyncio.sleep(self._backoff(attempt, last_error))
+        raise self._exhausted(last_error)
+
+    def close(self):
+        """
+        Close the client's connections, including those of any event loop
+        that is still open. Inside a running event loop, use aclose.
+        """
+        self.session.close()
+        states = list(self._loop_state.items())
+        self._loop_state.clear()
+        for loop, (client, _) in states:
+            if loop.is_closed():
+                # its connections went with it
+                continue
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                loop.run_until_complete(client.aclose())
+
+    async def aclose(self):
+        """
+        Async version of close.
+        """
+        state = self._loop_state.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].aclose()
+        self.close()
+
+
+_default_clients = {}
+_default_clients_lock = threading.Lock()
+
+
+def get_default_client(api_key: str | None = None) -> GroqClient:
+    """
+    Return a process-wide client for the given API key.
+    """
+    if api_key is None:
+        api_key = os.getenv("GROQ_API_KEY")
+    with _default_clients_lock:
+        if api_key not in _default_clients:
+            _default_clients[api_key] = GroqClient(api_key=api_key)
+        return _default_clients[api_key]
@@ -0,0 +1,200 @@
+"""
+Persistent caches for named combinations, shared across processes and runs.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import urllib.parse
+
+from oecraft.types import CombinedItem, Item, Tool
+
+
+def item_signature(item: Item) -> tuple:
+    """
+    Canonical, JSON-friendly representation of everything about an item that
+    can influence how a combination involving it gets named. Values and
+    descriptions are left out because they are derived from the features, but
+    names are kept because the naming model builds new names from old ones.
+    """
+    if isinstance(item, Tool):
+        return ("T", item.name)
+
+    features = sorted((k, v) for k, v in item.features.items())
+    if isinstance(item, CombinedItem):
+        return (
+            "C",
+            item.name,
+            features,
+            [item_signature(ing) for ing in item.ingredients],
+        )
+    return ("I", item.name, features)
+
+
+def combination_key(e1: Item, e2: Item, descriptor_hash: str) -> str:
+    """
+    Order-independent key for the combination of two items under a descriptor.
+    """
+    signatures = sorted(json.dumps(item_signature(x), default=str) for x in (e1, e2))
+    payload = json.dumps([descriptor_hash, signatures])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class NamingCache:
+    """
+    Interface for stores that map combination keys to serialized items.
+    """
+
+    def get(self, key: str) -> dict | None:
+        raise NotImplementedError
+
+    def put(self, key: str, record: dict):
+        raise NotImplementedError
+
+
+class DictNamingCache(NamingCache):
+    """
+    An in-process naming cache, mostly useful for tests.
+    """
+
+    def __init__(self):
+        self.records = {}
+
+    def get(self, key: str) -> dict | None:
+        return self.records.get(key)
+
+    def put(self, key: str, record: dict):
+        # the first name written for a combination wins, as in the SQLite cache
+        self.records.setdefault(key, record)
+
+
+class SQLiteNamingCache(NamingCache):
+    """
+    A naming cache backed by a SQLite database in WAL mode, so that several
+    processes can read and write the same file concurrently.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS combinations ("
+            "key TEXT PRIMARY KEY, record TEXT NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> dict | None:
+        row = (
+            self._connection()
+            .execute("SELECT record FROM combinations WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, record: dict):
+        # INSERT OR IGNORE keeps the first name, so concurrent writers agree
+        self._connection().execute(
+            "INSERT OR IGNORE INTO combinations (key, record) VALUES (?, ?)",
+            (key, json.dumps(record)),
+        )
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM combinations")
+            .fetchone()[0]
+        )
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+NAMING_PACK_FORMAT = "oecraft-naming-pack"
+NAMING_PACK_VERSION = 1
+
+
+class NamingPack(NamingCache):
+    """
+    A read-only naming cache built offline by oecraft.naming_pack, with names
+    for the combinations players are most likely to make.
+
+    The file is opened immutable and memory-mapped, so lookups read straight
+    from the page cache and every process serving games from the same pack
+    shares one copy of it. Names made during play go to the naming cache.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 2**30):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.metadata = {
+            key: json.loads(value)
+            for key, value in self._connection().execute("SELECT key, value FROM meta")
+        }
+        if self.metadata.get("format") != NAMING_PACK_FORMAT:
+            raise ValueError(f"{path} is not a naming pack")
+        if self.metadata.get("version") != NAMING_PACK_VERSION:
+            raise ValueError(
+                f"Unsupported naming pack version {self.metadata.get('version')}, expected {NAMING_PACK_VERSION}"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # immutable tells SQLite the file can't change, so it skips locking entirely
+            uri = f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+        return conn
+
+    def check(self, descriptor_hash: str):
+        """
+        Refuse to serve names generated for a different game or naming model.
+        """
+        if self.metadata["descriptor_hash"] != descriptor_hash:
+            raise ValueError(
+                f"Naming pack {self.path} was built for a different game or naming model"
+            )
+
+    def get(self, key: str) -> dict | None:
+        row = (
+            self._connection()
+            .execute("SELECT record FROM combinations WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, record: dict):
+        raise TypeError("Naming packs are read-only")
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM combinations")
+            .fetchone()[0]
+        )
@@ -0,0 +1,141 @@
+"""
+Coordinates naming between world models that run at the same time, e.g. the
+chains of a simulation or the sessions of a server.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable
+
+from oecraft.types import Item
+
+# what waiters get when the item made for them isn't to be shared
+_NOT_SHARED = object()
+
+
+class NamingCoordinator:
+    """
+    Keeps at most one naming request in flight per combination key and
+    remembers the first result, so every caller gets the same name for the
+    same combination.
+
+    With max_names set, the oldest names are forgotten once there are more
+    than max_names of them. Callers then only agree on a forgotten name if
+    they share a naming cache.
+    """
+
+    def __init__(self, max_names: int | None = None):
+        self.names = {}
+        self.max_names = max_names
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._apending = {}
+
+    def name(
+        self,
+        key: str,
+        make_item: Callable[[], Item | None],
+        share: Callable[[Item | None], bool] | None = None,
+    ) -> Item | None:
+        """
+        Return the item for key, calling make_item only if no other thread is
+        already doing so. If share says the item made shouldn't be shared,
+        e.g. a stand-in name, it is returned to this caller only and the
+        callers waiting for it make their own.
+        """
+        while True:
+            with self._lock:
+                if key in self.names:
+                    return self.names[key]
+                future = self._pending.get(key)
+                is_leader = future is None
+                if is_leader:
+                    future = Future()
+                    self._pending[key] = future
+
+            if not is_leader:
+                item = future.result()
+                if item is _NOT_SHARED:
+                    continue
+                return item
+
+            try:
+                item = make_item()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                if share is not None and not share(item):
+                    future.set_result(_NOT_SHARED)
+                    return item
+                # an async caller may have named it in the meantime
+                item = self._remember(key, item)
+                future.set_result(item)
+                return item
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+
+    async def aname(
+        self,
+        key: str,
+        make_item: Callable[[], Awaitable[Item | None]],
+        share: Callable[[Item | None], bool] | None = None,
+    ) -> Item | None:
+        """
+        Async version of name. Callers on the same event loop await one shared
+        task, and wait for the thread that is naming key if there is one.
+        """
+        while True:
+            with self._lock:
+                if key in self.names:
+                    return self.names[key]
+                future = self._pending.get(key)
+            if future is not None:
+                item = await asyncio.wrap_future(future)
+                if item is _NOT_SHARED:
+                    continue
+                return item
+
+            # tasks belong to an event loop, so only share them within one
+            pending_key = (id(asyncio.get_running_loop()), key)
+            task = self._apending.get(pending_key)
+            is_leader = task is None or task.done()
+            if is_leader:
+                task = asyncio.ensure_future(self._amake(make_item, share))
+                self._apending[pending_key] = task
+                task.add_done_callback(lambda done: self._drop_task(pending_key, done))
+
+            # shield the shared task so one caller being cancelled doesn't cancel the others
+            item, shared = await asyncio.shield(task)
+            if shared:
+                return self._remember(key, item)
+            if is_leader:
+                return item
+
+    def _drop_task(self, pending_key: tuple, task: asyncio.Future):
+        # a caller may already have started a new task for the key
+        if self._apending.get(pending_key) is task:
+            del self._apending[pending_key]
+
+    @staticmethod
+    async def _amake(make_item, share) -> tuple[Item | None, bool]:
+        item = await make_item()
+        return item, share is None or share(item)
+
+    def claim(self, key: str, item: Item | None) -> Item | None:
+        """
+        Offer an item named elsewhere for key, returning whichever item got there first.
+        """
+        return self._remember(key, item)
+
+    def _remember(self, key: str, item: Item | None) -> Item | None:
+        with self._lock:
+            item = self.names.setdefault(key, item)
+            if self.max_names is not None and len(self.names) > self.max_names:
+                del self.names[next(iter(self.names))]
+            return item
+
+    def __len__(self) -> int:
+        return len(self.names)
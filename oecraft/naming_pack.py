@@ -0,0 +1,189 @@
+"""
+Build naming packs: names for every combination that can be made within a few
+steps of a game's starting inventories, generated ahead of time so that
+players never wait for the LM on common paths and all see the same names.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+from itertools import combinations
+
+from oecraft.lm_client import GroqClient
+from oecraft.naming_cache import (
+    NAMING_PACK_FORMAT,
+    NAMING_PACK_VERSION,
+    SQLiteNamingCache,
+    item_signature,
+)
+from oecraft.types import GameDescriptor, Tool
+from oecraft.utils import load_function_from_string
+from oecraft.world_model import NAMING_ERRORS, MemoizedWorldModel
+
+logger = logging.getLogger(__name__)
+
+
+def possible_inventories(
+    descriptor: GameDescriptor,
+    n_starting_ingredients: int = 4,
+    samples: int = 10000,
+    seed: int = 0,
+) -> set[frozenset[str]]:
+    """
+    The sets of ingredient names that get_inventory_fn can start a game with.
+    Since it is an arbitrary (random) function, this samples it many times.
+    """
+    get_inventory_fn = load_function_from_string(
+        descriptor.get_inventory_fn, "get_inventory_fn"
+    )
+    # get_inventory_fn draws from the global random module, so restore it afterwards
+    outer_state = random.getstate()
+    random.seed(seed)
+    try:
+        return {
+            frozenset(
+                ingredient.name
+                for ingredient in get_inventory_fn(
+                    n_starting_ingredients, descriptor.ingredients
+                )
+            )
+            for _ in range(samples)
+        }
+    finally:
+        random.setstate(outer_state)
+
+
+def _finish_pack(partial_path: str, path: str, metadata: dict):
+    conn = sqlite3.connect(partial_path, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [(key, json.dumps(value)) for key, value in metadata.items()],
+    )
+    # an immutable, read-only file can't have a write-ahead log next to it
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(partial_path, path)
+
+
+async def build_naming_pack(
+    descriptor: GameDescriptor,
+    path: str,
+    lm: str,
+    max_steps: int = 2,
+    n_starting_ingredients: int = 4,
+    inventory_samples: int = 10000,
+    concurrency: int = 16,
+    lm_client: GroqClient | None = None,
+    reasoning_effort: str = "medium",
+    allow_missing: bool = False,
+) -> int:
+    """
+    Name every combination that can be made in at most max_steps steps from
+    any starting inventory, and write the names to a naming pack at path.
+
+    Combinations are named one step at a time, since what a step's items get
+    called shapes the names of what is made from them. Names are written to
+    path + ".partial" as they come in, so an interrupted build picks up where
+    it left off. Returns the number of names in the pack.
+
+    If the LM fails to name some combinations, the build raises RuntimeError
+    and keeps the partial pack, so running it again only asks for the missing
+    names. With allow_missing, the pack is finished anyway and the number of
+    missing names is recorded in its metadata.
+    """
+    inventories = possible_inventories(
+        descriptor, n_starting_ingredients, inventory_samples
+    )
+    # ingredients are used up, so only ingredients that can start a game together can be combined
+    allowed = {
+        frozenset(subset)
+        for inventory in inventories
+        for size in range(len(inventory) + 1)
+        for subset in combinations(sorted(inventory), size)
+    }
+
+    partial_path = f"{path}.partial"
+    cache = SQLiteNamingCache(partial_path)
+    world_model = MemoizedWorldModel(
+        lm=lm,
+        combo_function_str=descriptor.combination_fn,
+        assign_names=True,
+        naming_system_prompt=descriptor.naming_system_prompt,
+        naming_ic_examples=descriptor.naming_ic_examples,
+        feature_names=descriptor.feature_names,
+        reasoning_effort=reasoning_effort,
+        naming_cache=cache,
+        lm_client=lm_client,
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def name(e1, e2):
+        nonlocal failed
+        async with semaphore:
+            try:
+                return await world_model.acombine(e1, e2)
+            except NAMING_ERRORS as e:
+                failed += 1
+                logger.warning("Failed to name %s + %s: %s", e1.name, e2.name, e)
+                return None
+
+    # every item found so far, with the number of steps it takes to make and
+    # the ingredients it is made from
+    reached = [(tool, 0, frozenset()) for tool in descriptor.tools] + [
+        (ingredient, 0, frozenset([ingredient.name]))
+        for ingredient in descriptor.ingredients
+    ]
+    seen = {json.dumps(item_signature(item), default=str) for item, _, _ in reached}
+    for steps in range(1, max_steps + 1):
+        pairs = []
+        for (e1, steps1, made_from1), (e2, steps2, made_from2) in combinations(
+            reached, 2
+        ):
+            if steps1 + steps2 + 1 != steps:
+                continue
+            if isinstance(e1, Tool) and isinstance(e2, Tool):
+                continue
+            if made_from1 & made_from2 or (made_from1 | made_from2) not in allowed:
+                continue
+            pairs.append((e1, e2, made_from1 | made_from2))
+
+        new_items = await asyncio.gather(*(name(e1, e2) for e1, e2, _ in pairs))
+        for (e1, e2, made_from), new_item in zip(pairs, new_items):
+            if new_item is None or new_item is e1 or new_item is e2:
+                continue
+            signature = json.dumps(item_signature(new_item), default=str)
+            if signature not in seen:
+                seen.add(signature)
+                reached.append((new_item, steps, made_from))
+        print(f"Step {steps}: named {len(pairs)} combinations, {len(cache)} in total")
+
+    n_names = len(cache)
+    world_model.close()
+    cache.close()
+    if failed and not allow_missing:
+        raise RuntimeError(
+            f"{failed} combinations couldn't be named. Build the pack again to "
+            f"retry them from {partial_path}, or pass allow_missing=True"
+        )
+    _finish_pack(
+        partial_path,
+        path,
+        {
+            "format": NAMING_PACK_FORMAT,
+            "version": NAMING_PACK_VERSION,
+            "descriptor_hash": world_model.descriptor_hash,
+            "lm": lm,
+            "max_steps": max_steps,
+            "n_starting_ingredients": n_starting_ingredients,
+            "missing_names": failed,
+        },
+    )
+    return n_names
@@ -13,6 +13,7 @@ from google import genai
 from google.genai import types
 from pydantic import BaseModel
 
+from oecraft.cassette import Cassette, RecordedResponse
 from oecraft.game_descriptors import GAME_DESCRIPTORS
 from oecraft.optimization.simulation import (
     compute_simulation_statistics,
@@ -341,11 +342,17 @@ class ExperimentOptimizer:
         sim_params: dict,
         run_name: str,
         checkpoint_dir: str = "data/optimization_checkpoints",
+        client: genai.Client | None = None,
+        cassette: Cassette | None = None,
     ):
         self.curr_game_descriptor = None
         self.sim_params = sim_params
         self.history = []
-        self.client = genai.Client(api_key=os.environ.get("COCOLAB_GEMINI_API_KEY"))
+        self.cassette = cassette
+        replaying = cassette is not None and cassette.mode == "replay"
+        if client is None and not replaying:
+            client = genai.Client(api_key=os.environ.get("COCOLAB_GEMINI_API_KEY"))
+        self.client = client
         self.run_name = run_name
         self.model = model
         self.iteration = 0
@@ -373,21 +380,34 @@ class ExperimentOptimizer:
         tools: list[Callable] = [],
         response_schema: Optional[BaseModel] = None,
     ):
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=messages,
-            config=types.GenerateContentConfig(
-                system_instruction=optimization_system_prompt,
-                response_mime_type="application/json"
-                if response_schema
-                else "text/plain",
-                response_schema=response_schema,
-                tools=tools,
-                **generate_kwargs,
-            ),
-        )
+        def fetch():
+            return self.client.models.generate_content(
+                model=self.model,
+                contents=messages,
+                config=types.GenerateContentConfig(
+                    system_instruction=optimization_system_prompt,
+                    response_mime_type="application/json"
+                    if response_schema
+                    else "text/plain",
+                    response_schema=response_schema,
+                    tools=tools,
+                    **generate_kwargs,
+                ),
+            )
 
-        return response
+        if self.cassette is None:
+            return fetch()
+
+        request = {
+            "model": self.model,
+            "contents": [
+                m.model_dump(mode="json", exclude_none=True) for m in messages
+            ],
+            "response_schema": response_schema.__name__ if response_schema else None,
+            "tools": [tool.__name__ for tool in tools],
+            "generate_kwargs": generate_kwargs,
+        }
+        return RecordedResponse(self.cassette.call(request, lambda: fetch().text))
 
     def simulate(self):
         args = self.sim_params.copy()
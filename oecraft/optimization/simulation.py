@@ -12,7 +12,14 @@ import statsmodels.api as sm
 from pyprojroot import here
 
 from oecraft.agents.lm_agent import CraftingAgent
+from oecraft.cassette import Cassette
 from oecraft.environment import CraftingGame, LMCraftingGame
+from oecraft.fake_lm import FakeGenaiClient, FakeGroqServer
+from oecraft.journal import WorldModelJournal, read_world_model_lines
+from oecraft.lm_client import GroqClient
+from oecraft.naming_cache import NamingCache, SQLiteNamingCache
+from oecraft.naming_coordinator import NamingCoordinator
+from oecraft.prompt_history import HistoryCompaction
 
 
 async def run_chain(
@@ -24,12 +31,61 @@ async def run_chain(
     starting_message: str | None = None,
     existing_df=None,
     verbose=True,
+    naming_cache: NamingCache | None = None,
+    naming_coordinator: NamingCoordinator | None = None,
+    lm_client: GroqClient | None = None,
+    agent_client=None,
+    cassette: Cassette | None = None,
+    world_model_records: list[dict] | None = None,
 ):
+    # journal each chain's world model so that resumed runs keep what it learned
+    journal = None
+    if getattr(args, "journal_world_models", False):
+        journal_dir = here(f"{args.output_dir}/world_models_{args.run_name}")
+        os.makedirs(journal_dir, exist_ok=True)
+        journal = WorldModelJournal(
+            os.path.join(journal_dir, f"chain_{chain_num}.jsonl")
+        )
+
     # Create independent environment and agent for each chain
+    template_names = getattr(args, "template_names", False)
+    max_lm_requests = getattr(args, "max_lm_requests", None)
+    naming_timeout = getattr(args, "naming_timeout", None)
     game = CraftingGame(
-        descriptor=descriptor, model=args.naming_model, assign_names=True
+        descriptor=descriptor,
+        model=args.naming_model,
+        assign_names=not template_names,
+        naming_cache=naming_cache,
+        naming_coordinator=naming_coordinator,
+        lm_client=lm_client,
+        cassette=cassette,
+        # seeding each chain separately keeps inventories reproducible for replays
+        seed=None if getattr(args, "seed", None) is None else args.seed + chain_num,
+        journal=journal,
+        prefetch_workers=getattr(args, "prefetch_workers", 0),
+        ic_retrieval_k=getattr(args, "ic_retrieval_k", None),
+        template_names=template_names
+        or max_lm_requests is not None
+        or naming_timeout is not None,
+        max_lm_requests=max_lm_requests,
+        naming_timeout=naming_timeout,
     )
-    env = LMCraftingGame(game)
+    # start from what earlier runs learned
+    if world_model_records is not None:
+        try:
+            game.world_model.merge_records(world_model_records)
+        except ValueError as e:
+            # e.g. the optimizer changed the game since the world model was saved
+            print(f"Chain {chain_num} starting from scratch: {e}")
+    # send the agent a summary of earlier rounds rather than all of them
+    keep_turns = getattr(args, "keep_turns", None)
+    max_history_tokens = getattr(args, "max_history_tokens", None)
+    compaction = None
+    if keep_turns is not None or max_history_tokens is not None:
+        compaction = HistoryCompaction(
+            keep_turns=keep_turns, max_tokens=max_history_tokens
+        )
+    env = LMCraftingGame(game, compaction=compaction)
     agent = CraftingAgent(
         env,
         model=args.agent_model,
@@ -38,6 +94,8 @@ async def run_chain(
             "temperature": 1.0,
         },
         verbose=verbose,
+        client=agent_client,
+        cassette=cassette,
     )
 
     chain_dfs = []
@@ -72,9 +130,15 @@ async def run_chain(
             header = not os.path.exists(output_path)
             df_gameplay.to_csv(output_path, mode="a", header=header, index=False)
 
+    if game.prefetcher is not None:
+        await game.prefetcher.await_pending()
+    game.close()
+    if journal is not None:
+        journal.close()
+
     if verbose:
         print(f"Chain {chain_num} final message: {message}")
-    return chain_dfs
+    return chain_dfs, game.world_model
 
 
 async def run_simulations(args):
@@ -88,6 +152,41 @@ async def run_simulations(args):
         except Exception as e:
             print(f"Failed to load checkpoint: {e}")
 
+    # chains share a persistent naming cache if one is configured
+    naming_cache = None
+    if getattr(args, "naming_cache", None):
+        naming_cache = SQLiteNamingCache(here(args.naming_cache))
+    # concurrent chains share in-flight naming requests and agree on names
+    naming_coordinator = NamingCoordinator()
+    # one pooled, rate-limited client for every chain's naming requests
+    fake_server = None
+    agent_client = None
+    if getattr(args, "fake_lm", False):
+        # serve both models locally, e.g. for load testing
+        fake_server = FakeGroqServer().start()
+        lm_client = GroqClient(
+            api_key="fake",
+            url=fake_server.url,
+            default_requests_per_minute=getattr(args, "naming_rpm", None),
+        )
+        agent_client = FakeGenaiClient()
+    else:
+        lm_client = GroqClient(
+            default_requests_per_minute=getattr(args, "naming_rpm", None)
+        )
+
+    # record or replay every LM call if a cassette is configured
+    cassette = None
+    if getattr(args, "cassette", None):
+        cassette = Cassette(here(args.cassette), getattr(args, "cassette_mode", "auto"))
+
+    # chains start from, and add to, one consolidated world model
+    world_model_path = getattr(args, "world_model_path", None)
+    world_model_records = None
+    if world_model_path and os.path.exists(here(world_model_path)):
+        with open(here(world_model_path), "r") as f:
+            world_model_records = list(read_world_model_lines(f))
+
     file_lock = asyncio.Lock()
     tasks = []
     for chain_num in range(args.num_chains):
@@ -101,13 +200,33 @@ async def run_simulations(args):
                 starting_message=args.starting_message,
                 existing_df=existing_df,
                 verbose=args.verbose,
+                naming_cache=naming_cache,
+                naming_coordinator=naming_coordinator,
+                lm_client=lm_client,
+                agent_client=agent_client,
+                cassette=cassette,
+                world_model_records=world_model_records,
             )
         )
 
-    results = await asyncio.gather(*tasks)
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        await lm_client.aclose()
+        if fake_server is not None:
+            fake_server.stop()
+
+    # results has a list of DataFrames and a world model for each chain
+    all_agent_dfs = [df for chain_dfs, _ in results for df in chain_dfs]
 
-    # results is a list of lists of DataFrames (one list per chain)
-    all_agent_dfs = [df for chain_dfs in results for df in chain_dfs]
+    if world_model_path:
+        merged, *others = [world_model for _, world_model in results]
+        conflicts = merged.merge(*others)
+        os.makedirs(os.path.dirname(here(world_model_path)), exist_ok=True)
+        merged.save(here(world_model_path))
+        print(
+            f"Saved {len(merged.combinations)} combinations to {world_model_path} ({conflicts} naming conflicts resolved)"
+        )
 
     df_all_agents = pd.concat(all_agent_dfs)
     # Final save to ensure clean file (though checkpointing appended data)
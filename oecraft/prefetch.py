@@ -0,0 +1,200 @@
+"""
+Speculative naming of the combinations a player is likely to try next.
+
+The pairs that can be combined after a step are fully determined by the
+inventory, so they can be named in the background while the player (or agent)
+decides what to do, and the next step usually finds its name already cached.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_for_futures
+from itertools import combinations
+from typing import Iterable
+
+from oecraft.naming_coordinator import NamingCoordinator
+from oecraft.types import Item, Tool
+from oecraft.world_model import MemoizedWorldModel
+
+logger = logging.getLogger(__name__)
+
+
+def candidate_pairs(
+    inventory: list[Item], new_items: Iterable[Item] = ()
+) -> list[tuple[Item, Item]]:
+    """
+    Every pair of items that can be combined, most likely first: tools applied
+    to new items, then new items with anything else, then tools applied to
+    older items, then the rest.
+    """
+    new_ids = {id(item) for item in new_items}
+    ranked = []
+    for i, j in combinations(range(len(inventory)), 2):
+        a, b = inventory[i], inventory[j]
+        has_tool = isinstance(a, Tool) or isinstance(b, Tool)
+        if isinstance(a, Tool) and isinstance(b, Tool):
+            continue
+        is_new = id(a) in new_ids or id(b) in new_ids
+        rank = (not is_new) * 2 + (not has_tool)
+        ranked.append((rank, i, j))
+    ranked.sort()
+    return [(inventory[i], inventory[j]) for _, i, j in ranked]
+
+
+class NamingPrefetcher:
+    """
+    Names the likely next combinations of an inventory in the background,
+    at most max_workers at a time and at most max_pairs per inventory.
+
+    Each call to prefetch or aprefetch supersedes the previous one: names that
+    are already being requested finish, but pairs still queued for an older
+    inventory are dropped. Naming goes through the world model's naming
+    coordinator, so a step that asks for a pair while it is being prefetched
+    waits for the same request instead of making another.
+    """
+
+    def __init__(
+        self,
+        world_model: MemoizedWorldModel,
+        max_workers: int = 4,
+        max_pairs: int = 8,
+    ):
+        if world_model.naming_coordinator is None:
+            world_model.naming_coordinator = NamingCoordinator()
+        self.world_model = world_model
+        self.max_workers = max_workers
+        self.max_pairs = max_pairs
+        self.generation = 0
+        self.scheduled = 0
+        self.named = 0
+        self.dropped = 0
+        self.failed = 0
+        self._executor = None
+        self._futures = []
+        self._loop = None
+        self._semaphore = None
+        self._tasks = set()
+
+    def pairs_to_name(
+        self, inventory: list[Item], new_items: Iterable[Item] = ()
+    ) -> list[tuple[Item, Item]]:
+        """
+        The highest priority pairs that would need a new name if combined.
+        """
+        if not self.world_model.assign_names:
+            return []
+
+        pairs = []
+        for e1, e2 in candidate_pairs(inventory, new_items):
+            # working out the features is cheap and tells us which pairs need no name at all
+            new_item = self.world_model.transition(e1, e2)
+            if new_item is None or new_item is e1 or new_item is e2:
+                continue
+            if self.world_model.interner.pair(e1, e2) in self.world_model.combinations:
+                continue
+            pairs.append((e1, e2))
+            if len(pairs) >= self.max_pairs:
+                break
+        return pairs
+
+    def _start(self, pairs: list) -> int:
+        self.generation += 1
+        self.scheduled += len(pairs)
+        return self.generation
+
+    def prefetch(self, inventory: list[Item], new_items: Iterable[Item] = ()):
+        """
+        Start naming an inventory's likely next combinations on worker threads.
+        """
+        pairs = self.pairs_to_name(inventory, new_items)
+        generation = self._start(pairs)
+        if not pairs:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="oecraft-prefetch"
+            )
+        self._futures = [f for f in self._futures if not f.done()]
+        # the pool runs jobs in the order they were submitted, i.e. by priority
+        for e1, e2 in pairs:
+            self._futures.append(self._executor.submit(self._name, generation, e1, e2))
+
+    def _name(self, generation: int, e1: Item, e2: Item):
+        if generation != self.generation:
+            self.dropped += 1
+            return
+        try:
+            self.world_model.combine(e1, e2)
+        except Exception:
+            # a failed guess only costs the step that needs it a request
+            self.failed += 1
+            logger.exception("Prefetching %s + %s failed", e1.name, e2.name)
+        else:
+            self.named += 1
+
+    def aprefetch(self, inventory: list[Item], new_items: Iterable[Item] = ()):
+        """
+        Start naming an inventory's likely next combinations as tasks on the
+        running event loop, without waiting for them.
+        """
+        pairs = self.pairs_to_name(inventory, new_items)
+        generation = self._start(pairs)
+        loop = asyncio.get_running_loop()
+        # semaphores belong to an event loop, e.g. one asyncio.run call
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        for e1, e2 in pairs:
+            task = asyncio.ensure_future(
+                self._aname(self._semaphore, generation, e1, e2)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _aname(
+        self, semaphore: asyncio.Semaphore, generation: int, e1: Item, e2: Item
+    ):
+        async with semaphore:
+            if generation != self.generation:
+                self.dropped += 1
+                return
+            try:
+                await self.world_model.acombine(e1, e2)
+            except Exception:
+                self.failed += 1
+                logger.exception("Prefetching %s + %s failed", e1.name, e2.name)
+            else:
+                self.named += 1
+
+    def wait(self):
+        """
+        Block until the names prefetched on worker threads are done.
+        """
+        wait_for_futures(self._futures)
+        self._futures = []
+
+    async def await_pending(self):
+        """
+        Wait for the names prefetched on the event loop to be done.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "named": self.named,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        """
+        Drop queued pairs and wait for the requests in flight to finish.
+        """
+        self.generation += 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._futures = []
@@ -0,0 +1,277 @@
+"""
+The transcript an LM plays a game from, kept so that each turn only costs what
+it adds, however long the game has run, and compacted to a token budget for
+games with many rounds.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterator
+
+from google.genai import types
+
+# what separates texts added to the same message
+SEPARATOR = "\n\n"
+SUMMARY_HEADER = "Summary of earlier rounds:"
+
+_WORD_PATTERN = re.compile(r"\w+")
+_SYMBOL_PATTERN = re.compile(r"[^\w\s]")
+_WIDE_SYMBOL_PATTERN = re.compile(r"[^\w\s\x00-\x7f]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    A local estimate of how many tokens a text takes, which errs high: a word
+    takes a token per four characters and any other symbol takes one, or
+    more for multi-byte ones like emoji.
+    """
+    words = sum((len(word) + 3) // 4 for word in _WORD_PATTERN.findall(text))
+    symbols = len(_SYMBOL_PATTERN.findall(text))
+    wide = sum(
+        len(symbol.encode("utf-8")) - 2 for symbol in _WIDE_SYMBOL_PATTERN.findall(text)
+    )
+    return words + symbols + wide
+
+
+@dataclass
+class HistoryCompaction:
+    """
+    How much of a game's history each request sends. Rounds that ended
+    before the last keep_turns turns (an action and what came of it) are
+    replaced by a summary of them. With max_tokens, the oldest summaries,
+    then the oldest notes and messages, are dropped until the history fits,
+    and the last message is cut short if it doesn't fit on its own.
+    """
+
+    keep_turns: int | None = None
+    max_tokens: int | None = None
+
+
+class PromptHistory:
+    """
+    Messages that are only ever added to. Each message is kept as the texts
+    that were added to it, and consecutive user texts go into one message.
+
+    contents() turns the messages into the LM's Content objects once, and
+    keeps them: only a last message that changed is made again, so a long
+    history costs no more per turn than a short one.
+
+    The history also knows where each round started and, once a round has
+    ended, its summary, which compacted() sends instead of the round.
+    """
+
+    def __init__(self):
+        self._roles = []
+        self._texts = []
+        # the estimated tokens of each text, counted when a budget needs them
+        self._tokens = []
+        # the Content of each message, made up to the first one that changed
+        self._contents = []
+        # where each round and kept text starts, as (message, text) positions
+        self._round_starts = []
+        self._summaries = []
+        self._kept = []
+        # the indices of the model's messages, each of which starts a turn
+        self._turns = []
+        # the last first message made by compacted()
+        self._first = None
+
+    def _next_position(self) -> tuple[int, int]:
+        # where the next user text will go
+        if self._roles and self._roles[-1] == "user":
+            return len(self._roles) - 1, len(self._texts[-1])
+        return len(self._roles), 0
+
+    def add(self, role: str, text: str):
+        """
+        Add a message.
+        """
+        if role == "model":
+            self._turns.append(len(self._roles))
+        self._roles.append(role)
+        self._texts.append([text])
+
+    def add_user_text(self, text: str, keep: bool = False):
+        """
+        Add text to the last message if it is the user's, else start one.
+        Kept texts, e.g. advice from another player, are sent with the
+        summaries of compacted rounds rather than compacted with them.
+        """
+        if keep:
+            self._kept.append((self._next_position(), text, count_tokens(text)))
+        if self._roles and self._roles[-1] == "user":
+            self._texts[-1].append(text)
+            del self._contents[len(self._roles) - 1 :]
+        else:
+            self.add("user", text)
+
+    def start_round(self):
+        """
+        Mark where a new round starts: at the next text added.
+        """
+        self._round_starts.append(self._next_position())
+        self._summaries.append(None)
+
+    def end_round(self, summary: str):
+        """
+        Mark the current round as over, with a summary to send instead of it.
+        """
+        if self._summaries:
+            self._summaries[-1] = (summary, count_tokens(summary))
+
+    @property
+    def rounds(self) -> int:
+        return len(self._round_starts)
+
+    def clear(self):
+        self.__init__()
+
+    def text(self, i: int) -> str:
+        return SEPARATOR.join(self._texts[i])
+
+    def roles(self) -> list[str]:
+        return list(self._roles)
+
+    def contents(self) -> list[types.Content]:
+        """
+        The messages as Content objects. The list is the history's own, so
+        copy it before changing it.
+        """
+        for i in range(len(self._contents), len(self._roles)):
+            self._contents.append(
+                types.Content(
+                    role=self._roles[i], parts=[types.Part.from_text(text=self.text(i))]
+                )
+            )
+        return self._contents
+
+    def _text_tokens(self, message: int) -> list[int]:
+        # counted once per text
+        while len(self._tokens) <= message:
+            self._tokens.append([])
+        tokens = self._tokens[message]
+        for text in self._texts[message][len(tokens) :]:
+            tokens.append(count_tokens(text))
+        return tokens
+
+    def _compacted_rounds(self, keep_turns: int | None) -> int:
+        # the number of rounds, from the first, that ended before the kept turns
+        if keep_turns is None:
+            return 0
+        if keep_turns == 0:
+            boundary = (len(self._roles), 0)
+        elif keep_turns <= len(self._turns):
+            boundary = (self._turns[-keep_turns], 0)
+        else:
+            return 0
+        n = 0
+        for i, summary in enumerate(self._summaries):
+            end = (
+                self._round_starts[i + 1]
+                if i + 1 < len(self._round_starts)
+                else (len(self._roles), 0)
+            )
+            if summary is None or end > boundary:
+                break
+            n += 1
+        return n
+
+    def compacted(self, compaction: HistoryCompaction | None) -> list[types.Content]:
+        """
+        The messages to send under a compaction policy, as a new list. Only
+        the first message can differ from contents(): it starts with the
+        kept texts and summaries of the rounds it replaces.
+        """
+        contents = self.contents()
+        if compaction is None or not contents:
+            return contents[:]
+
+        n_rounds = self._compacted_rounds(compaction.keep_turns)
+        if n_rounds == 0:
+            start = (0, 0)
+        elif n_rounds < len(self._round_starts):
+            start = self._round_starts[n_rounds]
+        else:
+            # every round was summarized, so the summaries go with the last message
+            start = (len(self._roles) - 1, 0)
+        notes = [
+            (text, tokens) for position, text, tokens in self._kept if position < start
+        ]
+        summaries = self._summaries[:n_rounds]
+        message, first_text = start
+
+        max_tokens = compaction.max_tokens
+        over_budget = False
+        if max_tokens is not None:
+            notes, summaries, message, first_text, over_budget = self._fit(
+                max_tokens, notes, summaries, message, first_text
+            )
+
+        preamble = [text for text, _ in notes]
+        if summaries:
+            preamble.append(
+                "\n".join([SUMMARY_HEADER, *(text for text, _ in summaries)])
+            )
+        text = SEPARATOR.join(preamble + self._texts[message][first_text:])
+        if over_budget:
+            # all that's left is too long, so keep its end
+            while text and count_tokens(text) > max_tokens:
+                text = text[
+                    len(text) - len(text) * max_tokens // count_tokens(text) + 1 :
+                ]
+
+        if not preamble and first_text == 0 and text == self.text(message):
+            first_content = contents[message]
+        elif self._first is not None and self._first[0] == (message, text):
+            first_content = self._first[1]
+        else:
+            first_content = types.Content(
+                role=self._roles[message], parts=[types.Part.from_text(text=text)]
+            )
+            # keep it, so the same first message is the same object next time
+            self._first = ((message, text), first_content)
+        return [first_content] + contents[message + 1 :]
+
+    def _fit(
+        self,
+        max_tokens: int,
+        notes: list[tuple[str, int]],
+        summaries: list[tuple[str, int]],
+        message: int,
+        first_text: int,
+    ) -> tuple:
+        # drop the oldest summaries, then notes, then texts until the
+        # messages from (message, first_text) on fit in max_tokens
+        header_tokens = count_tokens(SUMMARY_HEADER) if summaries else 0
+        total = sum(tokens for _, tokens in notes + summaries) + header_tokens
+        total += sum(self._text_tokens(message)[first_text:])
+        total += sum(
+            sum(self._text_tokens(i)) for i in range(message + 1, len(self._roles))
+        )
+
+        while total > max_tokens and summaries:
+            total -= summaries[0][1]
+            summaries = summaries[1:]
+            if not summaries:
+                total -= header_tokens
+        while total > max_tokens and notes:
+            total -= notes[0][1]
+            notes = notes[1:]
+        while total > max_tokens and (
+            message < len(self._roles) - 1 or first_text < len(self._texts[message]) - 1
+        ):
+            total -= self._text_tokens(message)[first_text]
+            first_text += 1
+            if first_text == len(self._texts[message]):
+                message, first_text = message + 1, 0
+        # the model can't speak first
+        while self._roles[message] == "model" and message < len(self._roles) - 1:
+            total -= sum(self._text_tokens(message))
+            message, first_text = message + 1, 0
+        return notes, summaries, message, first_text, total > max_tokens
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def __iter__(self) -> Iterator[types.Content]:
+        return iter(self.contents())
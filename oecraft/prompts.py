@@ -2,90 +2,89 @@
 This file contains prompts for the language model.
 """
 
-import json
-import os
-from dataclasses import asdict, replace
+import threading
+from dataclasses import fields, replace
+from functools import cache
 from typing import Optional
 
-import requests
 from pydantic import BaseModel
-from tenacity import retry, stop_after_attempt, wait_exponential
 
+from oecraft.lm_client import GroqClient, get_default_client
 from oecraft.types import CombinedItem, ICExample, Item, Tool
+from oecraft.utils import IdentityCache
+
+
+@cache
+def _response_format(response_model: BaseModel) -> dict:
+    # Get the schema and prepare it for Groq
+    schema = response_model.model_json_schema()
+
+    # Remove 'title' field if present and add required fields for structured outputs
+    if "title" in schema:
+        schema = {k: v for k, v in schema.items() if k != "title"}
+
+    # Add additionalProperties: false for strict mode
+    if "additionalProperties" not in schema:
+        schema["additionalProperties"] = False
+    # nested models (e.g. the ingredients of a batch) need it too
+    for definition in schema.get("$defs", {}).values():
+        definition.setdefault("additionalProperties", False)
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_model.__name__,
+            "strict": True,
+            "schema": schema,
+        },
+    }
+
+
+def get_completion_payload(
+    model: str,
+    messages: list,
+    response_model: BaseModel,
+    reasoning_effort: str = "medium",
+) -> dict:
+    return {
+        "model": model,
+        "messages": messages,
+        # generating the schema is slow, so every payload shares one (read-only) copy
+        "response_format": _response_format(response_model),
+        "reasoning_effort": reasoning_effort,
+    }
 
 
-@retry(stop=stop_after_attempt(10), wait=wait_exponential())
 def get_completion(
     model: str,
     messages: list,
     response_model: BaseModel,
-    max_retries: int = 5,
     groq_api_key: Optional[str] = None,
     reasoning_effort: str = "medium",
+    client: Optional[GroqClient] = None,
 ) -> dict:
-    last_error = None
-
-    if groq_api_key is None:
-        groq_api_key = os.getenv("GROQ_API_KEY")
-
-    for attempt in range(max_retries):
-        try:
-            # Get the schema and prepare it for Groq
-            schema = response_model.model_json_schema()
-
-            # Remove 'title' field if present and add required fields for structured outputs
-            if "title" in schema:
-                schema = {k: v for k, v in schema.items() if k != "title"}
-
-            # Add additionalProperties: false for strict mode
-            if "additionalProperties" not in schema:
-                schema["additionalProperties"] = False
-
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={"Authorization": f"Bearer {groq_api_key}"},
-                json={
-                    "model": model,
-                    "messages": messages,
-                    "response_format": {
-                        "type": "json_schema",
-                        "json_schema": {
-                            "name": "ItemSemantics",
-                            "strict": True,
-                            "schema": schema,
-                        },
-                    },
-                    "reasoning_effort": reasoning_effort,
-                },
-            )
-
-            # Check if the response is successful
-            response.raise_for_status()
-
-            # Try to parse the JSON response
-            result = response.json()
-
-            # Check if the response contains an error
-            if "error" in result:
-                last_error = result["error"]
-                continue
-
-            semantics = json.loads(result["choices"][0]["message"]["content"])
-
-            # If we got a valid response, return it
-            return semantics
-
-        except (requests.RequestException, ValueError) as e:
-            last_error = str(e)
-            if attempt == max_retries - 1:
-                # This was the last attempt, raise the error
-                raise RuntimeError(
-                    f"Failed to get valid completion after {max_retries} attempts. Last error: {last_error}"
-                )
-
-    # If we exhausted all retries due to API errors (not exceptions)
-    raise RuntimeError(
-        f"Failed to get valid completion after {max_retries} attempts. Last error: {last_error}"
+    if client is None:
+        client = get_default_client(groq_api_key)
+    return client.complete(
+        get_completion_payload(model, messages, response_model, reasoning_effort)
+    )
+
+
+async def aget_completion(
+    model: str,
+    messages: list,
+    response_model: BaseModel,
+    groq_api_key: Optional[str] = None,
+    reasoning_effort: str = "medium",
+    client: Optional[GroqClient] = None,
+) -> dict:
+    """
+    Async version of get_completion, so naming calls don't block the event loop.
+    """
+    if client is None:
+        client = get_default_client(groq_api_key)
+    return await client.acomplete(
+        get_completion_payload(model, messages, response_model, reasoning_effort)
     )
 
 
@@ -94,8 +93,20 @@ class ItemSemantics(BaseModel):
     name: str
 
 
+class BatchItemSemantics(BaseModel):
+    emoji: str
+    name: str
+    ingredients: list[ItemSemantics]
+
+
+@cache
+def _field_names(cls) -> tuple[str, ...]:
+    return tuple(field.name for field in fields(cls))
+
+
 def item_to_dict(item: Item, feature_names: dict) -> Item:
-    item_dict = asdict(item)
+    # a shallow copy gives the same dict as asdict, which deep-copies every value
+    item_dict = {name: getattr(item, name) for name in _field_names(type(item))}
     if "features" in item_dict:
         item_dict["features"] = dict(item.features)
 
@@ -116,6 +127,139 @@ def item_to_dict(item: Item, feature_names: dict) -> Item:
     return item_dict
 
 
+def select_ic_examples(base_ic_examples, ic_examples) -> list:
+    """
+    Pick the first 2 and last 2 of the base examples followed by the learned
+    ones, without concatenating the two (the learned ones may be a deque).
+    """
+    n_base = len(base_ic_examples)
+    if n_base + len(ic_examples) <= 4:
+        return list(base_ic_examples) + list(ic_examples)
+
+    def example_at(i):
+        return base_ic_examples[i] if i < n_base else ic_examples[i - n_base]
+
+    return [example_at(i) for i in _ic_example_positions(n_base + len(ic_examples))]
+
+
+def _ic_example_positions(n_total: int):
+    return range(n_total) if n_total <= 4 else (0, 1, n_total - 2, n_total - 1)
+
+
+def _combination_content(
+    item1: Item, item2: Item, outcome: Item, feature_names: dict
+) -> str:
+    dict_item1 = item_to_dict(item1, feature_names)
+    dict_item2 = item_to_dict(item2, feature_names)
+    dict_outcome = item_to_dict(outcome, feature_names)
+    return f"Item 1: {dict_item1}\nItem 2: {dict_item2}\nOutcome: {dict_outcome}"
+
+
+def ic_example_messages(example: ICExample, feature_names: dict) -> list:
+    """
+    The user and assistant messages that show the model one naming example.
+    """
+    example_item1, example_item2 = example.inputs
+    return [
+        {
+            "role": "user",
+            "content": _combination_content(
+                example_item1, example_item2, example.outcome, feature_names
+            ),
+        },
+        {
+            "role": "assistant",
+            "content": f"{example.semantics}",
+        },
+    ]
+
+
+def select_example_messages(
+    base_ic_examples,
+    ic_examples,
+    item1: Item,
+    item2: Item,
+    outcome: Item,
+    feature_names: dict,
+    template: Optional["NamingPromptTemplate"] = None,
+) -> list:
+    """
+    Messages for the examples to show the model: the ones most similar to the
+    combination if ic_examples is an ICExampleIndex (which includes the base
+    examples), and otherwise the first 2 and last 2. A template for the same
+    base examples reuses messages it has rendered before.
+    """
+    if hasattr(ic_examples, "example_messages"):
+        return ic_examples.example_messages(item1, item2, outcome)
+    if template is not None:
+        return template.example_messages(ic_examples)
+    return [
+        message
+        for example in select_ic_examples(base_ic_examples, ic_examples)
+        for message in ic_example_messages(example, feature_names)
+    ]
+
+
+class NamingPromptTemplate:
+    """
+    The parts of naming prompts that are the same for every request made
+    under one descriptor and naming model, worked out once: the rendered base
+    examples, and each learned example the first time it is shown.
+    """
+
+    def __init__(
+        self,
+        feature_names: dict | None,
+        base_ic_examples: list | None,
+        max_cached_examples: int = 256,
+    ):
+        self.feature_names = feature_names or {}
+        self.base_ic_examples = list(base_ic_examples or [])
+        self.max_cached_examples = max_cached_examples
+        self._base_messages = [
+            ic_example_messages(x, self.feature_names) for x in self.base_ic_examples
+        ]
+        self._learned_messages = IdentityCache(max_cached_examples)
+
+    def _learned_example_messages(self, example: ICExample) -> list:
+        messages = self._learned_messages.get(example)
+        if messages is None:
+            messages = ic_example_messages(example, self.feature_names)
+            self._learned_messages.put(example, messages)
+        return messages
+
+    def example_messages(self, ic_examples) -> list:
+        """
+        Messages for the first 2 and last 2 of the base examples followed by
+        the learned ones, as select_ic_examples picks them.
+        """
+        n_base = len(self.base_ic_examples)
+        messages = []
+        for i in _ic_example_positions(n_base + len(ic_examples)):
+            if i < n_base:
+                messages += self._base_messages[i]
+            else:
+                messages += self._learned_example_messages(ic_examples[i - n_base])
+        return messages
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def naming_prompt_template(
+    key: str, feature_names: dict | None, base_ic_examples: list | None
+) -> NamingPromptTemplate:
+    """
+    Return the process-wide template for a descriptor and naming model, e.g.
+    keyed by a world model's descriptor hash.
+    """
+    with _templates_lock:
+        if key not in _templates:
+            _templates[key] = NamingPromptTemplate(feature_names, base_ic_examples)
+        return _templates[key]
+
+
 def get_combination_messages(
     item1: Item,
     item2: Item,
@@ -123,65 +267,111 @@ def get_combination_messages(
     system_prompt: str,
     feature_names: dict,
     ic_examples: list[ICExample],
+    example_messages: list | None = None,
 ) -> list:
+    """
+    Build the prompt for naming a combination. example_messages, e.g. from
+    select_example_messages, replaces rendering ic_examples.
+    """
     messages = [
         {"role": "system", "content": system_prompt},
     ]
 
-    # the first and last 2 examples are used for the prompt
-    if len(ic_examples) > 4:
-        ic_examples = ic_examples[:2] + ic_examples[-2:]
-
-    for example in ic_examples:
-        example_item1, example_item2 = example.inputs
-        example_outcome = example.outcome
-        dict_item1 = item_to_dict(example_item1, feature_names)
-        dict_item2 = item_to_dict(example_item2, feature_names)
-        dict_outcome = item_to_dict(example_outcome, feature_names)
-        semantics = example.semantics
-
-        messages.append(
-            {
-                "role": "user",
-                "content": f"Item 1: {dict_item1}\nItem 2: {dict_item2}\nOutcome: {dict_outcome}",
-            }
-        )
-        messages.append(
-            {
-                "role": "assistant",
-                "content": f"{semantics}",
-            }
+    if example_messages is None:
+        # the first and last 2 examples are used for the prompt
+        example_messages = select_example_messages(
+            ic_examples, [], item1, item2, outcome, feature_names
         )
+    messages += example_messages
 
-    dict_item1 = item_to_dict(item1, feature_names)
-    dict_item2 = item_to_dict(item2, feature_names)
     # make sure the outcome doesn't have a name or emoji
     outcome = replace(outcome, name="", emoji="")
-    dict_outcome = item_to_dict(outcome, feature_names)
 
     messages += [
         {
             "role": "user",
-            "content": f"Item 1: {dict_item1}\nItem 2: {dict_item2}\nOutcome: {dict_outcome}",
+            "content": _combination_content(item1, item2, outcome, feature_names),
         },
     ]
 
     return messages
 
 
+def get_batch_combination_messages(
+    item1: Item,
+    item2: Item,
+    outcome: Item,
+    components: list[tuple[Item, Item, Item]],
+    system_prompt: str,
+    feature_names: dict,
+    ic_examples: list[ICExample],
+    example_messages: list | None = None,
+) -> list:
+    """
+    Like get_combination_messages, but also asks for names for the components
+    of the outcome that a tool changed, given as (tool, component before,
+    component after) triples.
+    """
+    messages = get_combination_messages(
+        item1,
+        item2,
+        outcome,
+        system_prompt,
+        feature_names,
+        ic_examples,
+        example_messages,
+    )
+    component_contents = [
+        f"Component {i + 1}:\n"
+        + _combination_content(
+            tool, before, replace(after, name="", emoji=""), feature_names
+        )
+        for i, (tool, before, after) in enumerate(components)
+    ]
+    messages[-1]["content"] += (
+        "\n\nThe tool also changed these components of the outcome. Name each of "
+        "them in the same way, in order, in the ingredients list:\n\n"
+        + "\n\n".join(component_contents)
+    )
+    return messages
+
+
 def call_model(
     messages: list,
     lm_string: str,
     reasoning_effort: str = "medium",
     groq_api_key: Optional[str] = None,
+    client: Optional[GroqClient] = None,
 ) -> dict:
     semantics = get_completion(
         model=lm_string,
         messages=messages,
         response_model=ItemSemantics,
-        max_retries=5,
         reasoning_effort=reasoning_effort,
         groq_api_key=groq_api_key,
+        client=client,
+    )
+
+    if len(semantics["emoji"]) > 3:
+        semantics["emoji"] = semantics["emoji"][:3]
+
+    return semantics
+
+
+async def acall_model(
+    messages: list,
+    lm_string: str,
+    reasoning_effort: str = "medium",
+    groq_api_key: Optional[str] = None,
+    client: Optional[GroqClient] = None,
+) -> dict:
+    semantics = await aget_completion(
+        model=lm_string,
+        messages=messages,
+        response_model=ItemSemantics,
+        reasoning_effort=reasoning_effort,
+        groq_api_key=groq_api_key,
+        client=client,
     )
 
     if len(semantics["emoji"]) > 3:
@@ -200,16 +390,166 @@ def get_item_semantics_from_lm(
     feature_names: dict,
     reasoning_effort: str = "medium",
     groq_api_key: Optional[str] = None,
+    client: Optional[GroqClient] = None,
+    template: Optional["NamingPromptTemplate"] = None,
+) -> dict:
+    messages = get_combination_messages(
+        inputs[0],
+        inputs[1],
+        outcome,
+        system_prompt,
+        feature_names,
+        [],
+        select_example_messages(
+            base_ic_examples,
+            ic_examples,
+            inputs[0],
+            inputs[1],
+            outcome,
+            feature_names,
+            template,
+        ),
+    )
+    semantics = call_model(messages, lm_string, reasoning_effort, groq_api_key, client)
+
+    return semantics
+
+
+async def aget_item_semantics_from_lm(
+    inputs: list,
+    outcome: dict,
+    system_prompt: str,
+    base_ic_examples: list,
+    lm_string: str,
+    ic_examples: list,
+    feature_names: dict,
+    reasoning_effort: str = "medium",
+    groq_api_key: Optional[str] = None,
+    client: Optional[GroqClient] = None,
+    template: Optional["NamingPromptTemplate"] = None,
 ) -> dict:
-    all_ic_examples = base_ic_examples + ic_examples
     messages = get_combination_messages(
         inputs[0],
         inputs[1],
         outcome,
         system_prompt,
         feature_names,
-        all_ic_examples,
+        [],
+        select_example_messages(
+            base_ic_examples,
+            ic_examples,
+            inputs[0],
+            inputs[1],
+            outcome,
+            feature_names,
+            template,
+        ),
+    )
+    semantics = await acall_model(
+        messages, lm_string, reasoning_effort, groq_api_key, client
     )
-    semantics = call_model(messages, lm_string, reasoning_effort, groq_api_key)
 
     return semantics
+
+
+def _check_batch_semantics(semantics: dict, n_components: int) -> dict:
+    if len(semantics["ingredients"]) != n_components:
+        raise ValueError(
+            f"Expected names for {n_components} components, got {len(semantics['ingredients'])}"
+        )
+    for named in [semantics, *semantics["ingredients"]]:
+        if len(named["emoji"]) > 3:
+            named["emoji"] = named["emoji"][:3]
+    return semantics
+
+
+def get_batch_item_semantics_from_lm(
+    inputs: list,
+    outcome: Item,
+    components: list[tuple[Item, Item, Item]],
+    system_prompt: str,
+    base_ic_examples: list,
+    lm_string: str,
+    ic_examples: list,
+    feature_names: dict,
+    reasoning_effort: str = "medium",
+    groq_api_key: Optional[str] = None,
+    client: Optional[GroqClient] = None,
+    template: Optional["NamingPromptTemplate"] = None,
+) -> dict:
+    """
+    Name an outcome and the components a tool changed in one request.
+    """
+    messages = get_batch_combination_messages(
+        inputs[0],
+        inputs[1],
+        outcome,
+        components,
+        system_prompt,
+        feature_names,
+        [],
+        select_example_messages(
+            base_ic_examples,
+            ic_examples,
+            inputs[0],
+            inputs[1],
+            outcome,
+            feature_names,
+            template,
+        ),
+    )
+    semantics = get_completion(
+        model=lm_string,
+        messages=messages,
+        response_model=BatchItemSemantics,
+        reasoning_effort=reasoning_effort,
+        groq_api_key=groq_api_key,
+        client=client,
+    )
+    return _check_batch_semantics(semantics, len(components))
+
+
+async def aget_batch_item_semantics_from_lm(
+    inputs: list,
+    outcome: Item,
+    components: list[tuple[Item, Item, Item]],
+    system_prompt: str,
+    base_ic_examples: list,
+    lm_string: str,
+    ic_examples: list,
+    feature_names: dict,
+    reasoning_effort: str = "medium",
+    groq_api_key: Optional[str] = None,
+    client: Optional[GroqClient] = None,
+    template: Optional["NamingPromptTemplate"] = None,
+) -> dict:
+    """
+    Async version of get_batch_item_semantics_from_lm.
+    """
+    messages = get_batch_combination_messages(
+        inputs[0],
+        inputs[1],
+        outcome,
+        components,
+        system_prompt,
+        feature_names,
+        [],
+        select_example_messages(
+            base_ic_examples,
+            ic_examples,
+            inputs[0],
+            inputs[1],
+            outcome,
+            feature_names,
+            template,
+        ),
+    )
+    semantics = await aget_completion(
+        model=lm_string,
+        messages=messages,
+        response_model=BatchItemSemantics,
+        reasoning_effort=reasoning_effort,
+        groq_api_key=groq_api_key,
+        client=client,
+    )
+    return _check_batch_semantics(semantics, len(components))
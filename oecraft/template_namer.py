@@ -0,0 +1,139 @@
+"""
+Rule-based names for new items, made from a game's feature names and naming
+examples without calling the LM, e.g. "cooked soaked rice" or "cooked fish
+and rice". Used instead of placeholder names, or when the LM is over budget,
+too slow, or down.
+"""
+
+import re
+from dataclasses import replace
+from typing import Iterable
+
+from oecraft.types import CombinedItem, ICExample, Item, NonTool, Tool
+
+
+def _join_names(names: list[str]) -> str:
+    names = [" ".join(name.split()) for name in names]
+    if len(names) <= 2:
+        return " and ".join(names)
+    return ", ".join(names[:-1]) + " and " + names[-1]
+
+
+def _remove_word(name: str, word: str) -> str:
+    name = re.sub(rf"(^|\s){re.escape(word)}(?=\s|$)", " ", name)
+    return " ".join(name.split())
+
+
+class TemplateNamer:
+    """
+    Names a tool's result by putting the words for the features it changed in
+    front of the item's name, swapping out the words for their old values, and
+    names combined items after their ingredients. A tool's emoji goes in front
+    of the item's emoji, using the emoji the naming examples show for the tool
+    where there is one.
+    """
+
+    def __init__(
+        self,
+        feature_names: dict | None,
+        ic_examples: Iterable[ICExample] = (),
+        tools: Iterable[Tool] = (),
+    ):
+        self.feature_names = feature_names or {}
+        self.tool_emoji = {}
+        for example in ic_examples:
+            used = [x for x in example.inputs if isinstance(x, Tool)]
+            others = [x for x in example.inputs if not isinstance(x, Tool)]
+            if len(used) != 1 or len(others) != 1 or not others[0].emoji:
+                continue
+            # e.g. stove + 🥕 carrot was named 🔥🥕, so the stove adds 🔥
+            emoji = example.semantics.emoji.replace(others[0].emoji, "", 1)
+            if emoji and emoji != example.semantics.emoji:
+                self.tool_emoji.setdefault(used[0].name, emoji)
+        # what tools add to an item's emoji, to take off again for combined items
+        self._added_emoji = {*self.tool_emoji.values()}
+        self._added_emoji.update(tool.emoji for tool in tools if tool.emoji)
+
+    def _word(self, feature: str, value) -> str | None:
+        """
+        The word for a feature value, e.g. "cooked" for a cook level of 1.
+        """
+        names = self.feature_names.get(feature)
+        if names is not None:
+            if isinstance(value, int) and 0 <= value < len(names):
+                return names[value]
+            return None
+        # features without names, like a potion's extraction, hold a word
+        return value if isinstance(value, str) else None
+
+    def _changed_name(self, before: NonTool, after: NonTool) -> str:
+        # some combination functions name what they make, which we build on
+        name = " ".join((after.name or before.name).split())
+        words = []
+        for feature, value in after.features.items():
+            old_value = before.features.get(feature)
+            if value == old_value:
+                continue
+            old_word = self._word(feature, old_value)
+            if old_word:
+                name = _remove_word(name, old_word)
+            # the first word of a named feature is its default, like "raw"
+            word = self._word(feature, value)
+            if word and (feature not in self.feature_names or value):
+                if not re.search(rf"(^|\s){re.escape(word)}(\s|$)", name):
+                    words.append(word)
+        return " ".join([*words, name]) if name else " ".join(words)
+
+    def _changed_emoji(self, tool: Tool, before: NonTool) -> str:
+        emoji = self.tool_emoji.get(tool.name, tool.emoji)
+        if emoji in before.emoji:
+            return before.emoji
+        return emoji + before.emoji
+
+    def _base_emoji(self, item: Item) -> str:
+        emoji = item.emoji
+        for tool_emoji in self._added_emoji:
+            emoji = emoji.replace(tool_emoji, "")
+        return emoji or item.emoji
+
+    def _combined_emoji(self, items: Iterable[Item]) -> str:
+        emojis = []
+        for item in items:
+            emoji = self._base_emoji(item)
+            if emoji not in emojis:
+                emojis.append(emoji)
+        return "".join(emojis[:4])
+
+    def name(self, e1: Item, e2: Item, new_item: Item) -> Item:
+        """
+        Name the result of combining e1 and e2. When a tool was applied to a
+        combined item, its ingredients that don't have a name yet are named too.
+        """
+        tool, item = (e1, e2) if isinstance(e1, Tool) else (e2, e1)
+        if isinstance(tool, Tool) and isinstance(new_item, CombinedItem):
+            ingredients = tuple(
+                replace(after, name=" ".join(after.name.split()))
+                if after.name
+                else replace(
+                    after,
+                    name=self._changed_name(before, after),
+                    emoji=self._changed_emoji(tool, before),
+                )
+                for before, after in zip(item.ingredients, new_item.ingredients)
+            )
+            new_item = replace(new_item, ingredients=ingredients)
+        elif isinstance(tool, Tool):
+            return replace(
+                new_item,
+                name=self._changed_name(item, new_item),
+                emoji=self._changed_emoji(tool, item),
+            )
+
+        parts = new_item.ingredients if isinstance(new_item, CombinedItem) else ()
+        if not parts:
+            parts = (e1, e2)
+        return replace(
+            new_item,
+            name=_join_names([x.name for x in parts]),
+            emoji=self._combined_emoji(parts),
+        )
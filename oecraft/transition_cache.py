@@ -0,0 +1,77 @@
+"""
+The pure dynamics of a game: what combining two items produces, before any
+naming. Unlike named combinations, transitions never need the language model,
+so search agents can explore as many of them as they like.
+"""
+
+import json
+import threading
+
+from oecraft.naming_cache import item_signature
+from oecraft.types import Item
+
+# the result of a tool that leaves an item unchanged is the item itself, which
+# is stored as this marker so the cache doesn't hold on to one caller's item
+SAME_ITEM = "same item"
+
+_MISSING = object()
+
+
+def transition_key(e1: Item, e2: Item) -> tuple[str, str]:
+    """
+    Order-independent key for the combination of two items.
+    """
+    first, second = sorted(json.dumps(item_signature(x), default=str) for x in (e1, e2))
+    return first, second
+
+
+class TransitionCache:
+    """
+    A thread-safe map from pairs of items to the unnamed result of combining them.
+
+    A cache can be shared by every world model built from the same combination
+    function, e.g. the environments of a vectorized game or a planner's forks.
+
+    With max_size set, the oldest transitions are dropped once there are more
+    than max_size of them; they are only recomputed if they come up again.
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.transitions = {}
+        self.max_size = max_size
+        self.function_hash = None
+        self._lock = threading.Lock()
+
+    def bind(self, function_hash: str):
+        """
+        Tie the cache to a combination function, refusing to mix results of different ones.
+        """
+        with self._lock:
+            if self.function_hash is None:
+                self.function_hash = function_hash
+            elif self.function_hash != function_hash:
+                raise ValueError(
+                    "This transition cache holds results of a different combination function"
+                )
+
+    def get(self, key: tuple[str, str]):
+        """
+        Return the stored result for key (which may be None), or raise KeyError.
+        """
+        result = self.transitions.get(key, _MISSING)
+        if result is _MISSING:
+            raise KeyError(key)
+        return result
+
+    def put(self, key: tuple[str, str], result):
+        with self._lock:
+            result = self.transitions.setdefault(key, result)
+            if self.max_size is not None and len(self.transitions) > self.max_size:
+                del self.transitions[next(iter(self.transitions))]
+            return result
+
+    def __contains__(self, key) -> bool:
+        return key in self.transitions
+
+    def __len__(self) -> int:
+        return len(self.transitions)
@@ -0,0 +1,286 @@
+"""
+Precomputed, integer-indexed transition tables, so that planners can look up
+what a combination makes instead of running the combination function.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+from oecraft.types import CombinedItem, GameDescriptor, Item, Tool
+from oecraft.utils import (
+    IdentityCache,
+    item_from_record,
+    item_to_record,
+    load_function_from_string,
+)
+from oecraft.world_model import MemoizedWorldModel
+
+# child ids for pairs that combine into nothing (two tools) and pairs beyond the table's depth
+NO_RESULT = -1
+UNKNOWN = -2
+
+# how many items from outside a table its index remembers at once
+MAX_REMEMBERED_ITEMS = 10_000
+
+_MISSING = object()
+
+
+def feature_signature(item: Item) -> tuple:
+    """
+    Everything about an item that the combination and value functions look at.
+    Items with the same signature behave identically, whatever they are called.
+    """
+    if isinstance(item, Tool):
+        return ("T", item.name)
+
+    features = sorted(item.features.items())
+    if isinstance(item, CombinedItem):
+        return ("C", features, [feature_signature(ing) for ing in item.ingredients])
+    return ("I", features)
+
+
+def _signature_key(item: Item) -> str:
+    return json.dumps(feature_signature(item), default=str)
+
+
+def descriptor_function_hash(descriptor: GameDescriptor) -> str:
+    payload = json.dumps([descriptor.combination_fn, descriptor.value_fn])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _encode_json(obj) -> np.ndarray:
+    # bytes rather than a numpy string array, which would pad every string to the longest one
+    return np.frombuffer(json.dumps(obj).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_json(array: np.ndarray):
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+class TransitionTable:
+    """
+    Every item reachable from a domain's tools and ingredients within some
+    number of combinations, numbered 0..n_items-1, with each item's value and
+    the id of the item that each pair of items combines into.
+
+    Pairs are stored sparsely as sorted codes (i * n_items + j, with i <= j),
+    since only pairs of items below the maximum depth are ever combined.
+    """
+
+    def __init__(
+        self,
+        records: list[dict],
+        signatures: list[str],
+        values: np.ndarray,
+        depths: np.ndarray,
+        pairs: np.ndarray,
+        children: np.ndarray,
+        max_depth: int,
+        function_hash: str,
+    ):
+        self.records = records
+        self.signatures = signatures
+        self.values = np.asarray(values, dtype=np.int32)
+        self.depths = np.asarray(depths, dtype=np.int16)
+        self.is_tool = np.array([r["kind"] == "tool" for r in records], dtype=bool)
+        self.max_depth = max_depth
+        self.function_hash = function_hash
+
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        codes = pairs[:, 0] * self.n_items + pairs[:, 1]
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.children = np.asarray(children, dtype=np.int32)[order]
+
+        self._ids = None
+        self._children_by_code = None
+        self._items = {}
+        # the ids of the table's own items and of up to MAX_REMEMBERED_ITEMS
+        # others, or None for items the table doesn't contain
+        self._by_identity = IdentityCache(self.n_items + MAX_REMEMBERED_ITEMS)
+
+    @property
+    def n_items(self) -> int:
+        return len(self.records)
+
+    def __len__(self) -> int:
+        return self.n_items
+
+    def lookup(self, left, right) -> np.ndarray:
+        """
+        Vectorized child lookup for arrays of item ids. Returns NO_RESULT for
+        pairs that make nothing and UNKNOWN for pairs the table doesn't cover.
+        """
+        left, right = (
+            np.asarray(left, dtype=np.int64),
+            np.asarray(right, dtype=np.int64),
+        )
+        codes = np.minimum(left, right) * self.n_items + np.maximum(left, right)
+        if len(self.codes) == 0:
+            return np.full(codes.shape, UNKNOWN, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        found = self.codes[positions] == codes
+        return np.where(found, self.children[positions], UNKNOWN)
+
+    def child(self, i: int, j: int) -> int:
+        # single lookups are much faster from a dict than through numpy
+        if self._children_by_code is None:
+            self._children_by_code = dict(
+                zip(self.codes.tolist(), self.children.tolist())
+            )
+        code = i * self.n_items + j if i <= j else j * self.n_items + i
+        return self._children_by_code.get(code, UNKNOWN)
+
+    def item(self, item_id: int) -> Item:
+        """
+        Return the item with the given id, with its value filled in.
+        """
+        item = self._items.get(item_id)
+        if item is None:
+            record = dict(self.records[item_id])
+            if record["kind"] != "tool":
+                record["value"] = int(self.values[item_id])
+            item = item_from_record(record)
+            self._items[item_id] = item
+            self._by_identity.put(item, item_id)
+        return item
+
+    def index(self, item: Item) -> int:
+        """
+        Return the id of an item, raising KeyError if the table doesn't contain it.
+        """
+        item_id = self._by_identity.get(item, _MISSING)
+        if item_id is _MISSING:
+            if self._ids is None:
+                self._ids = {key: i for i, key in enumerate(self.signatures)}
+            # misses are remembered too, since planners keep asking about the same items
+            item_id = self._ids.get(_signature_key(item))
+            self._by_identity.put(item, item_id)
+
+        if item_id is None:
+            raise KeyError(item)
+        return item_id
+
+    def combine(self, e1: Item, e2: Item, fallback=None) -> Item | None:
+        """
+        Look up the result of combining two items, as a drop-in for a world
+        model's transition. Pairs the table doesn't cover go to fallback, or
+        raise KeyError if there isn't one.
+        """
+        try:
+            child = self.child(self.index(e1), self.index(e2))
+            if child == UNKNOWN:
+                raise KeyError((e1, e2))
+        except KeyError:
+            if fallback is None:
+                raise
+            return fallback(e1, e2)
+
+        if child == NO_RESULT:
+            return None
+        return self.item(child)
+
+    def save(self, filepath: str):
+        pairs = np.stack(
+            [self.codes // self.n_items, self.codes % self.n_items], axis=1
+        )
+        np.savez_compressed(
+            filepath,
+            records=_encode_json(self.records),
+            signatures=_encode_json(self.signatures),
+            values=self.values,
+            depths=self.depths,
+            pairs=pairs.astype(np.int32),
+            children=self.children,
+            max_depth=np.array(self.max_depth),
+            function_hash=_encode_json(self.function_hash),
+        )
+
+    @classmethod
+    def load(
+        cls, filepath: str, descriptor: GameDescriptor | None = None
+    ) -> "TransitionTable":
+        """
+        Load a saved table, checking that it was built from descriptor's functions if one is given.
+        """
+        with np.load(filepath) as data:
+            table = cls(
+                records=_decode_json(data["records"]),
+                signatures=_decode_json(data["signatures"]),
+                values=data["values"],
+                depths=data["depths"],
+                pairs=data["pairs"],
+                children=data["children"],
+                max_depth=int(data["max_depth"]),
+                function_hash=_decode_json(data["function_hash"]),
+            )
+        if (
+            descriptor is not None
+            and descriptor_function_hash(descriptor) != table.function_hash
+        ):
+            raise ValueError(
+                f"Transition table {filepath} was built from different game functions"
+            )
+        return table
+
+
+def build_transition_table(
+    descriptor: GameDescriptor, max_depth: int = 2
+) -> TransitionTable:
+    """
+    Enumerate every item reachable from the descriptor's tools and ingredients
+    in at most max_depth rounds of combination, where each round combines
+    every pair of items found so far.
+    """
+    world_model = MemoizedWorldModel(
+        lm="none", combo_function_str=descriptor.combination_fn
+    )
+    value_fn = load_function_from_string(descriptor.value_fn, "value_fn")
+
+    items, signatures, depths, ids = [], [], [], {}
+
+    def add(item: Item, depth: int) -> int:
+        key = _signature_key(item)
+        if key not in ids:
+            ids[key] = len(items)
+            items.append(item)
+            signatures.append(key)
+            depths.append(depth)
+        return ids[key]
+
+    for item in [*descriptor.tools, *descriptor.ingredients]:
+        add(item, 0)
+
+    pairs, children = [], []
+    for depth in range(max_depth):
+        newest = [i for i in range(len(items)) if depths[i] == depth]
+        n_known = len(items)
+        for j in newest:
+            for i in range(n_known):
+                # pairs of two newest items are visited twice, so keep only one order
+                if depths[i] == depth and i > j:
+                    continue
+                e1, e2 = items[min(i, j)], items[max(i, j)]
+                if isinstance(e1, Tool) and isinstance(e2, Tool):
+                    child = NO_RESULT
+                else:
+                    # the dynamics without the memoization, which would only
+                    # hold on to every item we visit a second time
+                    new_item = world_model._combine_features(e1, e2)
+                    child = NO_RESULT if new_item is None else add(new_item, depth + 1)
+                pairs.append((min(i, j), max(i, j)))
+                children.append(child)
+
+    values = [0 if isinstance(item, Tool) else value_fn(item) for item in items]
+    return TransitionTable(
+        records=[item_to_record(item) for item in items],
+        signatures=signatures,
+        values=np.array(values),
+        depths=np.array(depths),
+        pairs=np.array(pairs),
+        children=np.array(children),
+        max_depth=max_depth,
+        function_hash=descriptor_function_hash(descriptor),
+    )
@@ -1,4 +1,5 @@
 import random
+import threading
 from dataclasses import asdict, replace
 from typing import Any, Callable
 
@@ -21,6 +22,36 @@ def dict_to_dataclass(item: dict) -> Item:
         return Ingredient(**item)
 
 
+def item_from_legacy_dict(item: dict) -> Item:
+    """
+    Rebuild an item saved by older versions, which stored features either
+    under "features" or as top-level fields next to "tool", "name" and so on.
+    """
+    if item.get("tool"):
+        return Tool(name=item["name"], emoji=item.get("emoji", ""))
+
+    fields = {
+        "name": item.get("name", ""),
+        "emoji": item.get("emoji", ""),
+        "value": item.get("value", 0),
+        "description": item.get("description", ""),
+    }
+    features = item.get("features")
+    if features is None:
+        skip = {"tool", "ingredients", "features", *fields, *FIELDS_TO_REMOVE}
+        features = {k: v for k, v in item.items() if k not in skip}
+    # JSON turns tuples into lists, which would make the features unhashable
+    fields["features"] = {
+        k: tuple(v) if isinstance(v, list) else v for k, v in features.items()
+    }
+    if "ingredients" in item:
+        return CombinedItem(
+            **fields,
+            ingredients=tuple(item_from_legacy_dict(x) for x in item["ingredients"]),
+        )
+    return Ingredient(**fields)
+
+
 def load_function_from_string(code: str, function_name: str) -> Callable:
     """
     Safely load a function from a string definition.
@@ -47,6 +78,40 @@ def load_function_from_string(code: str, function_name: str) -> Callable:
     return scope[function_name]
 
 
+class IdentityCache:
+    """
+    A thread-safe map from objects to values worked out for them, looked up
+    by identity so that objects are never hashed or compared. Each object is
+    kept while it is cached, which stops its id from being reused.
+
+    Once max_size objects are cached, the oldest are dropped. Lookups don't
+    take the lock.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # id(obj) -> (obj, value), oldest first
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, obj, default=None):
+        entry = self._entries.get(id(obj))
+        return default if entry is None else entry[1]
+
+    def put(self, obj, value):
+        with self._lock:
+            self._entries[id(obj)] = (obj, value)
+            while len(self._entries) > self.max_size:
+                del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class DotDict(dict):
     """
     dot.notation access to dictionary attributes
@@ -59,3 +124,50 @@ class DotDict(dict):
 
     def copy(self):
         return DotDict(super().copy())
+
+
+def item_to_record(item: Item) -> dict:
+    """
+    Convert an item to a JSON-serializable dict that records its type.
+    """
+    if isinstance(item, Tool):
+        return {"kind": "tool", "name": item.name, "emoji": item.emoji}
+
+    record = {
+        "kind": "combined" if isinstance(item, CombinedItem) else "ingredient",
+        "name": item.name,
+        "emoji": item.emoji,
+        "value": item.value,
+        "description": item.description,
+        "features": dict(item.features),
+    }
+    if isinstance(item, CombinedItem):
+        record["ingredients"] = [item_to_record(x) for x in item.ingredients]
+    return record
+
+
+def item_from_record(record: dict) -> Item:
+    """
+    Rebuild an item from the output of item_to_record.
+    """
+    kind = record["kind"]
+    if kind == "tool":
+        return Tool(name=record["name"], emoji=record["emoji"])
+
+    # JSON turns tuples into lists, which would make the features unhashable
+    features = {
+        k: tuple(v) if isinstance(v, list) else v for k, v in record["features"].items()
+    }
+    fields = {
+        "name": record["name"],
+        "emoji": record["emoji"],
+        "value": record["value"],
+        "description": record["description"],
+        "features": features,
+    }
+    if kind == "combined":
+        return CombinedItem(
+            **fields,
+            ingredients=tuple(item_from_record(x) for x in record["ingredients"]),
+        )
+    return Ingredient(**fields)
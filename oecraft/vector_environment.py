@@ -0,0 +1,322 @@
+"""
+Many episodes of a crafting game stepped in lockstep behind gymnasium's vector
+environment API, so that baselines can play lots of episodes at once.
+"""
+
+import multiprocessing as mp
+import os
+from typing import ClassVar, Sequence
+
+import gymnasium as gym
+import numpy as np
+
+from oecraft.encoding import GameEncoder
+from oecraft.environment import CraftingGame
+from oecraft.types import GameDescriptor
+
+
+def _episode_seeds(seed: int | Sequence[int | None] | None, num_envs: int) -> list:
+    if seed is None:
+        return [None] * num_envs
+    if isinstance(seed, int):
+        return [seed + i for i in range(num_envs)]
+    if len(seed) != num_envs:
+        raise ValueError(f"Expected {num_envs} seeds, got {len(seed)}")
+    return list(seed)
+
+
+class VectorCraftingGame(gym.vector.VectorEnv):
+    """
+    num_envs independent episodes of a game that share one world model, so
+    whatever one episode combines (or names) is known to all of them.
+
+    An action is a pair of item names, or None to submit. An episode ends
+    when it submits or, with max_steps, once it has taken that many steps, and
+    the game then submits for it. Following gymnasium's next-step autoreset,
+    an episode that ended is reset by the next step, which ignores its action.
+
+    Observations are tuples with the observation of each episode, as returned
+    by CraftingGame.step. With encode, actions are indices into each episode's
+    pairs of inventory slots (see oecraft.encoding), and observations are one
+    batch of arrays that every step overwrites in place, so copy them to keep
+    them.
+    """
+
+    metadata: ClassVar[dict] = {"autoreset_mode": gym.vector.AutoresetMode.NEXT_STEP}
+
+    def __init__(
+        self,
+        descriptor: GameDescriptor,
+        num_envs: int,
+        model: str = "none",
+        max_steps: int | None = None,
+        encode: bool = False,
+        max_ingredients: int = 8,
+        **game_kwargs,
+    ):
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        first = CraftingGame(descriptor=descriptor, model=model, **game_kwargs)
+        self.world_model = first.world_model
+        self.envs = [first] + [
+            CraftingGame(
+                descriptor=descriptor,
+                model=model,
+                world_model=self.world_model,
+                **game_kwargs,
+            )
+            for _ in range(num_envs - 1)
+        ]
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self._autoreset = np.zeros(num_envs, dtype=bool)
+
+        # episodes are encoded straight into their rows of one batch
+        self.encoder = None
+        if encode:
+            self.encoder = GameEncoder.for_game(first, max_ingredients)
+            self.single_observation_space = self.encoder.observation_space
+            self.single_action_space = self.encoder.action_space
+            self.observation_space = gym.vector.utils.batch_space(
+                self.single_observation_space, num_envs
+            )
+            self.action_space = gym.vector.utils.batch_space(
+                self.single_action_space, num_envs
+            )
+            self._batch = {
+                key: np.zeros((num_envs, *space.shape), dtype=space.dtype)
+                for key, space in self.single_observation_space.spaces.items()
+            }
+            self._rows = [
+                {key: array[i] for key, array in self._batch.items()}
+                for i in range(num_envs)
+            ]
+
+    def _observations(self, observations: list):
+        if self.encoder is None:
+            return tuple(observations)
+        for env, row in zip(self.envs, self._rows):
+            self.encoder.encode(env.inventory, out=row)
+        return self._batch
+
+    def _reset_env(self, i: int, seed: int | None = None) -> dict:
+        self.steps[i] = 0
+        return {"inventory": self.envs[i].reset(seed=seed), "new_item": None}
+
+    def reset(
+        self,
+        *,
+        seed: int | Sequence[int | None] | None = None,
+        options: dict | None = None,
+    ):
+        """
+        Start a new episode in every environment. An integer seed seeds the
+        i-th episode with seed + i.
+        """
+        observations = [
+            self._reset_env(i, episode_seed)
+            for i, episode_seed in enumerate(_episode_seeds(seed, self.num_envs))
+        ]
+        self._autoreset[:] = False
+        return self._observations(observations), {}
+
+    def step(self, actions: Sequence[tuple[str, str] | int | None]):
+        if len(actions) != self.num_envs:
+            raise ValueError(f"Expected {self.num_envs} actions, got {len(actions)}")
+
+        observations = []
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminations = np.zeros(self.num_envs, dtype=bool)
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            if self._autoreset[i]:
+                observations.append(self._reset_env(i))
+                continue
+
+            if self.encoder is not None:
+                action = self.encoder.decode_action(action, env.inventory)
+            obs, reward, done, _ = env.step(action)
+            self.steps[i] += 1
+            if (
+                not done
+                and self.max_steps is not None
+                and self.steps[i] >= self.max_steps
+            ):
+                # out of steps, so the game submits, keeping what the last step made
+                _, reward, done, _ = env.step(None)
+            observations.append(obs)
+            rewards[i] = reward
+            terminations[i] = done
+
+        self._autoreset = terminations.copy()
+        truncations = np.zeros(self.num_envs, dtype=bool)
+        return (
+            self._observations(observations),
+            rewards,
+            terminations,
+            truncations,
+            {},
+        )
+
+    def close_extras(self, **kwargs):
+        # the first env made the shared world model, so it closes it
+        for env in self.envs:
+            env.close()
+
+
+def _worker(connection, descriptor, num_envs, model, max_steps, game_kwargs):
+    env = VectorCraftingGame(descriptor, num_envs, model, max_steps, **game_kwargs)
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == "close":
+                break
+            try:
+                if command == "reset":
+                    result = env.reset(**data)
+                elif command == "step":
+                    result = env.step(data)
+                elif command == "spaces":
+                    result = (env.single_observation_space, env.single_action_space)
+                else:
+                    raise ValueError(f"Unknown command {command}")
+                connection.send((True, result))
+            except Exception as e:
+                connection.send((False, e))
+    finally:
+        env.close()
+        connection.close()
+
+
+class AsyncVectorCraftingGame(gym.vector.VectorEnv):
+    """
+    A VectorCraftingGame split across worker processes, for when stepping is
+    expensive, e.g. when new items are named. Each worker plays a contiguous
+    slice of the episodes with its own world model, which its episodes share.
+    game_kwargs are sent to the workers, so they must be picklable.
+
+    With encode, each worker sends its slice of the batch of arrays, which are
+    concatenated into a new batch.
+    """
+
+    metadata: ClassVar[dict] = {"autoreset_mode": gym.vector.AutoresetMode.NEXT_STEP}
+
+    def __init__(
+        self,
+        descriptor: GameDescriptor,
+        num_envs: int,
+        model: str = "none",
+        max_steps: int | None = None,
+        n_workers: int | None = None,
+        context: str | None = None,
+        encode: bool = False,
+        max_ingredients: int = 8,
+        **game_kwargs,
+    ):
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.encode = encode
+        game_kwargs = {
+            **game_kwargs,
+            "encode": encode,
+            "max_ingredients": max_ingredients,
+        }
+        n_workers = min(n_workers or os.cpu_count() or 1, num_envs)
+        self.worker_sizes = [
+            len(x) for x in np.array_split(np.arange(num_envs), n_workers)
+        ]
+        ctx = mp.get_context(context)
+        self.connections = []
+        self.processes = []
+        for size in self.worker_sizes:
+            parent, child = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(child, descriptor, size, model, max_steps, game_kwargs),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+        if encode:
+            self.connections[0].send(("spaces", None))
+            ok, result = self.connections[0].recv()
+            if not ok:
+                raise result
+            self.single_observation_space, self.single_action_space = result
+            self.observation_space = gym.vector.utils.batch_space(
+                self.single_observation_space, num_envs
+            )
+            self.action_space = gym.vector.utils.batch_space(
+                self.single_action_space, num_envs
+            )
+
+    def _receive(self) -> list:
+        results = []
+        errors = []
+        for connection in self.connections:
+            ok, result = connection.recv()
+            (results if ok else errors).append(result)
+        if errors:
+            raise errors[0]
+        return results
+
+    def _observations(self, batches: list):
+        if self.encode:
+            return {
+                key: np.concatenate([batch[key] for batch in batches])
+                for key in batches[0]
+            }
+        return tuple(obs for batch in batches for obs in batch)
+
+    def _gather(self, results: list):
+        observations = self._observations([result[0] for result in results])
+        rewards, terminations, truncations = (
+            np.concatenate([result[i] for result in results]) for i in (1, 2, 3)
+        )
+        return observations, rewards, terminations, truncations, {}
+
+    def reset(
+        self,
+        *,
+        seed: int | Sequence[int | None] | None = None,
+        options: dict | None = None,
+    ):
+        seeds = _episode_seeds(seed, self.num_envs)
+        start = 0
+        for connection, size in zip(self.connections, self.worker_sizes):
+            connection.send(
+                ("reset", {"seed": seeds[start : start + size], "options": options})
+            )
+            start += size
+        results = self._receive()
+        return self._observations([result[0] for result in results]), {}
+
+    def step_async(self, actions: Sequence[tuple[str, str] | int | None]):
+        """
+        Send the actions to the workers without waiting for them to step.
+        """
+        if len(actions) != self.num_envs:
+            raise ValueError(f"Expected {self.num_envs} actions, got {len(actions)}")
+        start = 0
+        for connection, size in zip(self.connections, self.worker_sizes):
+            connection.send(("step", list(actions[start : start + size])))
+            start += size
+
+    def step_wait(self):
+        return self._gather(self._receive())
+
+    def step(self, actions: Sequence[tuple[str, str] | int | None]):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close_extras(self, **kwargs):
+        for connection in self.connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+        for connection in self.connections:
+            connection.close()
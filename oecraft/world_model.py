@@ -2,15 +2,46 @@
 This file handles interfacing with the language model to get new crafting instructions.
 """
 
+import asyncio
+import concurrent.futures
+import hashlib
 import json
-from ast import literal_eval
+import logging
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, replace
+from typing import Iterable, Iterator
 
 from frozendict import frozendict
 
-from oecraft.prompts import get_item_semantics_from_lm
+from oecraft.cassette import Cassette
+from oecraft.ic_example_index import ICExampleIndex
+from oecraft.journal import (
+    WorldModelJournal,
+    journal_header,
+    read_world_model_lines,
+    write_journal,
+)
+from oecraft.lm_client import CompletionError, GroqClient
+from oecraft.naming_cache import NamingCache, NamingPack, combination_key
+from oecraft.naming_coordinator import NamingCoordinator
+from oecraft.prompts import (
+    aget_batch_item_semantics_from_lm,
+    aget_item_semantics_from_lm,
+    get_batch_item_semantics_from_lm,
+    get_item_semantics_from_lm,
+    naming_prompt_template,
+)
+from oecraft.template_namer import TemplateNamer
+from oecraft.transition_cache import SAME_ITEM, TransitionCache, transition_key
 from oecraft.types import CombinedItem, ICExample, Item, ItemSemantics, NonTool, Tool
-from oecraft.utils import dict_to_dataclass, load_function_from_string
+from oecraft.utils import (
+    IdentityCache,
+    item_from_record,
+    item_to_record,
+    load_function_from_string,
+)
 
 
 def freeze_item(item: Item) -> Item:
@@ -41,6 +72,36 @@ def thaw_item(item: Item) -> Item:
         return replace(item, features=dict(item.features))
 
 
+def combination_record(e1: Item, e2: Item, new_item: Item) -> dict:
+    return {
+        "type": "combination",
+        "inputs": [item_to_record(e1), item_to_record(e2)],
+        "outcome": item_to_record(new_item),
+    }
+
+
+def combination_from_record(record: dict) -> tuple[Item, Item, Item]:
+    e1, e2 = (item_from_record(x) for x in record["inputs"])
+    return e1, e2, item_from_record(record["outcome"])
+
+
+def ic_example_from_record(record: dict) -> ICExample:
+    return ICExample(
+        inputs=tuple(item_from_record(x) for x in record["inputs"]),
+        outcome=item_from_record(record["outcome"]),
+        semantics=ItemSemantics(**record["semantics"]),
+    )
+
+
+def ic_example_record(example: ICExample) -> dict:
+    return {
+        "type": "ic_example",
+        "inputs": [item_to_record(x) for x in example.inputs],
+        "outcome": item_to_record(example.outcome),
+        "semantics": {"emoji": example.semantics.emoji, "name": example.semantics.name},
+    }
+
+
 def check_if_same_item(e1: NonTool, e2: NonTool) -> bool:
     if type(e1) is not type(e2):
         return False
@@ -50,6 +111,86 @@ def check_if_same_item(e1: NonTool, e2: NonTool) -> bool:
         return e1.features == e2.features
 
 
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# what a naming request can fail with: the client giving up, or a request
+# that took longer than naming_timeout
+NAMING_ERRORS = (
+    CompletionError,
+    TimeoutError,
+    asyncio.TimeoutError,
+    concurrent.futures.TimeoutError,
+)
+# a batch can also come back with the wrong number of names
+BATCH_NAMING_ERRORS = (*NAMING_ERRORS, ValueError)
+
+# how many item objects an interner remembers by default, see ItemInterner
+MAX_IDENTITIES = 10_000
+# default cap on each of a world model's memos, see MemoizedWorldModel
+MAX_COMBINATIONS = 100_000
+
+
+class ItemInterner:
+    """
+    Gives each structurally distinct item a small integer id.
+
+    Items are looked up by object identity first, so an item that has been
+    seen recently (among the last max_identities) is never frozen or hashed
+    again.
+
+    With max_items set, the least recently interned items are forgotten.
+    Ids are never reused, so a memo entry keyed by a forgotten id is never
+    wrong, only unreachable, and ages out of the memo's own LRU.
+    """
+
+    def __init__(
+        self, max_items: int | None = None, max_identities: int = MAX_IDENTITIES
+    ):
+        self.items = {}
+        # least recently interned first, when max_items is set
+        self.ids = OrderedDict()
+        self.max_items = max_items
+        self._next_id = 0
+        self._by_identity = IdentityCache(max_identities)
+        self._lock = threading.Lock()
+
+    def intern(self, item: Item) -> int:
+        item_id = self._by_identity.get(item)
+        if item_id is not None:
+            return item_id
+
+        frozen = freeze_item(item)
+        # two threads interning new items at once must not hand out the same id
+        with self._lock:
+            item_id = self.ids.get(frozen)
+            if item_id is None:
+                item_id = self._next_id
+                self._next_id += 1
+                self.ids[frozen] = item_id
+                self.items[item_id] = frozen
+                while self.max_items is not None and len(self.ids) > self.max_items:
+                    del self.items[self.ids.popitem(last=False)[1]]
+            elif self.max_items is not None:
+                self.ids.move_to_end(frozen)
+        self._by_identity.put(item, item_id)
+        return item_id
+
+    def pair(self, e1: Item, e2: Item) -> tuple[int, int]:
+        """
+        Return an order-independent key for a combination of two items.
+        """
+        i, j = self.intern(e1), self.intern(e2)
+        return (i, j) if i <= j else (j, i)
+
+    def __getitem__(self, item_id: int) -> Item:
+        return self.items[item_id]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
 class MemoizedWorldModel:
     def __init__(
         self,
@@ -61,10 +202,39 @@ class MemoizedWorldModel:
         feature_names: dict | None = None,
         reasoning_effort: str = "medium",
         groq_api_key: str | None = None,
+        naming_cache: NamingCache | None = None,
+        naming_coordinator: NamingCoordinator | None = None,
+        lm_client: GroqClient | None = None,
+        cassette: Cassette | None = None,
+        transition_cache: TransitionCache | None = None,
+        journal: WorldModelJournal | None = None,
+        max_combinations: int | None = None,
+        max_ic_examples: int | None = None,
+        batch_naming: bool = True,
+        naming_pack: NamingPack | None = None,
+        ic_retrieval_k: int | None = None,
+        template_namer: TemplateNamer | None = None,
+        max_lm_requests: int | None = None,
+        naming_timeout: float | None = None,
     ):
         self.lm = lm
-        self.ic_examples = []
-        self.combinations = {}
+        # least recently used first, when max_combinations is set. This caps
+        # the model's own memos, transitions, template keys and interned items
+        # alike; shared transition caches and coordinators take their own bounds
+        self.combinations = OrderedDict()
+        self.transitions = {}
+        self.max_combinations = max_combinations
+        self.max_ic_examples = max_ic_examples
+        self.batch_naming = batch_naming
+        self.interner = ItemInterner(max_items=max_combinations)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.ic_examples_added = 0
+        self.lm_requests = 0
+        self.template_names = 0
+        # guards the memo against background naming, see oecraft.prefetch
+        self._lock = threading.Lock()
         self.combo_function = load_function_from_string(
             combo_function_str, "combination_fn"
         )
@@ -72,10 +242,57 @@ class MemoizedWorldModel:
         self.naming_system_prompt = naming_system_prompt
         self.naming_ic_examples = naming_ic_examples
         self.feature_names = feature_names
+        self.ic_retrieval_k = ic_retrieval_k
+        self.ic_examples = self._new_ic_examples()
+        # names items without the LM, see _add_template_names
+        self.template_namer = template_namer
+        self.max_lm_requests = max_lm_requests
+        self.naming_timeout = naming_timeout
+        self._naming_executor = None
+        # combinations with template names, which aren't shared or journaled.
+        # Oldest first, and dropped along with their memo entries
+        self._template_keys = OrderedDict()
         self.reasoning_effort = reasoning_effort
         self.groq_api_key = groq_api_key
+        self.naming_cache = naming_cache
+        self.naming_pack = naming_pack
+        self.naming_coordinator = naming_coordinator
+        self.lm_client = lm_client
+        self.cassette = cassette
+        self.transition_cache = (
+            transition_cache if transition_cache is not None else TransitionCache()
+        )
+        self.transition_cache.bind(
+            hashlib.sha256(combo_function_str.encode("utf-8")).hexdigest()
+        )
+        self.descriptor_hash = hashlib.sha256(
+            json.dumps(
+                [
+                    lm,
+                    combo_function_str,
+                    naming_system_prompt,
+                    repr(naming_ic_examples),
+                    feature_names,
+                    reasoning_effort,
+                ],
+                default=str,
+            ).encode("utf-8")
+        ).hexdigest()
+        if naming_pack is not None:
+            naming_pack.check(self.descriptor_hash)
+        # shared by every world model of the same game and naming model
+        self.prompt_template = naming_prompt_template(
+            self.descriptor_hash, feature_names, naming_ic_examples
+        )
 
-    def combine_elements(self, e1: Item, e2: Item):
+        # pick up where the journal left off, then record everything new to it
+        self.journal = None
+        if journal is not None:
+            self._load_records(journal.records())
+            journal.open(self._header())
+            self.journal = journal
+
+    def _combine_features(self, e1: Item, e2: Item):
         new_item = self.combo_function(e1, e2)
         if new_item is None:
             return None
@@ -87,206 +304,725 @@ class MemoizedWorldModel:
         elif isinstance(e2, Tool) and check_if_same_item(new_item, e1):
             return e1
 
-        if self.assign_names:
-            # if we applied a tool to a combined item, we need to assign names to the updated ingredients
+        return new_item
+
+    def transition(self, e1: Item, e2: Item):
+        """
+        Return the result of combining two items without naming it, so this
+        never calls the language model. The result has the right features (and
+        so the right value), which is all a planner needs.
+        """
+        pair = self.interner.pair(e1, e2)
+        # a single get, since prefetch threads may evict the pair at any time
+        new_item = self.transitions.get(pair, _MISSING)
+        if new_item is _MISSING:
+            key = transition_key(e1, e2)
+            try:
+                new_item = self.transition_cache.get(key)
+            except KeyError:
+                new_item = self._combine_features(e1, e2)
+                if new_item is e1 or new_item is e2:
+                    new_item = SAME_ITEM
+                new_item = self.transition_cache.put(key, new_item)
+            with self._lock:
+                self.transitions[pair] = new_item
+                if (
+                    self.max_combinations is not None
+                    and len(self.transitions) > self.max_combinations
+                ):
+                    # transitions are cheap to recompute, so just drop the oldest
+                    del self.transitions[next(iter(self.transitions))]
+
+        if new_item is SAME_ITEM:
+            return e2 if isinstance(e1, Tool) else e1
+        return new_item
+
+    def _new_ic_examples(self, examples: Iterable[ICExample] = ()):
+        if self.ic_retrieval_k is None:
+            # prompts only use the last couple of learned examples, so a ring buffer loses nothing
+            return deque(examples, maxlen=self.max_ic_examples)
+        # with retrieval, prompts show the examples most similar to each combination
+        return ICExampleIndex(
+            self.feature_names,
+            base_examples=self.naming_ic_examples or [],
+            k=self.ic_retrieval_k,
+            maxlen=self.max_ic_examples,
+            examples=examples,
+        )
+
+    def _tool_applied_to_combined_item(self, e1: Item, e2: Item):
+        """
+        If a (non-frame) tool was applied to a combined item, return the tool and the item.
+        """
+        if isinstance(e1, CombinedItem) and isinstance(e2, Tool) and e2.name != "frame":
+            return e2, e1
+        if isinstance(e2, CombinedItem) and isinstance(e1, Tool) and e1.name != "frame":
+            return e1, e2
+        return None
+
+    def _add_ingredient_names(self, new_item: CombinedItem, named_ingredients: list):
+        new_ingredients = [
+            replace(ingredient, name=named.name, emoji=named.emoji)
+            for ingredient, named in zip(new_item.ingredients, named_ingredients)
+        ]
+        return replace(new_item, ingredients=tuple(new_ingredients))
+
+    def _add_semantics(self, e1: Item, e2: Item, new_item: Item, semantics: dict):
+        example = ICExample(
+            inputs=(e1, e2),
+            outcome=new_item,
+            semantics=ItemSemantics(emoji=semantics["emoji"], name=semantics["name"]),
+        )
+        self.ic_examples.append(example)
+        self.ic_examples_added += 1
+        if self.journal is not None:
+            self.journal.append(ic_example_record(example))
+
+        return replace(new_item, name=semantics["name"], emoji=semantics["emoji"])
+
+    def _add_placeholder_names(self, e1: Item, e2: Item, new_item: Item):
+        if isinstance(e1, CombinedItem) and isinstance(e2, Tool):
+            new_ingredients = []
+            for i in range(len(new_item.ingredients)):
+                named_ingredient = replace(
+                    new_item.ingredients[i],
+                    name=f"[{e1.ingredients[i].name}-{e2.name}]",
+                    emoji="❓",
+                )
+                new_ingredients.append(named_ingredient)
+            new_item = replace(new_item, ingredients=tuple(new_ingredients))
+        elif isinstance(e2, CombinedItem) and isinstance(e1, Tool):
+            new_ingredients = []
+            for i in range(len(new_item.ingredients)):
+                named_ingredient = replace(
+                    new_item.ingredients[i],
+                    name=f"[{e1.name}-{e2.ingredients[i].name}]",
+                    emoji="❓",
+                )
+                new_ingredients.append(named_ingredient)
+            new_item = replace(new_item, ingredients=tuple(new_ingredients))
+        return replace(new_item, name=f"[{e1.name}]-[{e2.name}]", emoji="❓")
+
+    def _add_template_names(self, e1: Item, e2: Item, new_item: Item):
+        if self.template_namer is None:
+            return self._add_placeholder_names(e1, e2, new_item)
+        self.template_names += 1
+        # keep template names out of the naming cache, the coordinator and the
+        # journal, so the LM can name these later
+        with self._lock:
+            self._template_keys[combination_key(e1, e2, self.descriptor_hash)] = None
             if (
-                isinstance(e1, CombinedItem)
-                and isinstance(e2, Tool)
-                and e2.name != "frame"
+                self.max_combinations is not None
+                and len(self._template_keys) > self.max_combinations
             ):
-                new_ingredients = []
-                for i in range(len(new_item.ingredients)):
-                    named_ingredient = self.combine(e1.ingredients[i], e2)
-                    new_ingredients.append(
-                        replace(
-                            named_ingredient,
-                            name=named_ingredient.name,
-                            emoji=named_ingredient.emoji,
-                        )
-                    )
-                new_item = replace(new_item, ingredients=tuple(new_ingredients))
-            elif (
-                isinstance(e2, CombinedItem)
-                and isinstance(e1, Tool)
-                and e1.name != "frame"
-            ):
-                new_ingredients = []
-                for i in range(len(new_item.ingredients)):
-                    named_ingredient = self.combine(e1, e2.ingredients[i])
-                    new_ingredients.append(
-                        replace(
-                            new_item.ingredients[i],
-                            name=named_ingredient.name,
-                            emoji=named_ingredient.emoji,
-                        )
-                    )
-                new_item = replace(new_item, ingredients=tuple(new_ingredients))
-
-            semantics = get_item_semantics_from_lm(
-                [e1, e2],
-                new_item,
-                self.naming_system_prompt,
-                self.naming_ic_examples,
-                self.lm,
-                self.ic_examples,
-                self.feature_names,
-                self.reasoning_effort,
-                self.groq_api_key,
+                self._template_keys.popitem(last=False)
+        return self.template_namer.name(e1, e2, new_item)
+
+    def _has_template_name(self, e1: Item, e2: Item) -> bool:
+        return bool(self._template_keys) and (
+            combination_key(e1, e2, self.descriptor_hash) in self._template_keys
+        )
+
+    def _lm_budget_left(self) -> bool:
+        return self.max_lm_requests is None or self.lm_requests < self.max_lm_requests
+
+    def _call_lm(self, request):
+        with self._lock:
+            self.lm_requests += 1
+        if self.naming_timeout is None:
+            return request()
+        if self._naming_executor is None:
+            self._naming_executor = ThreadPoolExecutor(max_workers=4)
+        # a blocking request can't be cancelled, so a late one finishes in the background
+        return self._naming_executor.submit(request).result(timeout=self.naming_timeout)
+
+    def close(self):
+        """
+        Stop the thread that runs timed naming requests. A request still
+        running is left to finish in the background.
+        """
+        if self._naming_executor is not None:
+            self._naming_executor.shutdown(wait=False, cancel_futures=True)
+            self._naming_executor = None
+
+    async def _acall_lm(self, request):
+        with self._lock:
+            self.lm_requests += 1
+        return await asyncio.wait_for(request(), self.naming_timeout)
+
+    def _naming_args(self, e1: Item, e2: Item, new_item: Item) -> tuple:
+        return (
+            [e1, e2],
+            new_item,
+            self.naming_system_prompt,
+            self.naming_ic_examples,
+            self.lm,
+            self.ic_examples,
+            self.feature_names,
+            self.reasoning_effort,
+            self.groq_api_key,
+            self.lm_client,
+            self.prompt_template,
+        )
+
+    def _batch_naming_args(
+        self, e1: Item, e2: Item, new_item: Item, components: list
+    ) -> tuple:
+        naming_args = self._naming_args(e1, e2, new_item)
+        return (*naming_args[:2], components, *naming_args[2:])
+
+    def _cassette_request(self, e1: Item, e2: Item) -> dict:
+        # Key recorded names by combination rather than by prompt: the in-context
+        # examples in the prompt depend on which of several concurrent chains
+        # happened to name something first, which differs between runs.
+        return {"naming": combination_key(e1, e2, self.descriptor_hash)}
+
+    def _share(self, e1: Item, e2: Item, new_item: Item) -> Item:
+        """
+        Publish a name that was assigned outside of combine, keeping the first
+        name anyone assigned to the combination.
+        """
+        if not self._uses_shared_names():
+            return new_item
+        key = combination_key(e1, e2, self.descriptor_hash)
+        if key in self._template_keys:
+            return new_item
+        if self.naming_coordinator is not None:
+            new_item = self.naming_coordinator.claim(key, new_item)
+        if self.naming_cache is not None:
+            self.naming_cache.put(key, item_to_record(new_item))
+        return new_item
+
+    def _known_ingredient_names(self, tool: Tool, item: CombinedItem):
+        """
+        Look up names for what tool does to each of item's ingredients without
+        calling the LM. Returns the named ingredients, with None for the ones
+        that still need a name, and (index, unnamed result) pairs for those.
+        """
+        named, pending = [], []
+        for i, ingredient in enumerate(item.ingredients):
+            changed = self.transition(tool, ingredient)
+            if changed is ingredient:
+                named.append(ingredient)
+                continue
+
+            items = self.interner.pair(tool, ingredient)
+            known = self._lookup(items)
+            if known is None and self._uses_shared_names():
+                key = combination_key(tool, ingredient, self.descriptor_hash)
+                if self.naming_coordinator is not None:
+                    known = self.naming_coordinator.names.get(key)
+                if known is None:
+                    record = self._stored_record(key)
+                    known = None if record is None else item_from_record(record)
+                if known is not None:
+                    self._remember(items, tool, ingredient, known)
+
+            named.append(known)
+            if known is None:
+                pending.append((i, changed))
+        return named, pending
+
+    def _batch_cassette_request(
+        self, e1: Item, e2: Item, tool: Tool, item: CombinedItem, pending: list
+    ) -> dict:
+        return {
+            "naming_batch": [
+                combination_key(e1, e2, self.descriptor_hash),
+                [
+                    combination_key(tool, item.ingredients[i], self.descriptor_hash)
+                    for i, _ in pending
+                ],
+            ]
+        }
+
+    def _add_batch_semantics(
+        self,
+        e1: Item,
+        e2: Item,
+        new_item: CombinedItem,
+        tool: Tool,
+        item: CombinedItem,
+        named: list,
+        pending: list,
+        semantics: dict,
+    ) -> Item:
+        for (i, changed), ingredient_semantics in zip(
+            pending, semantics["ingredients"]
+        ):
+            ingredient = item.ingredients[i]
+            named_ingredient = self._add_semantics(
+                tool, ingredient, changed, ingredient_semantics
             )
-            self.ic_examples.append(
-                ICExample(
-                    inputs=(e1, e2),
-                    outcome=new_item,
-                    semantics=ItemSemantics(
-                        emoji=semantics["emoji"], name=semantics["name"]
-                    ),
-                )
+            named_ingredient = self._share(tool, ingredient, named_ingredient)
+            self._remember(
+                self.interner.pair(tool, ingredient), tool, ingredient, named_ingredient
             )
+            named[i] = named_ingredient
 
-            new_item = replace(
-                new_item, name=semantics["name"], emoji=semantics["emoji"]
+        new_item = self._add_ingredient_names(new_item, named)
+        return self._add_semantics(e1, e2, new_item, semantics)
+
+    def _batch_components(self, new_item, tool, item, named, pending):
+        # the outcome shows the names we already know and leaves the rest blank
+        outcome = self._add_ingredient_names(
+            new_item,
+            [
+                known if known is not None else after
+                for known, after in zip(named, new_item.ingredients)
+            ],
+        )
+        components = [(tool, item.ingredients[i], changed) for i, changed in pending]
+        return outcome, components
+
+    def _name_in_batch(self, e1, e2, new_item, tool, item, named, pending):
+        outcome, components = self._batch_components(
+            new_item, tool, item, named, pending
+        )
+        naming_args = self._batch_naming_args(e1, e2, outcome, components)
+        if self.cassette is None:
+            semantics = self._call_lm(
+                lambda: get_batch_item_semantics_from_lm(*naming_args)
+            )
+        else:
+            semantics = self._call_lm(
+                lambda: self.cassette.call(
+                    self._batch_cassette_request(e1, e2, tool, item, pending),
+                    lambda: get_batch_item_semantics_from_lm(*naming_args),
+                )
             )
+        return self._add_batch_semantics(
+            e1, e2, new_item, tool, item, named, pending, semantics
+        )
 
+    async def _aname_in_batch(self, e1, e2, new_item, tool, item, named, pending):
+        outcome, components = self._batch_components(
+            new_item, tool, item, named, pending
+        )
+        naming_args = self._batch_naming_args(e1, e2, outcome, components)
+        if self.cassette is None:
+            semantics = await self._acall_lm(
+                lambda: aget_batch_item_semantics_from_lm(*naming_args)
+            )
         else:
-            if isinstance(e1, CombinedItem) and isinstance(e2, Tool):
-                new_ingredients = []
-                for i in range(len(new_item.ingredients)):
-                    named_ingredient = replace(
-                        new_item.ingredients[i],
-                        name=f"[{e1.ingredients[i].name}-{e2.name}]",
-                        emoji="❓",
+            semantics = await self._acall_lm(
+                lambda: self.cassette.acall(
+                    self._batch_cassette_request(e1, e2, tool, item, pending),
+                    lambda: aget_batch_item_semantics_from_lm(*naming_args),
+                )
+            )
+        return self._add_batch_semantics(
+            e1, e2, new_item, tool, item, named, pending, semantics
+        )
+
+    def combine_elements(self, e1: Item, e2: Item):
+        new_item = self.transition(e1, e2)
+        if new_item is None or new_item is e1 or new_item is e2:
+            return new_item
+
+        if not self.assign_names:
+            return self._add_template_names(e1, e2, new_item)
+
+        # if we applied a tool to a combined item, we need to assign names to the updated ingredients
+        tool_and_item = self._tool_applied_to_combined_item(e1, e2)
+        if tool_and_item is not None:
+            tool, item = tool_and_item
+            named, pending = self._known_ingredient_names(tool, item)
+            if pending and self.batch_naming and self._lm_budget_left():
+                # name the item and its changed ingredients in a single request
+                try:
+                    return self._name_in_batch(
+                        e1, e2, new_item, tool, item, named, pending
+                    )
+                except BATCH_NAMING_ERRORS as e:
+                    logger.warning(
+                        "Batch naming failed, naming items one at a time: %s", e
+                    )
+            named_ingredients = [self.combine(tool, ing) for ing in item.ingredients]
+            new_item = self._add_ingredient_names(new_item, named_ingredients)
+
+        if not self._lm_budget_left():
+            return self._add_template_names(e1, e2, new_item)
+
+        naming_args = self._naming_args(e1, e2, new_item)
+        try:
+            if self.cassette is None:
+                semantics = self._call_lm(
+                    lambda: get_item_semantics_from_lm(*naming_args)
+                )
+            else:
+                semantics = self._call_lm(
+                    lambda: self.cassette.call(
+                        self._cassette_request(e1, e2),
+                        lambda: get_item_semantics_from_lm(*naming_args),
+                    )
+                )
+        except NAMING_ERRORS as e:
+            if self.template_namer is None:
+                raise
+            logger.warning("Naming failed, using a template name instead: %r", e)
+            return self._add_template_names(e1, e2, new_item)
+        return self._add_semantics(e1, e2, new_item, semantics)
+
+    async def acombine_elements(self, e1: Item, e2: Item):
+        """
+        Async version of combine_elements. If batch naming fails, the ingredients
+        of a combined item are named concurrently.
+        """
+        new_item = self.transition(e1, e2)
+        if new_item is None or new_item is e1 or new_item is e2:
+            return new_item
+
+        if not self.assign_names:
+            return self._add_template_names(e1, e2, new_item)
+
+        tool_and_item = self._tool_applied_to_combined_item(e1, e2)
+        if tool_and_item is not None:
+            tool, item = tool_and_item
+            named, pending = self._known_ingredient_names(tool, item)
+            if pending and self.batch_naming and self._lm_budget_left():
+                try:
+                    return await self._aname_in_batch(
+                        e1, e2, new_item, tool, item, named, pending
                     )
-                    new_ingredients.append(named_ingredient)
-                new_item = replace(new_item, ingredients=tuple(new_ingredients))
-            elif isinstance(e2, CombinedItem) and isinstance(e1, Tool):
-                for i in range(len(new_item.ingredients)):
-                    named_ingredient = replace(
-                        new_item.ingredients[i],
-                        name=f"[{e1.name}-{e2.ingredients[i].name}]",
-                        emoji="❓",
+                except BATCH_NAMING_ERRORS as e:
+                    logger.warning(
+                        "Batch naming failed, naming items one at a time: %s", e
                     )
-                    new_ingredients.append(named_ingredient)
-                new_item = replace(new_item, ingredients=tuple(new_ingredients))
-            new_item = replace(new_item, name=f"[{e1.name}]-[{e2.name}]", emoji="❓")
+            named_ingredients = await asyncio.gather(
+                *(self.acombine(tool, ing) for ing in item.ingredients)
+            )
+            new_item = self._add_ingredient_names(new_item, named_ingredients)
+
+        if not self._lm_budget_left():
+            return self._add_template_names(e1, e2, new_item)
 
+        naming_args = self._naming_args(e1, e2, new_item)
+        try:
+            if self.cassette is None:
+                semantics = await self._acall_lm(
+                    lambda: aget_item_semantics_from_lm(*naming_args)
+                )
+            else:
+                semantics = await self._acall_lm(
+                    lambda: self.cassette.acall(
+                        self._cassette_request(e1, e2),
+                        lambda: aget_item_semantics_from_lm(*naming_args),
+                    )
+                )
+        except NAMING_ERRORS as e:
+            if self.template_namer is None:
+                raise
+            logger.warning("Naming failed, using a template name instead: %r", e)
+            return self._add_template_names(e1, e2, new_item)
+        return self._add_semantics(e1, e2, new_item, semantics)
+
+    def _uses_shared_names(self) -> bool:
+        # unnamed combinations are cheap, so only named ones are shared
+        return self.assign_names and (
+            self.naming_cache is not None
+            or self.naming_coordinator is not None
+            or self.naming_pack is not None
+        )
+
+    def _stored_record(self, key: str) -> dict | None:
+        # the pack is read-only, so names made during play only go to the cache
+        for cache in (self.naming_pack, self.naming_cache):
+            if cache is not None:
+                record = cache.get(key)
+                if record is not None:
+                    return record
+        return None
+
+    def _combine_and_cache(self, key: str, e1: Item, e2: Item):
+        record = self._stored_record(key)
+        if record is not None:
+            return item_from_record(record)
+
+        new_item = self.combine_elements(e1, e2)
+        if (
+            new_item is not None
+            and self.naming_cache is not None
+            and key not in self._template_keys
+        ):
+            self.naming_cache.put(key, item_to_record(new_item))
         return new_item
 
+    async def _acombine_and_cache(self, key: str, e1: Item, e2: Item):
+        record = self._stored_record(key)
+        if record is not None:
+            return item_from_record(record)
+
+        new_item = await self.acombine_elements(e1, e2)
+        if (
+            new_item is not None
+            and self.naming_cache is not None
+            and key not in self._template_keys
+        ):
+            self.naming_cache.put(key, item_to_record(new_item))
+        return new_item
+
+    def _combine_shared(self, e1: Item, e2: Item):
+        if not self._uses_shared_names():
+            return self.combine_elements(e1, e2)
+
+        key = combination_key(e1, e2, self.descriptor_hash)
+        if self.naming_coordinator is None:
+            return self._combine_and_cache(key, e1, e2)
+        return self.naming_coordinator.name(
+            key,
+            lambda: self._combine_and_cache(key, e1, e2),
+            share=lambda _: key not in self._template_keys,
+        )
+
+    async def _acombine_shared(self, e1: Item, e2: Item):
+        if not self._uses_shared_names():
+            return await self.acombine_elements(e1, e2)
+
+        key = combination_key(e1, e2, self.descriptor_hash)
+        if self.naming_coordinator is None:
+            return await self._acombine_and_cache(key, e1, e2)
+        return await self.naming_coordinator.aname(
+            key,
+            lambda: self._acombine_and_cache(key, e1, e2),
+            share=lambda _: key not in self._template_keys,
+        )
+
+    def _store(self, items: tuple[int, int], combination: tuple) -> bool:
+        """
+        Memoize a combination, evicting the least recently used ones over the cap.
+        """
+        with self._lock:
+            # concurrent acombine calls can both finish naming the same pair
+            if items in self.combinations:
+                return False
+            self.combinations[items] = combination
+            evicted = []
+            while (
+                self.max_combinations is not None
+                and len(self.combinations) > self.max_combinations
+            ):
+                evicted.append(self.combinations.popitem(last=False)[1])
+                self.evictions += 1
+        for e1, e2, new_item in evicted:
+            self._spill(e1, e2, new_item)
+        return True
+
+    def _spill(self, e1: Item, e2: Item, new_item: Item):
+        if self._has_template_name(e1, e2):
+            # the template name goes with its memo entry
+            self._template_keys.pop(combination_key(e1, e2, self.descriptor_hash), None)
+        # without a naming cache, an evicted name would have to be asked for again
+        elif self.assign_names and self.naming_cache is not None:
+            key = combination_key(e1, e2, self.descriptor_hash)
+            self.naming_cache.put(key, item_to_record(new_item))
+
+    def _remember(self, items: tuple[int, int], e1: Item, e2: Item, new_item: Item):
+        if (
+            self._store(items, (e1, e2, new_item))
+            and self.journal is not None
+            and not self._has_template_name(e1, e2)
+        ):
+            self.journal.append(combination_record(e1, e2, new_item))
+
+    def _lookup(self, items: tuple[int, int]):
+        combination = self.combinations.get(items)
+        if combination is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.max_combinations is not None:
+            with self._lock:
+                # another thread may have evicted it since the get
+                if items in self.combinations:
+                    self.combinations.move_to_end(items)
+        return combination[-1]
+
+    def stats(self) -> dict:
+        """
+        Sizes and hit rates of the world model's caches.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "combinations": len(self.combinations),
+            "max_combinations": self.max_combinations,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "ic_examples": len(self.ic_examples),
+            "max_ic_examples": self.max_ic_examples,
+            "ic_examples_dropped": self.ic_examples_added - len(self.ic_examples),
+            "transitions": len(self.transitions),
+            "interned_items": len(self.interner),
+            "lm_requests": self.lm_requests,
+            "template_names": self.template_names,
+        }
+
     def combine(self, e1, e2):
-        items = frozenset((freeze_item(e1), freeze_item(e2)))
+        items = self.interner.pair(e1, e2)
 
         # check if we've already combined these items
-        if items in self.combinations:
-            new_item = self.combinations[items][-1]
-        else:
-            # otherwise, actually combine the items
-            new_item = self.combine_elements(e1, e2)
+        new_item = self._lookup(items)
+        if new_item is None:
+            new_item = self._combine_shared(e1, e2)
             if new_item is not None:
-                self.combinations[items] = (e1, e2, new_item)
+                self._remember(items, e1, e2, new_item)
 
         return new_item
 
-    def save(self, filepath: str):
-        combinations_lsts = {}
-        for combo, result in self.combinations.items():
-            inps = tuple(thaw_item(x) for x in combo)
-            combinations_lsts[inps] = tuple(asdict(x) for x in result)
+    async def acombine(self, e1, e2):
+        """
+        Async version of combine, which names new items without blocking the event loop.
+        """
+        items = self.interner.pair(e1, e2)
 
-        ic_examples_serialized = []
-        for example in self.ic_examples:
-            ic_examples_serialized.append(
-                {
-                    "input": [asdict(x) for x in example.input],
-                    "outcome": asdict(example.outcome),
-                    "semantics": {
-                        "emoji": example.semantics.emoji,
-                        "name": example.semantics.name,
-                    },
-                }
-            )
+        new_item = self._lookup(items)
+        if new_item is None:
+            new_item = await self._acombine_shared(e1, e2)
+            if new_item is not None:
+                self._remember(items, e1, e2, new_item)
 
-        world_model_dict = {
-            "lm": self.lm,
-            "combinations": combinations_lsts,
-            "ic_examples": ic_examples_serialized,
-            "assign_names": self.assign_names,
-        }
+        return new_item
 
-        with open(filepath, "w") as f:
-            json.dump(world_model_dict, f)
+    def _header(self) -> dict:
+        return journal_header(
+            lm=self.lm,
+            assign_names=self.assign_names,
+            descriptor_hash=self.descriptor_hash,
+        )
 
-    def load(self, filepath: str):
-        with open(filepath, "r") as f:
-            world_model_dict = json.load(f)
-        self.lm = world_model_dict["lm"]
-        self.assign_names = world_model_dict["assign_names"]
-        self.ic_examples = []
-        for example in world_model_dict["ic_examples"]:
-            self.ic_examples.append(
-                ICExample(
-                    inputs=(dict_to_dataclass(x) for x in example["input"]),
-                    outcome=dict_to_dataclass(example["outcome"]),
-                    semantics=ItemSemantics(
-                        emoji=example["semantics"]["emoji"],
-                        name=example["semantics"]["name"],
-                    ),
-                )
-            )
-        self.combinations = {}
-        for combo, result in world_model_dict["combinations"].items():
-            combo = frozenset(
-                freeze_item(dict_to_dataclass(x)) for x in literal_eval(combo)
+    def _check_header(self, header: dict):
+        # journals written before headers had a descriptor hash can't be checked
+        descriptor_hash = header.get("descriptor_hash")
+        if descriptor_hash is not None and descriptor_hash != self.descriptor_hash:
+            raise ValueError(
+                "World model was built for a different game or naming model"
             )
-            self.combinations[combo] = dict_to_dataclass(literal_eval(result))
 
-    def loads(self, data: str):
-        world_model_dict = json.loads(data)
-        self.lm = world_model_dict["lm"]
-        self.assign_names = world_model_dict["assign_names"]
-        ic_examples = world_model_dict["ic_examples"]
-        self.ic_examples = []
-        for example in ic_examples:
-            self.ic_examples.append(
-                ICExample(
-                    inputs=[dict_to_dataclass(x) for x in example["input"]],
-                    outcome=dict_to_dataclass(example["outcome"]),
-                    semantics=ItemSemantics(
-                        emoji=example["semantics"]["emoji"],
-                        name=example["semantics"]["name"],
-                    ),
-                )
-            )
+    def records(self) -> Iterator[dict]:
+        """
+        Every journal record needed to rebuild this world model, header first.
+        Combinations with template names are left out.
+        """
+        yield self._header()
+        with self._lock:
+            combinations = list(self.combinations.values())
+        for e1, e2, new_item in combinations:
+            if not self._has_template_name(e1, e2):
+                yield combination_record(e1, e2, new_item)
+        for example in self.ic_examples:
+            yield ic_example_record(example)
 
-        self.combinations = {}
-        for combo, result in world_model_dict["combinations"].items():
-            combo = frozenset(
-                freeze_item(dict_to_dataclass(x)) for x in literal_eval(combo)
-            )
-            self.combinations[combo] = [dict_to_dataclass(x) for x in result]
+    def _load_records(self, records: Iterable[dict], use_header: bool = False):
+        for record in records:
+            kind = record["type"]
+            if kind == "header":
+                if use_header:
+                    self.lm = record["lm"]
+                    self.assign_names = record["assign_names"]
+                else:
+                    self._check_header(record)
+            elif kind == "combination":
+                e1, e2, new_item = combination_from_record(record)
+                self._store(self.interner.pair(e1, e2), (e1, e2, new_item))
+            elif kind == "ic_example":
+                self.ic_examples_added += 1
+                self.ic_examples.append(ic_example_from_record(record))
+            else:
+                raise ValueError(f"Unknown journal record type {kind}")
 
-    def dumps(self):
-        combinations_lsts = {}
-        for combo, result in self.combinations.items():
-            inps = tuple(asdict(thaw_item(x)) for x in combo)
-            combinations_lsts[str(inps)] = tuple(asdict(x) for x in result)
+    def merge(self, *others: "MemoizedWorldModel") -> int:
+        """
+        Add the combinations and in-context examples of other world models of
+        the same game to this one. See merge_records.
+        """
+        return self.merge_records(*(other.records() for other in others))
 
-        ic_examples = []
-        for example in self.ic_examples:
-            ic_examples.append(
-                {
-                    "input": [asdict(x) for x in example.input],
-                    "outcome": asdict(example.outcome),
-                    "semantics": {
-                        "emoji": example.semantics.emoji,
-                        "name": example.semantics.name,
-                    },
-                }
-            )
+    def merge_records(self, *sources: Iterable[dict]) -> int:
+        """
+        Add the combinations and in-context examples in journal records (e.g.
+        those of other world models, or of a saved one) to this world model.
 
-        world_model_dict = {
-            "lm": self.lm,
-            "combinations": combinations_lsts,
-            "ic_examples": ic_examples,
-            "assign_names": self.assign_names,
-        }
+        If the sources named a combination differently, the name most of them
+        gave wins, with ties going to the alphabetically first, so merging
+        the same world models always gives the same result. Examples that
+        disagree with a winning name are dropped. The attached journal isn't
+        rewritten until compact is called.
+
+        Returns the number of combinations whose names had to be reconciled.
+        """
+        candidates, examples = {}, []
+        for source in (self.records(), *sources):
+            for record in source:
+                kind = record["type"]
+                if kind == "header":
+                    self._check_header(record)
+                elif kind == "combination":
+                    e1, e2, new_item = combination_from_record(record)
+                    key = combination_key(e1, e2, self.descriptor_hash)
+                    candidates.setdefault(key, []).append((e1, e2, new_item))
+                elif kind == "ic_example":
+                    examples.append(ic_example_from_record(record))
+                else:
+                    raise ValueError(f"Unknown journal record type {kind}")
+
+        winners, conflicts = {}, 0
+        for key, entries in candidates.items():
+            votes, outcomes = Counter(), {}
+            for entry in entries:
+                outcome = json.dumps(item_to_record(entry[2]), sort_keys=True)
+                votes[outcome] += 1
+                outcomes.setdefault(outcome, entry)
+            best = min(votes, key=lambda x: (-votes[x], outcomes[x][2].name, x))
+            winners[key] = outcomes[best]
+            conflicts += len(votes) > 1
+
+        kept, seen = [], set()
+        for example in examples:
+            key = combination_key(*example.inputs, self.descriptor_hash)
+            winner = winners.get(key)
+            semantics = (example.semantics.name, example.semantics.emoji)
+            if winner is not None and semantics != (winner[2].name, winner[2].emoji):
+                continue
+            if (key, semantics) not in seen:
+                seen.add((key, semantics))
+                kept.append(example)
+
+        with self._lock:
+            self.combinations = OrderedDict()
+        for e1, e2, new_item in winners.values():
+            self._store(self.interner.pair(e1, e2), (e1, e2, new_item))
+        self.ic_examples = self._new_ic_examples(kept)
+        self.ic_examples_added = len(kept)
+        return conflicts
+
+    def compact(self):
+        """
+        Rewrite the attached journal as a snapshot of the current world model.
+        With max_combinations set, this drops the combinations evicted so far.
+        """
+        if self.journal is not None:
+            self.journal.compact(self.records())
+
+    def save(self, filepath: str):
+        write_journal(filepath, self.records())
+
+    def load(self, filepath: str):
+        with open(filepath, "r") as f:
+            self.loads_lines(f)
+
+    def loads(self, data: str):
+        self.loads_lines(data.splitlines())
+
+    def loads_lines(self, lines: Iterable[str]):
+        """
+        Replace the world model's combinations and in-context examples with
+        those in a journal, or in a world model saved by older versions.
+        """
+        self.combinations = OrderedDict()
+        self.ic_examples = self._new_ic_examples()
+        self._load_records(read_world_model_lines(lines), use_header=True)
 
-        return json.dumps(world_model_dict)
+    def dumps(self) -> str:
+        return "".join(json.dumps(record) + "\n" for record in self.records())
@@ -0,0 +1,59 @@
+"""
+Name every combination within a few steps of a game's starting inventories
+ahead of time, so that participants never wait for the naming model.
+"""
+
+import asyncio
+import os
+from argparse import ArgumentParser
+
+from pyprojroot import here
+
+from oecraft.fake_lm import FakeGroqServer
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.lm_client import GroqClient
+from oecraft.naming_pack import build_naming_pack
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--domain", type=str, default="potions")
+    parser.add_argument("--naming_model", type=str, default="openai/gpt-oss-20b")
+    parser.add_argument("--max_steps", type=int, default=2)
+    parser.add_argument("--n_starting_ingredients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--naming-rpm", type=float, default=None)
+    parser.add_argument("--fake-lm", action="store_true")
+    parser.add_argument("--allow-missing", action="store_true")
+    parser.add_argument("--output_dir", type=str, default="data/naming_packs")
+    args = parser.parse_args()
+
+    fake_server = None
+    if args.fake_lm:
+        fake_server = FakeGroqServer().start()
+        lm_client = GroqClient(
+            api_key="fake",
+            url=fake_server.url,
+            default_requests_per_minute=args.naming_rpm,
+        )
+    else:
+        lm_client = GroqClient(default_requests_per_minute=args.naming_rpm)
+
+    os.makedirs(here(args.output_dir), exist_ok=True)
+    filepath = here(f"{args.output_dir}/{args.domain}_steps{args.max_steps}.sqlite")
+    try:
+        n_names = asyncio.run(
+            build_naming_pack(
+                GAME_DESCRIPTORS[args.domain],
+                str(filepath),
+                lm=args.naming_model,
+                max_steps=args.max_steps,
+                n_starting_ingredients=args.n_starting_ingredients,
+                concurrency=args.concurrency,
+                lm_client=lm_client,
+                allow_missing=args.allow_missing,
+            )
+        )
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
+    print(f"{args.domain}: {n_names} names, saved to {filepath}")
@@ -0,0 +1,28 @@
+"""
+Precompute transition tables for the oracle agents.
+"""
+
+import os
+from argparse import ArgumentParser
+
+from pyprojroot import here
+
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.transition_table import build_transition_table
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--domain", type=str, default=None)
+    parser.add_argument("--max_depth", type=int, default=2)
+    parser.add_argument("--output_dir", type=str, default="data/transition_tables")
+    args = parser.parse_args()
+
+    domains = [args.domain] if args.domain is not None else list(GAME_DESCRIPTORS)
+    os.makedirs(here(args.output_dir), exist_ok=True)
+    for domain in domains:
+        table = build_transition_table(GAME_DESCRIPTORS[domain], args.max_depth)
+        filepath = here(f"{args.output_dir}/{domain}_depth{args.max_depth}.npz")
+        table.save(filepath)
+        print(
+            f"{domain}: {table.n_items} items, {len(table.codes)} pairs, saved to {filepath}"
+        )
@@ -0,0 +1,32 @@
+"""
+Run a fake Groq chat completions server for offline load testing.
+
+Point the naming model at it with GROQ_CHAT_URL=<printed url>.
+"""
+
+from argparse import ArgumentParser
+
+from oecraft.fake_lm import FakeGroqServer, FakeLMConfig
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-median", type=float, default=0.2)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(
+        FakeLMConfig(
+            latency_median=args.latency_median,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving fake completions at {server.url}")
+    server.serve_forever()
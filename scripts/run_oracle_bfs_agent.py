@@ -8,18 +8,33 @@ from argparse import ArgumentParser
 from pyprojroot import here
 
 from oecraft.agents.oracle_bfs_agent import run_oracle_bfs_agent
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.transition_table import TransitionTable
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--domain", type=str)
     parser.add_argument("--n_runs", type=int, default=30)
     parser.add_argument("--n_steps", type=int, default=8)
+    parser.add_argument(
+        "--transition_table",
+        type=str,
+        default=None,
+        help="A table built by scripts/build_transition_tables.py",
+    )
     args = parser.parse_args()
 
+    transition_table = None
+    if args.transition_table is not None:
+        transition_table = TransitionTable.load(
+            here(args.transition_table), GAME_DESCRIPTORS[args.domain]
+        )
+
     df_domain = run_oracle_bfs_agent(
         args.domain,
         n_runs=args.n_runs,
         n_steps=args.n_steps,
+        transition_table=transition_table,
     )
     df_domain["domain"] = args.domain
 
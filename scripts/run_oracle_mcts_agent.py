@@ -8,6 +8,8 @@ from argparse import ArgumentParser
 from pyprojroot import here
 
 from oecraft.agents.oracle_mcts_agent import run_oracle_mcts_agent
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.transition_table import TransitionTable
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -17,12 +19,25 @@ if __name__ == "__main__":
     parser.add_argument("--n_simulations", type=int, default=1000)
     parser.add_argument("--exploration_c", type=float, default=1.25)
     parser.add_argument("--discount_factor", type=float, default=0.98)
+    parser.add_argument(
+        "--transition_table",
+        type=str,
+        default=None,
+        help="A table built by scripts/build_transition_tables.py",
+    )
     args = parser.parse_args()
 
+    transition_table = None
+    if args.transition_table is not None:
+        transition_table = TransitionTable.load(
+            here(args.transition_table), GAME_DESCRIPTORS[args.domain]
+        )
+
     df_domain = run_oracle_mcts_agent(
         args.domain,
         n_runs=args.n_runs,
         n_steps=args.n_steps,
+        transition_table=transition_table,
         simulations_per_move=args.n_simulations,
         max_depth=args.n_steps,
         exploration_c=args.exploration_c,
@@ -2,13 +2,17 @@
 A fastapi server that runs the cooking game.
 """
 
+import os
 from typing import Optional
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
+from pyprojroot import here
 
 from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.naming_cache import NamingPack
 
 app = FastAPI()
 app.add_middleware(
@@ -21,6 +25,13 @@ app.add_middleware(
 
 games = {}
 
+# names built ahead of time with scripts/build_naming_pack.py, opened once and
+# shared by every game so that participants see the same names without waiting
+NAMING_PACK_PATH = os.environ.get(
+    "OECRAFT_NAMING_PACK", here("data/naming_packs/potions_steps2.sqlite")
+)
+naming_pack = NamingPack(NAMING_PACK_PATH) if os.path.exists(NAMING_PACK_PATH) else None
+
 
 class InitRequest(BaseModel):
     model: Optional[str] = Field(
@@ -36,9 +47,17 @@ def initialize(request: Optional[InitRequest] = None):
     """
     # model = request.model if request else "gemini/gemini-2.5-flash-preview-04-17"
     model = "openai/gpt-4.1-mini"
+    if naming_pack is not None:
+        # pack names only match the model that generated them
+        model = naming_pack.metadata["lm"]
 
     world_type = "potions"
-    game = CraftingGame(model, world_type)
+    game = CraftingGame(
+        descriptor=GAME_DESCRIPTORS[world_type],
+        model=model,
+        assign_names=naming_pack is not None,
+        naming_pack=naming_pack,
+    )
     game.reset()
     game_id = world_type
     if game_id not in games:
@@ -48,7 +67,7 @@ def initialize(request: Optional[InitRequest] = None):
         game.reset()
     return {
         "game_id": game_id,
-        "inventory": game.inventory,
+        "inventory": list(game.inventory),
     }
 
 
@@ -66,4 +85,4 @@ def step(request: StepRequest):
     print(f"inventory: {game.inventory}")
     obs, _, _, _ = game.step(request.action)
     print(f"obs: {obs}")
-    return obs
+    return {**obs, "inventory": list(obs["inventory"])}
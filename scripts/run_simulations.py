@@ -16,6 +16,26 @@ if __name__ == "__main__":
     parser.add_argument("--num-chains", type=int, default=3)
     parser.add_argument("--chain-length", type=int, default=1)
     parser.add_argument("--output-dir", type=str, default="data/simulations")
+    parser.add_argument("--naming-cache", type=str, default=None)
+    parser.add_argument("--naming-rpm", type=float, default=None)
+    parser.add_argument("--fake-lm", action="store_true")
+    parser.add_argument("--cassette", type=str, default=None)
+    parser.add_argument(
+        "--cassette-mode",
+        type=str,
+        default="auto",
+        choices=["record", "replay", "auto"],
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--journal-world-models", action="store_true")
+    parser.add_argument("--prefetch-workers", type=int, default=0)
+    parser.add_argument("--world-model-path", type=str, default=None)
+    parser.add_argument("--ic-retrieval-k", type=int, default=None)
+    parser.add_argument("--template-names", action="store_true")
+    parser.add_argument("--max-lm-requests", type=int, default=None)
+    parser.add_argument("--naming-timeout", type=float, default=None)
+    parser.add_argument("--keep-turns", type=int, default=None)
+    parser.add_argument("--max-history-tokens", type=int, default=None)
     parser.add_argument("--verbose", type=bool, default=True)
 
     args = parser.parse_args()
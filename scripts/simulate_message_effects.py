@@ -84,6 +84,17 @@ if __name__ == "__main__":
     parser.add_argument("--num-chains", type=int, default=10)
     parser.add_argument("--chain-length", type=int, default=1)
     parser.add_argument("--output-dir", type=str, default="data/simulations")
+    parser.add_argument("--naming-cache", type=str, default=None)
+    parser.add_argument("--naming-rpm", type=float, default=None)
+    parser.add_argument("--fake-lm", action="store_true")
+    parser.add_argument("--cassette", type=str, default=None)
+    parser.add_argument(
+        "--cassette-mode",
+        type=str,
+        default="auto",
+        choices=["record", "replay", "auto"],
+    )
+    parser.add_argument("--seed", type=int, default=None)
     parser.add_argument("--verbose", type=bool, default=False)
 
     args = parser.parse_args()
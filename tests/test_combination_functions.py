@@ -1,6 +1,7 @@
 import random
 
 from oecraft.constants import Ingredient, Tool
+
 from oecraft.game_descriptors import GAME_DESCRIPTORS
 
 
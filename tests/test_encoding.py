@@ -0,0 +1,52 @@
+import numpy as np
+
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.vector_environment import VectorCraftingGame
+
+POTIONS = GAME_DESCRIPTORS["potions"]
+
+
+def test_encoded_observations_and_actions():
+    game = CraftingGame(descriptor=POTIONS, model="none", encode=True)
+    obs = game.reset(seed=0)
+    assert game.observation_space.contains(obs)
+    # two tools and four ingredients make 15 pairs, plus submitting
+    assert game.action_space.n == 16
+    assert obs["present"].sum() == 6
+    assert obs["tool"].tolist() == [1, 2, 0, 0, 0, 0]
+    # the two tools can't be combined
+    assert obs["action_mask"].tolist() == [0] + [1] * 15
+
+    vial, ingredient = game.inventory[0], game.inventory[2]
+    action = 1  # slots 0 and 2
+    assert game.encoder.decode_action(action, game.inventory) == (
+        vial.name,
+        ingredient.name,
+    )
+    obs, reward, done, _ = game.step(action)
+    assert game.observation_space.contains(obs)
+    assert obs["present"].sum() == 6 and not done
+    # the vial extracts the ingredient, which puts a value in its extraction
+    extraction = game.encoder.features.index("extraction")
+    assert obs["features"][5, extraction] > 1
+
+    obs, reward, done, _ = game.step(game.action_space.n - 1)
+    assert done and reward == game.get_reward()
+
+
+def test_vectorized_episodes_share_one_batch():
+    envs = VectorCraftingGame(POTIONS, num_envs=4, max_steps=2, encode=True)
+    observations, _ = envs.reset(seed=0)
+    assert envs.observation_space.contains(observations)
+    assert observations["features"].shape == (4, 6, 4)
+
+    batch = observations["features"]
+    actions = np.array([1, 1, 15, 1])
+    observations, _, terminations, _, _ = envs.step(actions)
+    # written in place
+    assert observations["features"] is batch
+    assert terminations.tolist() == [False, False, True, False]
+    assert observations["present"].sum(axis=1).tolist() == [6, 6, 6, 6]
+    for env, present in zip(envs.envs, observations["present"]):
+        assert present.sum() == len(env.inventory)
@@ -0,0 +1,32 @@
+import asyncio
+
+from oecraft.agents.lm_agent import CraftingAgent
+from oecraft.environment import CraftingGame, LMCraftingGame
+from oecraft.fake_lm import FakeGenaiClient, FakeGroqServer, FakeLMConfig
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.lm_client import GroqClient
+
+
+def test_agent_plays_against_fake_models():
+    config = FakeLMConfig(latency_median=0.0, rate_limit_rate=0.2, seed=0)
+    with FakeGroqServer(config) as server:
+        lm_client = GroqClient(api_key="fake", url=server.url, max_delay=0.0)
+        game = CraftingGame(
+            GAME_DESCRIPTORS["cooking"],
+            model="fake-namer",
+            assign_names=True,
+            lm_client=lm_client,
+        )
+        agent = CraftingAgent(
+            LMCraftingGame(game),
+            model="fake-agent",
+            generate_kwargs={},
+            client=FakeGenaiClient(FakeLMConfig(latency_median=0.0, seed=0)),
+        )
+        message, df = asyncio.run(agent.play_games(num_rounds=2))
+
+    assert message
+    assert df[df["timestep"].notna()]["round_num"].nunique() == 2
+    assert server.stats["requests"] > 0
+    named = [item for item in game.inventory if item.name.startswith("fake ")]
+    assert all(item.emoji for item in named)
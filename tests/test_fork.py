@@ -0,0 +1,36 @@
+from oecraft.agents.oracle_bfs_agent import OracleBFSAgent
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def test_snapshots_and_forks_share_until_they_change():
+    game = CraftingGame(descriptor=COOKING, model="none")
+    game.reset(seed=0)
+    start = game.snapshot()
+    fork = game.fork(combine_fn=game.world_model.transition)
+    assert fork.world_model is game.world_model
+
+    # positions instead of names
+    obs, *_ = game.step((0, 2))
+    assert len(start) == 6 and start[2] not in obs["inventory"]
+    assert fork.inventory == start
+
+    fork.step((0, 2))
+    # the fork values what it makes like the game
+    assert fork.inventory[-1].value == game.inventory[-1].value
+    game.restore(start)
+    assert game.inventory == start
+    game.step((1, 3))
+    assert game.inventory != start and len(start) == 6
+
+
+def test_planners_see_the_values_the_game_gives():
+    game = CraftingGame(descriptor=COOKING, model="none")
+    game.reset(seed=1)
+    agent = OracleBFSAgent(game, max_depth=2)
+    planned = agent._next_inventory(game.snapshot(), (0, 2))
+    obs, *_ = game.step((0, 2))
+    assert [x.name for x in planned[:-1]] == [x.name for x in obs["inventory"][:-1]]
+    assert planned[-1].value == obs["new_item"].value
@@ -0,0 +1,74 @@
+from oecraft import prompts
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.ic_example_index import ICExampleIndex
+from oecraft.types import ICExample, ItemSemantics
+from oecraft.world_model import MemoizedWorldModel
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def make_example(world_model, e1, e2, name):
+    return ICExample(
+        inputs=(e1, e2),
+        outcome=world_model.transition(e1, e2),
+        semantics=ItemSemantics(emoji="🍲", name=name),
+    )
+
+
+def test_index_retrieves_the_most_similar_examples():
+    world_model = MemoizedWorldModel(
+        lm="none", combo_function_str=COOKING.combination_fn
+    )
+    stove, water = COOKING.tools
+    fish, beef, rice = (
+        COOKING.ingredients[0],
+        COOKING.ingredients[1],
+        COOKING.ingredients[-1],
+    )
+    index = ICExampleIndex(COOKING.feature_names, k=2, maxlen=3)
+    index.append(make_example(world_model, stove, fish, "cooked fish"))
+    index.append(make_example(world_model, water, rice, "soaked rice"))
+    index.append(make_example(world_model, fish, rice, "fish and rice"))
+
+    nearest = index.nearest(stove, beef, world_model.transition(stove, beef))
+    assert [x.semantics.name for x in nearest][-1] == "cooked fish"
+    assert len(nearest) == 2
+
+    # rendered messages are cached
+    first = index.example_messages(stove, beef, world_model.transition(stove, beef))
+    second = index.example_messages(beef, stove, world_model.transition(stove, beef))
+    assert first == second and first[-1] is second[-1]
+
+    # the oldest learned example goes first when the index is full
+    index.append(make_example(world_model, water, beef, "soaked beef"))
+    assert [x.semantics.name for x in index] == [
+        "soaked rice",
+        "fish and rice",
+        "soaked beef",
+    ]
+
+
+def test_world_model_prompts_show_k_examples(monkeypatch):
+    prompt_lengths = []
+
+    def call_model(messages, *args, **kwargs):
+        prompt_lengths.append(len(messages))
+        return {"emoji": "🍲", "name": f"named {len(prompt_lengths)}"}
+
+    monkeypatch.setattr(prompts, "call_model", call_model)
+    world_model = MemoizedWorldModel(
+        lm="test-model",
+        combo_function_str=COOKING.combination_fn,
+        assign_names=True,
+        naming_system_prompt=COOKING.naming_system_prompt,
+        naming_ic_examples=COOKING.naming_ic_examples,
+        feature_names=COOKING.feature_names,
+        ic_retrieval_k=1,
+    )
+    stove = COOKING.tools[0]
+    for ingredient in COOKING.ingredients[:4]:
+        world_model.combine(stove, ingredient)
+
+    # the system prompt, one example and the combination being named
+    assert prompt_lengths == [4, 4, 4, 4]
+    assert len(world_model.ic_examples) == 4
@@ -0,0 +1,36 @@
+import pytest
+
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.inventory import Inventory
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def test_handles_outlive_positions():
+    fish, beef, bacon = COOKING.ingredients[:3]
+    inventory = Inventory([fish, beef, fish])
+    first_fish = inventory.find("raw fish")
+    second_fish = inventory.find("raw fish", exclude=first_fish)
+    bacon_handle = inventory.add(bacon)
+
+    assert inventory.remove_handle(first_fish) is fish
+    assert inventory == [beef, fish, bacon]
+    assert inventory.find("raw fish") == second_fish
+    assert inventory.get(bacon_handle) is bacon and inventory[2] is bacon
+    assert inventory.find("raw fish", exclude=second_fish) is None
+    assert repr(inventory) == repr([beef, fish, bacon])
+
+
+def test_steps_consume_the_items_they_name():
+    game = CraftingGame(descriptor=COOKING, model="none")
+    inventory = game.reset(seed=0)
+    stove, ingredient = inventory[0], inventory[2]
+    obs, *_ = game.step((stove.name, ingredient.name))
+    assert obs["inventory"][:2] == [stove, inventory[1]]
+    assert ingredient not in obs["inventory"] and len(obs["inventory"]) == 6
+
+    # an ingredient can't be combined with itself
+    with pytest.raises(ValueError, match="not in inventory"):
+        game.step((inventory[3].name, inventory[3].name))
+    assert len(game.inventory) == 6
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import oecraft.lm_client as lm_client_module
+from oecraft.fake_lm import FakeGroqServer, FakeLMConfig
+from oecraft.lm_client import CompletionError, GroqClient, TokenBucket
+
+PAYLOAD = {
+    "model": "fake-namer",
+    "messages": [{"role": "user", "content": "Item 1: {'name': 'fish'}"}],
+    "response_format": {"json_schema": {"name": "ItemSemantics"}},
+}
+
+
+def scripted_server(*failures, retry_after=1.0):
+    # the server fails with each status in turn, then succeeds
+    config = FakeLMConfig(latency_median=0.0, retry_after=retry_after, seed=0)
+    statuses = iter(failures)
+    config.sample_failure = lambda: next(statuses, None)
+    return FakeGroqServer(config)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(
+        lm_client_module,
+        "time",
+        SimpleNamespace(sleep=sleeps.append, monotonic=time.monotonic),
+    )
+    return sleeps
+
+
+def test_rate_limits_wait_as_long_as_the_server_asks(sleeps):
+    with scripted_server(429, 429, retry_after=0.25) as server:
+        client = GroqClient(api_key="fake", url=server.url, max_delay=10.0)
+        assert client.complete(PAYLOAD)["name"] == "fake fish"
+        client.close()
+    assert sleeps == [0.25, 0.25]
+    assert server.stats["rate_limited"] == 2
+
+    # but never longer than max_delay
+    with scripted_server(429, retry_after=60.0) as server:
+        client = GroqClient(api_key="fake", url=server.url, max_delay=2.0)
+        client.complete(PAYLOAD)
+        client.close()
+    assert sleeps[-1] == 2.0
+
+
+def test_server_errors_back_off_until_attempts_run_out(sleeps):
+    with scripted_server(*[500] * 4) as server:
+        client = GroqClient(
+            api_key="fake", url=server.url, max_attempts=4, base_delay=0.5
+        )
+        with pytest.raises(CompletionError, match="after 4 attempts"):
+            client.complete(PAYLOAD)
+        client.close()
+    assert server.stats["requests"] == 4
+    # full jitter, under a ceiling that doubles with each attempt
+    assert len(sleeps) == 3
+    assert all(0 <= delay <= 0.5 * 2**i for i, delay in enumerate(sleeps))
+
+
+def test_fatal_statuses_are_not_retried(sleeps):
+    with scripted_server(401) as server:
+        client = GroqClient(api_key="fake", url=server.url)
+        with pytest.raises(RuntimeError, match="status 401") as error:
+            client.complete(PAYLOAD)
+        client.close()
+    assert not isinstance(error.value, CompletionError)
+    assert server.stats["requests"] == 1 and sleeps == []
+
+
+def test_async_requests_retry_and_close_their_connections():
+    with scripted_server(429, 500, retry_after=0.0) as server:
+        client = GroqClient(api_key="fake", url=server.url, max_delay=0.0)
+
+        async def complete():
+            result = await client.acomplete(PAYLOAD)
+            http_client = client._async_state()[0]
+            await client.aclose()
+            return result, http_client
+
+        result, http_client = asyncio.run(complete())
+        assert result["name"] == "fake fish" and http_client.is_closed
+
+        # close also closes the connections of loops that aren't running
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(client.acomplete(PAYLOAD))
+        http_client = client._loop_state[loop][0]
+        client.close()
+        assert http_client.is_closed
+        loop.close()
+    assert server.stats["requests"] == 4
+
+
+def test_token_bucket_spaces_out_requests():
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket._reserve() == pytest.approx(0.2, abs=0.01)
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import oecraft.world_model as world_model_module
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.lm_client import CompletionError
+from oecraft.naming_cache import NamingPack
+from oecraft.naming_pack import build_naming_pack
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def test_games_name_from_the_pack_without_the_lm(monkeypatch, tmp_path):
+    calls = []
+
+    async def aget_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        calls.append(inputs)
+        return {"emoji": "🍲", "name": f"named {inputs[0].name} {inputs[1].name}"}
+
+    def get_item_semantics_from_lm(*args, **kwargs):
+        raise AssertionError("the pack should have named this")
+
+    monkeypatch.setattr(
+        world_model_module, "aget_item_semantics_from_lm", aget_item_semantics_from_lm
+    )
+    monkeypatch.setattr(
+        world_model_module, "get_item_semantics_from_lm", get_item_semantics_from_lm
+    )
+    path = str(tmp_path / "cooking.sqlite")
+    n_names = asyncio.run(
+        build_naming_pack(
+            COOKING, path, lm="test-model", max_steps=1, inventory_samples=500
+        )
+    )
+    pack = NamingPack(path)
+    assert len(pack) == n_names == len(calls)
+
+    game = CraftingGame(
+        descriptor=COOKING, model="test-model", assign_names=True, naming_pack=pack
+    )
+    inventory = game.reset(seed=0)
+    stove, _, first, second, third = inventory[:5]
+    obs, *_ = game.step((stove.name, first.name))
+    assert obs["new_item"].name == f"named {stove.name} {first.name}"
+    obs, *_ = game.step((second.name, third.name))
+    assert obs["new_item"].name == f"named {second.name} {third.name}"
+
+    with pytest.raises(ValueError):
+        CraftingGame(descriptor=COOKING, model="other-model", naming_pack=pack)
+
+
+def test_builds_with_missing_names_fail_unless_allowed(monkeypatch, tmp_path):
+    async def aget_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        if inputs[0].name == "stove" and inputs[1].name == "raw fish":
+            raise CompletionError("the LM is down")
+        return {"emoji": "🍲", "name": f"named {inputs[0].name} {inputs[1].name}"}
+
+    monkeypatch.setattr(
+        world_model_module, "aget_item_semantics_from_lm", aget_item_semantics_from_lm
+    )
+    path = str(tmp_path / "cooking.sqlite")
+
+    def build(**kwargs):
+        return asyncio.run(
+            build_naming_pack(
+                COOKING,
+                path,
+                lm="test-model",
+                max_steps=1,
+                inventory_samples=500,
+                **kwargs,
+            )
+        )
+
+    with pytest.raises(RuntimeError, match="1 combinations"):
+        build()
+    n_names = build(allow_missing=True)
+    pack = NamingPack(path)
+    assert pack.metadata["missing_names"] == 1
+    assert len(pack) == n_names > 0
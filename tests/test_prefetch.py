@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+import oecraft.world_model as world_model_module
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.prefetch import NamingPrefetcher, candidate_pairs
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def make_game(**kwargs):
+    game = CraftingGame(
+        descriptor=COOKING, model="test-model", assign_names=True, **kwargs
+    )
+    game.reset(seed=0)
+    return game
+
+
+def test_candidate_pairs_put_tools_on_new_items_first():
+    stove, water = COOKING.tools
+    fish, rice, dish = COOKING.ingredients[:3]
+    pairs = candidate_pairs([stove, water, fish, rice, dish], [dish])
+
+    assert (stove, water) not in pairs
+    assert len(pairs) == 9
+    assert pairs[:2] == [(stove, dish), (water, dish)]
+    assert set(pairs[2:4]) == {(fish, dish), (rice, dish)}
+    assert pairs[-1] == (fish, rice)
+
+
+def test_prefetched_names_are_cache_hits(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def get_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        with lock:
+            calls.append(inputs)
+        return {"emoji": "🍲", "name": f"named {inputs[0].name} {inputs[1].name}"}
+
+    monkeypatch.setattr(
+        world_model_module, "get_item_semantics_from_lm", get_item_semantics_from_lm
+    )
+    game = make_game(prefetch_workers=2)
+    game.prefetcher.wait()
+    prefetched = len(calls)
+    assert prefetched == game.prefetcher.max_pairs
+
+    # the tool pairs are named first, so the first move is already known
+    stove, fish = game.inventory[0], game.inventory[2]
+    obs, *_ = game.step((stove.name, fish.name))
+    assert len(calls) == prefetched
+    assert obs["new_item"].name == f"named {stove.name} {fish.name}"
+    game.prefetcher.close()
+
+
+def test_astep_shares_requests_with_prefetching(monkeypatch):
+    calls = []
+
+    async def aget_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        calls.append(inputs)
+        await asyncio.sleep(0.01)
+        return {"emoji": "🍲", "name": f"named {len(calls)}"}
+
+    monkeypatch.setattr(
+        world_model_module, "aget_item_semantics_from_lm", aget_item_semantics_from_lm
+    )
+    game = make_game()
+    game.prefetcher = NamingPrefetcher(game.world_model, max_workers=2)
+    stove = game.inventory[0]
+
+    async def play():
+        game.prefetcher.aprefetch(game.inventory)
+        await asyncio.sleep(0)
+        # asked for while its name is being prefetched
+        obs, *_ = await game.astep((stove.name, game.inventory[2].name))
+        await game.prefetcher.await_pending()
+        return obs["new_item"]
+
+    new_item = asyncio.run(play())
+    keys = [tuple(x.name for x in inputs) for inputs in calls]
+    assert len(keys) == len(set(keys))
+    assert new_item.name.startswith("named")
+
+
+def test_async_games_share_requests_with_prefetching_threads(monkeypatch):
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def get_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        calls.append(inputs)
+        started.set()
+        release.wait(5)
+        return {"emoji": "🍲", "name": "named on a thread"}
+
+    async def aget_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        calls.append(inputs)
+        return {"emoji": "🍲", "name": "named on the loop"}
+
+    monkeypatch.setattr(
+        world_model_module, "get_item_semantics_from_lm", get_item_semantics_from_lm
+    )
+    monkeypatch.setattr(
+        world_model_module, "aget_item_semantics_from_lm", aget_item_semantics_from_lm
+    )
+    game = make_game()
+    game.prefetcher = NamingPrefetcher(game.world_model, max_workers=2)
+    stove, fish = game.inventory[0], game.inventory[2]
+    thread = threading.Thread(target=game.world_model.combine, args=(stove, fish))
+    thread.start()
+    started.wait(5)
+
+    async def play():
+        asyncio.get_running_loop().call_soon(release.set)
+        # asked for on the loop while a thread is naming it
+        named = await game.world_model.acombine(stove, fish)
+        # resetting on the loop prefetches there too
+        game.reset(seed=1)
+        assert game.prefetcher._executor is None
+        await game.prefetcher.await_pending()
+        return named
+
+    named = asyncio.run(play())
+    thread.join()
+    assert named.name == "named on a thread"
+    assert [x.name for x in calls[0]] == [stove.name, fish.name]
+    assert game.prefetcher.stats()["named"] > 0
@@ -0,0 +1,78 @@
+import json
+
+from oecraft.environment import CraftingGame, LMCraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.prompt_history import HistoryCompaction, PromptHistory, count_tokens
+
+
+def test_messages_are_made_once():
+    history = PromptHistory()
+    history.add_user_text("Starting inventory")
+    history.add_user_text("A message")
+    history.add("model", "submit")
+    first = history.contents()[:]
+    assert [m.role for m in first] == ["user", "model"]
+    assert first[0].parts[0].text == "Starting inventory\n\nA message"
+
+    history.add_user_text("New round")
+    history.add_user_text("Starting inventory")
+    contents = history.contents()
+    assert contents[:2] == first and all(a is b for a, b in zip(contents, first))
+    assert contents[2].parts[0].text == "New round\n\nStarting inventory"
+    assert history.contents()[2] is contents[2]
+
+
+def test_games_keep_a_prompt_history():
+    game = LMCraftingGame(
+        CraftingGame(descriptor=GAME_DESCRIPTORS["cooking"], model="none")
+    )
+    game.reset(seed=0)
+    game.step('{"reasoning": "", "action": "submit"}')
+    game.reset(seed=1)
+    history = game.get_prompt_history()
+    assert [m.role for m in history] == ["user", "model", "user"]
+    assert history[2].parts[0].text.startswith("Current inventory")
+    assert "You have begun a new round" in history[2].parts[0].text
+    # callers get their own list
+    history.pop()
+    assert len(game.get_prompt_history()) == 3
+
+
+def play_rounds(game, rounds):
+    for seed in range(rounds):
+        game.reset(seed=seed)
+        if seed == 0:
+            game.add_message_to_history("Cook the fish.")
+        inventory = game.env.inventory
+        action = [inventory[0].name, inventory[2].name]
+        game.step(json.dumps({"reasoning": "", "action": action}))
+        game.step('{"reasoning": "", "action": "submit"}')
+
+
+def test_earlier_rounds_are_summarized():
+    game = LMCraftingGame(
+        CraftingGame(descriptor=GAME_DESCRIPTORS["cooking"], model="none"),
+        compaction=HistoryCompaction(keep_turns=2),
+    )
+    play_rounds(game, 3)
+    history = game.get_prompt_history()
+    # the last round's two turns are sent as they were
+    assert [m.role for m in history] == ["user", "model", "user", "model", "user"]
+    first = history[0].parts[0].text
+    assert first.startswith("You received the following message")
+    assert "Round 1: scored" in first and "Round 2: scored" in first
+    assert "Made: stove + " in first
+    assert "You have begun a new round" in first
+    assert history[1:] == game.prompt_history.contents()[-4:]
+
+
+def test_history_fits_the_token_budget():
+    game = LMCraftingGame(
+        CraftingGame(descriptor=GAME_DESCRIPTORS["cooking"], model="none"),
+        compaction=HistoryCompaction(keep_turns=2, max_tokens=120),
+    )
+    play_rounds(game, 3)
+    history = game.get_prompt_history()
+    assert sum(count_tokens(m.parts[0].text) for m in history) <= 120
+    assert history[0].role == "user"
+    assert history[-1] == game.prompt_history.contents()[-1]
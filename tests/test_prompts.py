@@ -0,0 +1,53 @@
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.prompts import (
+    NamingPromptTemplate,
+    get_combination_messages,
+    select_example_messages,
+)
+from oecraft.types import ICExample, ItemSemantics
+from oecraft.world_model import MemoizedWorldModel
+
+POTIONS = GAME_DESCRIPTORS["potions"]
+
+
+def test_template_renders_the_same_prompts():
+    world_model = MemoizedWorldModel(
+        lm="none", combo_function_str=POTIONS.combination_fn
+    )
+    tool, first, second = POTIONS.tools[0], *POTIONS.ingredients[:2]
+    template = NamingPromptTemplate(
+        POTIONS.feature_names, POTIONS.naming_ic_examples, max_cached_examples=2
+    )
+    mixture = world_model.transition(first, second)
+    outcome = world_model.transition(tool, mixture)
+
+    learned = []
+    for i in range(5):
+        learned.append(
+            ICExample(
+                inputs=(tool, first),
+                outcome=world_model.transition(tool, first),
+                semantics=ItemSemantics(emoji="🧪", name=f"potion {i}"),
+            )
+        )
+        messages = [
+            get_combination_messages(
+                tool,
+                mixture,
+                outcome,
+                POTIONS.naming_system_prompt,
+                POTIONS.feature_names,
+                [],
+                select_example_messages(
+                    POTIONS.naming_ic_examples,
+                    learned,
+                    tool,
+                    mixture,
+                    outcome,
+                    POTIONS.feature_names,
+                    template=maybe_template,
+                ),
+            )
+            for maybe_template in (None, template)
+        ]
+        assert messages[0] == messages[1]
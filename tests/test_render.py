@@ -0,0 +1,28 @@
+from oecraft.environment import CraftingGame, LMCraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def test_items_are_described_once():
+    game = CraftingGame(descriptor=COOKING, model="none")
+    described = []
+    descriptor_fn = game.descriptor_fn
+
+    def counting_descriptor_fn(item, feature_names=None):
+        described.append(item.name)
+        return descriptor_fn(item, feature_names)
+
+    game.descriptor_fn = counting_descriptor_fn
+    lm_game = LMCraftingGame(game)
+    lm_game.reset(seed=0)
+    first_render = game.render()
+    # the ingredients were described when they were dealt
+    assert len(described) == 4
+
+    obs, *_ = game.step((0, 2))
+    lm_game.format_obs(obs)
+    lm_game.format_obs(obs)
+    # only the new item, once
+    assert described[4:] == [obs["new_item"].name]
+    assert game.render().splitlines()[:2] == first_render.splitlines()[:2]
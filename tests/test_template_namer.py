@@ -0,0 +1,153 @@
+import asyncio
+import threading
+
+import oecraft.world_model as world_model_module
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.journal import WorldModelJournal
+from oecraft.lm_client import CompletionError
+from oecraft.naming_cache import SQLiteNamingCache, combination_key
+from oecraft.naming_coordinator import NamingCoordinator
+from oecraft.template_namer import TemplateNamer
+from oecraft.world_model import MemoizedWorldModel
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def test_template_names_describe_the_features():
+    game = CraftingGame(descriptor=COOKING, model="test-model", template_names=True)
+    world_model = game.world_model
+    stove, water = COOKING.tools
+    fish = next(x for x in COOKING.ingredients if x.name == "raw fish")
+    rice = next(x for x in COOKING.ingredients if x.name == "rice")
+
+    cooked = world_model.combine(stove, fish)
+    assert (cooked.emoji, cooked.name) == ("🔥🐟", "cooked fish")
+    soaked = world_model.combine(water, world_model.combine(stove, rice))
+    assert soaked.name == "soaked cooked rice"
+    overcooked = world_model.combine(stove, soaked)
+    assert overcooked.name == "overcooked soaked rice"
+
+    dish = world_model.combine(cooked, rice)
+    assert (dish.emoji, dish.name) == ("🐟🌾", "cooked fish and rice")
+    cooked_dish = world_model.combine(stove, dish)
+    assert cooked_dish.name == "overcooked fish and cooked rice"
+    assert world_model.stats()["lm_requests"] == 0
+
+
+def test_falls_back_when_the_lm_is_over_budget_or_fails(monkeypatch, tmp_path):
+    def get_item_semantics_from_lm(inputs, *args, **kwargs):
+        if inputs[1].name == "raw beef":
+            raise CompletionError("the LM is down")
+        return {"emoji": "🍲", "name": f"lm {inputs[1].name}"}
+
+    monkeypatch.setattr(
+        world_model_module, "get_item_semantics_from_lm", get_item_semantics_from_lm
+    )
+    cache = SQLiteNamingCache(str(tmp_path / "names.sqlite"))
+    world_model = MemoizedWorldModel(
+        lm="test-model",
+        combo_function_str=COOKING.combination_fn,
+        assign_names=True,
+        naming_system_prompt=COOKING.naming_system_prompt,
+        naming_ic_examples=COOKING.naming_ic_examples,
+        feature_names=COOKING.feature_names,
+        naming_cache=cache,
+        template_namer=TemplateNamer(
+            COOKING.feature_names, COOKING.naming_ic_examples, COOKING.tools
+        ),
+        max_lm_requests=2,
+    )
+    stove = COOKING.tools[0]
+    fish, beef, bacon = COOKING.ingredients[:3]
+
+    assert world_model.combine(stove, fish).name == "lm raw fish"
+    assert world_model.combine(stove, beef).name == "cooked beef"
+    # the budget is spent
+    assert world_model.combine(stove, bacon).name == "cooked bacon"
+    assert world_model.stats()["lm_requests"] == 2
+    assert world_model.stats()["template_names"] == 2
+
+    # only the LM's name is shared
+    def cached(ingredient):
+        return cache.get(
+            combination_key(stove, ingredient, world_model.descriptor_hash)
+        )
+
+    assert cached(fish) is not None
+    assert cached(beef) is None and cached(bacon) is None
+
+
+def test_falls_back_when_the_lm_is_too_slow(monkeypatch):
+    async def aget_item_semantics_from_lm(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(
+        world_model_module, "aget_item_semantics_from_lm", aget_item_semantics_from_lm
+    )
+    game = CraftingGame(
+        descriptor=COOKING,
+        model="test-model",
+        assign_names=True,
+        template_names=True,
+        naming_timeout=0.01,
+    )
+    stove, fish = COOKING.tools[0], COOKING.ingredients[0]
+    cooked = asyncio.run(game.world_model.acombine(stove, fish))
+    assert cooked.name == "cooked fish"
+
+    # blocking requests time out on a thread, which closing the game stops
+    answer = threading.Event()
+    monkeypatch.setattr(
+        world_model_module,
+        "get_item_semantics_from_lm",
+        lambda *args, **kwargs: answer.wait(),
+    )
+    water = COOKING.tools[1]
+    assert game.world_model.combine(water, fish).name == "soaked fish"
+    answer.set()
+    game.close()
+    assert game.world_model._naming_executor is None
+
+
+def test_template_names_are_not_shared_or_journaled(monkeypatch, tmp_path):
+    calls = []
+
+    def get_item_semantics_from_lm(inputs, *args, **kwargs):
+        calls.append(inputs)
+        return {"emoji": "🍲", "name": f"lm {inputs[1].name}"}
+
+    monkeypatch.setattr(
+        world_model_module, "get_item_semantics_from_lm", get_item_semantics_from_lm
+    )
+    coordinator = NamingCoordinator()
+
+    def make_world_model(**kwargs):
+        return MemoizedWorldModel(
+            lm="test-model",
+            combo_function_str=COOKING.combination_fn,
+            assign_names=True,
+            naming_system_prompt=COOKING.naming_system_prompt,
+            naming_ic_examples=COOKING.naming_ic_examples,
+            feature_names=COOKING.feature_names,
+            naming_coordinator=coordinator,
+            template_namer=TemplateNamer(
+                COOKING.feature_names, COOKING.naming_ic_examples, COOKING.tools
+            ),
+            **kwargs,
+        )
+
+    path = str(tmp_path / "world_model.jsonl")
+    # out of requests, so it names from templates
+    spent = make_world_model(max_lm_requests=0, journal=WorldModelJournal(path))
+    stove, fish = COOKING.tools[0], COOKING.ingredients[0]
+    assert spent.combine(stove, fish).name == "cooked fish"
+    assert len(coordinator) == 0
+    assert list(spent.records())[1:] == []
+    spent.journal.close()
+    with open(path) as f:
+        assert len(f.readlines()) == 1
+
+    # another chain sharing the coordinator still asks the LM
+    assert make_world_model().combine(stove, fish).name == "lm raw fish"
+    assert len(calls) == 1 and len(coordinator) == 1
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.transition_table import (
+    NO_RESULT,
+    UNKNOWN,
+    TransitionTable,
+    build_transition_table,
+)
+from oecraft.utils import load_function_from_string
+from oecraft.world_model import MemoizedWorldModel
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def test_table_matches_the_dynamics(tmp_path):
+    table = build_transition_table(COOKING, max_depth=2)
+    table.save(str(tmp_path / "cooking.npz"))
+    table = TransitionTable.load(str(tmp_path / "cooking.npz"), COOKING)
+
+    world_model = MemoizedWorldModel(
+        lm="none", combo_function_str=COOKING.combination_fn
+    )
+    value_fn = load_function_from_string(COOKING.value_fn, "value_fn")
+    stove, water = COOKING.tools
+    fish, rice = COOKING.ingredients[0], COOKING.ingredients[-1]
+
+    expected = world_model.transition(
+        world_model.transition(stove, fish), world_model.transition(water, rice)
+    )
+    found = table.combine(table.combine(fish, stove), table.combine(water, rice))
+    assert found.features == expected.features
+    assert [ing.features for ing in found.ingredients] == [
+        ing.features for ing in expected.ingredients
+    ]
+    assert found.value == value_fn(expected)
+
+    assert table.combine(stove, water) is None
+    stove_id, _fish_id, dish_id = (table.index(x) for x in (stove, fish, found))
+    assert table.lookup(
+        np.array([stove_id, stove_id]), np.array([COOKING.tools.index(water), dish_id])
+    ).tolist() == [NO_RESULT, UNKNOWN]
+
+    # pairs beyond the table's depth go to the fallback
+    with pytest.raises(KeyError):
+        table.combine(found, fish)
+    assert table.combine(found, stove, fallback=world_model.transition) is not None
+
+
+def test_loading_checks_the_game_functions(tmp_path):
+    build_transition_table(COOKING, max_depth=1).save(str(tmp_path / "cooking.npz"))
+    with pytest.raises(ValueError):
+        TransitionTable.load(str(tmp_path / "cooking.npz"), GAME_DESCRIPTORS["potions"])
@@ -0,0 +1,28 @@
+import threading
+
+from oecraft.utils import IdentityCache
+
+
+def test_identity_cache_drops_the_oldest_objects():
+    cache = IdentityCache(max_size=2)
+    first, second, third = [1], [1], [1]
+    cache.put(first, "first")
+    cache.put(second, "second")
+    # equal objects are still different entries
+    assert cache.get(first) == "first" and cache.get(second) == "second"
+
+    cache.put(third, "third")
+    assert len(cache) == 2
+    assert cache.get(first) is None and cache.get(first, "missing") == "missing"
+    assert cache.get(third) == "third"
+
+    def fill(start):
+        for i in range(start, start + 500):
+            cache.put([i], i)
+
+    threads = [threading.Thread(target=fill, args=(i * 500,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 2
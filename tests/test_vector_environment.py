@@ -0,0 +1,60 @@
+from oecraft.environment import CraftingGame
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.types import Tool
+from oecraft.vector_environment import AsyncVectorCraftingGame, VectorCraftingGame
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+
+
+def first_actions(observations):
+    # the first tool on the first ingredient
+    actions = []
+    for obs in observations:
+        inventory = obs["inventory"]
+        tool = next(x for x in inventory if isinstance(x, Tool))
+        ingredient = next(x for x in inventory if not isinstance(x, Tool))
+        actions.append((tool.name, ingredient.name))
+    return actions
+
+
+def test_episodes_step_in_lockstep_and_autoreset():
+    envs = VectorCraftingGame(COOKING, num_envs=3, max_steps=2)
+    observations, _ = envs.reset(seed=10)
+    for i, obs in enumerate(observations):
+        single = CraftingGame(descriptor=COOKING, model="none")
+        assert obs["inventory"] == single.reset(seed=10 + i)
+    assert all(env.world_model is envs.world_model for env in envs.envs)
+
+    # the second episode submits, the others run out of steps on the next step
+    actions = first_actions(observations)
+    actions[1] = None
+    observations, rewards, terminations, truncations, _ = envs.step(actions)
+    assert terminations.tolist() == [False, True, False]
+    assert rewards[1] == envs.envs[1].get_reward()
+    assert observations[0]["new_item"].name.startswith("[")
+
+    observations, rewards, terminations, _, _ = envs.step(first_actions(observations))
+    assert terminations.tolist() == [True, False, True]
+    assert observations[0]["new_item"] is not None
+    assert rewards[0] == envs.envs[0].get_reward()
+    # the second episode was reset instead of stepped
+    assert observations[1]["new_item"] is None and rewards[1] == 0
+    assert not truncations.any()
+    envs.close()
+
+
+def test_async_episodes_match_sync_ones():
+    sync_envs = VectorCraftingGame(COOKING, num_envs=3, max_steps=3)
+    async_envs = AsyncVectorCraftingGame(COOKING, num_envs=3, max_steps=3, n_workers=2)
+    try:
+        sync_observations, _ = sync_envs.reset(seed=0)
+        async_observations, _ = async_envs.reset(seed=0)
+        for _ in range(4):
+            assert async_observations == sync_observations
+            actions = first_actions(sync_observations)
+            sync_observations, sync_rewards, *_ = sync_envs.step(actions)
+            async_observations, async_rewards, *_ = async_envs.step(actions)
+            assert async_rewards.tolist() == sync_rewards.tolist()
+    finally:
+        sync_envs.close()
+        async_envs.close()
@@ -0,0 +1,381 @@
+import asyncio
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+import oecraft.world_model as world_model_module
+from oecraft.cassette import Cassette, CassetteMiss
+from oecraft.game_descriptors import GAME_DESCRIPTORS
+from oecraft.journal import WorldModelJournal
+from oecraft.naming_cache import DictNamingCache, SQLiteNamingCache
+from oecraft.naming_coordinator import NamingCoordinator
+from oecraft.transition_cache import TransitionCache
+from oecraft.world_model import ItemInterner, MemoizedWorldModel
+
+COOKING = GAME_DESCRIPTORS["cooking"]
+LEGACY_WORLD_MODEL = (
+    Path(__file__).parent.parent
+    / "data/world-models/cooking_llama-3-1-8b-instant_random.json"
+)
+
+
+def make_world_model(**kwargs):
+    return MemoizedWorldModel(
+        lm="test-model",
+        combo_function_str=COOKING.combination_fn,
+        naming_system_prompt=COOKING.naming_system_prompt,
+        naming_ic_examples=COOKING.naming_ic_examples,
+        feature_names=COOKING.feature_names,
+        **kwargs,
+    )
+
+
+def fake_naming(monkeypatch):
+    calls = []
+
+    def get_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        calls.append(inputs)
+        return {"emoji": "🍲", "name": f"named {len(calls)}"}
+
+    monkeypatch.setattr(
+        world_model_module, "get_item_semantics_from_lm", get_item_semantics_from_lm
+    )
+    return calls
+
+
+def test_naming_cache_is_shared_across_world_models(monkeypatch, tmp_path):
+    calls = fake_naming(monkeypatch)
+    stove, fish = COOKING.tools[0], COOKING.ingredients[0]
+
+    cache = SQLiteNamingCache(str(tmp_path / "names.sqlite"))
+    first = make_world_model(assign_names=True, naming_cache=cache).combine(stove, fish)
+    assert len(calls) == 1
+
+    # a fresh world model (e.g. in another process) reuses the stored name
+    other_cache = SQLiteNamingCache(str(tmp_path / "names.sqlite"))
+    second = make_world_model(assign_names=True, naming_cache=other_cache).combine(
+        fish, stove
+    )
+    assert len(calls) == 1
+    assert second == first
+    assert second.name == "named 1"
+
+
+def test_acombine_matches_combine():
+    stove, fish, rice = (
+        COOKING.tools[0],
+        COOKING.ingredients[0],
+        COOKING.ingredients[-1],
+    )
+    sync_model, async_model = make_world_model(), make_world_model()
+
+    dish = sync_model.combine(fish, rice)
+    cooked = sync_model.combine(stove, dish)
+    assert asyncio.run(async_model.acombine(fish, rice)) == dish
+    assert asyncio.run(async_model.acombine(stove, dish)) == cooked
+    assert [ing.name for ing in cooked.ingredients] == [
+        f"[stove-{ing.name}]" for ing in dish.ingredients
+    ]
+
+
+def test_coordinator_deduplicates_concurrent_naming(monkeypatch):
+    calls = []
+
+    async def aget_item_semantics_from_lm(inputs, outcome, *args, **kwargs):
+        calls.append(inputs)
+        await asyncio.sleep(0.01)
+        return {"emoji": "🍲", "name": f"named {len(calls)}"}
+
+    monkeypatch.setattr(
+        world_model_module, "aget_item_semantics_from_lm", aget_item_semantics_from_lm
+    )
+    stove, fish = COOKING.tools[0], COOKING.ingredients[0]
+    coordinator = NamingCoordinator()
+    models = [
+        make_world_model(assign_names=True, naming_coordinator=coordinator)
+        for _ in range(5)
+    ]
+
+    async def combine_all():
+        return await asyncio.gather(*(m.acombine(stove, fish) for m in models))
+
+    items = asyncio.run(combine_all())
+    assert len(calls) == 1
+    assert all(item.name == "named 1" for item in items)
+
+
+def test_interner_ids_structurally_equal_items_once():
+    fish, rice = COOKING.ingredients[0], COOKING.ingredients[-1]
+    interner = ItemInterner()
+    copy_of_fish = replace(fish)
+
+    assert copy_of_fish is not fish
+    assert interner.intern(copy_of_fish) == interner.intern(fish)
+    assert interner.pair(fish, rice) == interner.pair(rice, fish)
+    assert len(interner) == 2
+
+    # new copies of known items don't grow the interner past its bound
+    bounded = ItemInterner(max_identities=3)
+    for _ in range(10):
+        assert bounded.intern(replace(fish)) == 0
+    assert len(bounded._by_identity) <= 3 and len(bounded) == 1
+
+    # forgotten items come back with new ids, never with reused ones
+    small = ItemInterner(max_items=1)
+    assert small.intern(fish) == 0 and small.intern(rice) == 1
+    assert len(small) == 1 and small.intern(replace(fish)) == 2
+
+
+def test_combine_memoizes_on_structure(monkeypatch):
+    calls = fake_naming(monkeypatch)
+    stove, fish = COOKING.tools[0], COOKING.ingredients[0]
+    world_model = make_world_model(assign_names=True)
+
+    first = world_model.combine(stove, fish)
+    assert world_model.combine(replace(fish), stove) is first
+    assert len(calls) == 1
+
+
+def test_transitions_are_shared_and_never_named(monkeypatch):
+    calls = fake_naming(monkeypatch)
+    stove, water, fish = COOKING.tools[0], COOKING.tools[1], COOKING.ingredients[0]
+    cache = TransitionCache()
+    planner = make_world_model(assign_names=True, transition_cache=cache)
+
+    cooked = planner.transition(stove, fish)
+    assert planner.transition(stove, stove) is None
+    assert len(calls) == 0
+    assert cooked.features["cook_level"] == 1
+
+    # a second world model reuses the dynamics and only adds a name
+    named = make_world_model(assign_names=True, transition_cache=cache).combine(
+        fish, stove
+    )
+    assert len(calls) == 1
+    assert named.features == cooked.features
+    assert len(cache) == 2
+
+    # soaking twice leaves the item unchanged, which resolves to the caller's item
+    soaked = planner.transition(water, fish)
+    assert planner.transition(soaked, water) is soaked
+
+    # a bounded cache keeps only the newest transitions
+    bounded = TransitionCache(max_size=1)
+    small = make_world_model(transition_cache=bounded, max_combinations=1)
+    small.transition(stove, fish)
+    assert small.transition(water, fish).features == soaked.features
+    assert len(bounded) == 1 and len(small.transitions) == 1
+
+
+def test_cassette_replays_names_without_the_lm(monkeypatch, tmp_path):
+    calls = fake_naming(monkeypatch)
+    stove, fish = COOKING.tools[0], COOKING.ingredients[0]
+    path = str(tmp_path / "cassette.jsonl")
+
+    recorded = make_world_model(
+        assign_names=True, cassette=Cassette(path, mode="record")
+    ).combine(stove, fish)
+
+    replayed = make_world_model(
+        assign_names=True, cassette=Cassette(path, mode="replay")
+    ).combine(stove, fish)
+    assert len(calls) == 1
+    assert replayed == recorded
+
+    with pytest.raises(CassetteMiss):
+        make_world_model(
+            assign_names=True, cassette=Cassette(path, mode="replay")
+        ).combine(stove, COOKING.ingredients[1])
+
+
+def test_journal_checkpoints_and_resumes(monkeypatch, tmp_path):
+    calls = fake_naming(monkeypatch)
+    stove, fish, rice = (
+        COOKING.tools[0],
+        COOKING.ingredients[0],
+        COOKING.ingredients[-1],
+    )
+    path = str(tmp_path / "world_model.jsonl")
+
+    world_model = make_world_model(assign_names=True, journal=WorldModelJournal(path))
+    cooked = world_model.combine(stove, fish)
+    dish = world_model.combine(cooked, rice)
+    world_model.journal.close()
+
+    # simulate a crash in the middle of an append
+    with open(path, "a") as f:
+        f.write('{"type": "combination", "inpu')
+
+    resumed = make_world_model(assign_names=True, journal=WorldModelJournal(path))
+    assert resumed.combine(fish, stove) == cooked
+    assert resumed.combine(rice, cooked) == dish
+    assert len(calls) == 2
+    assert [x.semantics for x in resumed.ic_examples] == [
+        x.semantics for x in world_model.ic_examples
+    ]
+
+    # the partial line was dropped before appending new records
+    resumed.combine(stove, rice)
+    resumed.compact()
+    resumed.journal.close()
+    with open(path) as f:
+        assert len(f.readlines()) == 1 + 3 + 3
+
+    loaded = make_world_model()
+    loaded.loads(resumed.dumps())
+    assert loaded.assign_names
+    assert loaded.combine(stove, rice) == resumed.combine(stove, rice)
+    assert len(calls) == 3
+
+
+def test_bounded_world_model_spills_evicted_names(monkeypatch):
+    calls = fake_naming(monkeypatch)
+    stove, water = COOKING.tools
+    fish, beef, rice = (
+        COOKING.ingredients[0],
+        COOKING.ingredients[1],
+        COOKING.ingredients[-1],
+    )
+    world_model = make_world_model(
+        assign_names=True,
+        naming_cache=DictNamingCache(),
+        max_combinations=2,
+        max_ic_examples=2,
+    )
+
+    cooked_fish = world_model.combine(stove, fish)
+    world_model.combine(stove, beef)
+    world_model.combine(stove, fish)  # fish is now the most recently used
+    world_model.combine(water, rice)
+    assert len(calls) == 3
+
+    stats = world_model.stats()
+    assert stats["combinations"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1
+    assert stats["ic_examples"] == 2 and stats["ic_examples_dropped"] == 1
+    assert world_model.combine(fish, stove) is cooked_fish
+
+    # the evicted combination comes back from the naming cache, not the LM
+    assert world_model.combine(stove, beef).name == "named 2"
+    assert len(calls) == 3
+
+
+def test_tool_on_combined_item_is_named_in_one_batch(monkeypatch):
+    calls = fake_naming(monkeypatch)
+    batches = []
+
+    def get_batch_item_semantics_from_lm(inputs, outcome, components, *args, **kwargs):
+        batches.append(components)
+        return {
+            "emoji": "🍲",
+            "name": "cooked dish",
+            "ingredients": [
+                {"emoji": "🔥", "name": f"cooked {before.name}"}
+                for _, before, _ in components
+            ],
+        }
+
+    monkeypatch.setattr(
+        world_model_module,
+        "get_batch_item_semantics_from_lm",
+        get_batch_item_semantics_from_lm,
+    )
+    stove, fish, rice = (
+        COOKING.tools[0],
+        COOKING.ingredients[0],
+        COOKING.ingredients[-1],
+    )
+    world_model = make_world_model(assign_names=True)
+    dish = world_model.combine(fish, rice)
+    cooked_fish = world_model.combine(stove, fish)
+    assert len(calls) == 2
+
+    cooked = world_model.combine(stove, dish)
+    assert len(calls) == 2
+    # the fish was already cooked once, so only the rice needs a new name
+    assert [before for _, before, _ in batches[0]] == [rice]
+    assert cooked.name == "cooked dish"
+    assert list(cooked.ingredients) == [cooked_fish, world_model.combine(stove, rice)]
+    assert cooked.ingredients[1].name == f"cooked {rice.name}"
+
+
+def test_batch_naming_falls_back_to_one_item_at_a_time(monkeypatch):
+    calls = fake_naming(monkeypatch)
+
+    def fail(*args, **kwargs):
+        raise ValueError("Expected names for 2 components, got 1")
+
+    monkeypatch.setattr(world_model_module, "get_batch_item_semantics_from_lm", fail)
+    stove, fish, rice = (
+        COOKING.tools[0],
+        COOKING.ingredients[0],
+        COOKING.ingredients[-1],
+    )
+    world_model = make_world_model(assign_names=True)
+    cooked = world_model.combine(stove, world_model.combine(fish, rice))
+    assert len(calls) == 4
+    assert [ing.name for ing in cooked.ingredients] == ["named 2", "named 3"]
+
+
+def test_merge_reconciles_names_deterministically(monkeypatch):
+    stove, fish, rice = (
+        COOKING.tools[0],
+        COOKING.ingredients[0],
+        COOKING.ingredients[-1],
+    )
+    models = []
+    for name in ["grilled fish", "seared fish", "seared fish"]:
+        monkeypatch.setattr(
+            world_model_module,
+            "get_item_semantics_from_lm",
+            lambda *args, name=name, **kwargs: {"emoji": "🐟", "name": name},
+        )
+        world_model = make_world_model(assign_names=True)
+        world_model.combine(stove, fish)
+        if not models:
+            world_model.combine(stove, rice)
+        models.append(world_model)
+
+    merged = make_world_model(assign_names=True)
+    assert merged.merge(*models) == 1
+    assert merged.combine(fish, stove).name == "seared fish"
+    assert merged.combine(rice, stove).name == "grilled fish"
+    assert [x.semantics.name for x in merged.ic_examples] == [
+        "grilled fish",
+        "seared fish",
+    ]
+
+    # the majority wins whichever model is merged into
+    models[0].merge(*models[1:])
+    assert models[0].dumps() == merged.dumps()
+
+    with pytest.raises(ValueError):
+        make_world_model(reasoning_effort="high").merge(merged)
+
+
+def test_loads_world_models_saved_by_older_versions(tmp_path):
+    world_model = make_world_model()
+    world_model.load(str(LEGACY_WORLD_MODEL))
+    assert world_model.lm == "groq/llama-3.1-8b-instant" and world_model.assign_names
+    assert len(world_model.combinations) == 7 and len(world_model.ic_examples) == 6
+
+    butter, knife, buttered = next(iter(world_model.combinations.values()))
+    assert (butter.name, knife.name, buttered.name) == (
+        "butter",
+        "knife",
+        "Buttered Knife",
+    )
+    assert buttered.features["chop_level"] == 1
+    assert buttered.features["ingredient_types"] == ("eggs_dairy",)
+    assert world_model.combine(knife, butter) is buttered
+
+    # saving writes a journal, which loads back the same
+    path = str(tmp_path / "world_model.jsonl")
+    world_model.save(path)
+    reloaded = make_world_model()
+    reloaded.load(path)
+    assert list(reloaded.combinations.values()) == list(
+        world_model.combinations.values()
+    )